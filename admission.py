@@ -0,0 +1,139 @@
+"""Admission control for code executions.
+
+Every execution request (``/run``, ``/submit``, submission jobs and
+complexity analysis) must be admitted before it may wait for a judge slot:
+
+- at most ``slots + queue_depth`` executions are admitted at a time, so the
+  wait for a slot stays bounded; beyond that requests get ``503``
+- each client may have ``per_client`` executions admitted at a time, and
+  starts new ones at a sustained ``rate`` per second with bursts of
+  ``burst`` (a token bucket); beyond that requests get ``429``
+
+Clients are told apart by their address rather than their session, which
+they could discard to start over with a full bucket; users behind one
+address share its limits.
+
+Rejections carry a ``Retry-After`` estimate.  Admitted executions wait for
+a slot in the :class:`scheduler.FairScheduler`, which takes turns between
+clients.
+"""
+import collections
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+from config import Config
+
+# Idle clients whose buckets are full are forgotten past this many clients
+MAX_CLIENTS = 10000
+
+# Weight of the latest execution in the average execution time
+DURATION_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when an execution is not admitted"""
+
+    def __init__(self, status, message, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionController:
+    """Bounded, rate-limited admission of executions"""
+
+    def __init__(self, slots, queue_depth, rate, burst, per_client):
+        self.slots = slots
+        self.queue_depth = queue_depth
+        self.rate = rate
+        self.burst = burst
+        self.per_client = per_client
+        self._lock = threading.Lock()
+        self._buckets = {}  # client -> [tokens, last refill]
+        self._admitted = collections.Counter()  # client -> executions admitted
+        self._in_flight = 0
+        self._average = 1.0  # seconds an admitted execution takes, smoothed
+        self.counts = {'admitted': 0, 'rate_limited': 0, 'busy': 0}
+
+    def _take_token(self, client_id, now):
+        """Take a token from the client's bucket; returns the wait for one if empty"""
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_CLIENTS:
+                self._prune(now)
+            bucket = self._buckets[client_id] = [float(self.burst), now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            return (1 - bucket[0]) / self.rate
+        bucket[0] -= 1
+        return 0
+
+    def _prune(self, now):
+        full = [client for client, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst and not self._admitted[client]]
+        for client in full:
+            del self._buckets[client]
+
+    def acquire(self, client_id):
+        """Admit one execution of ``client_id`` or raise :class:`Overloaded`"""
+        now = time.monotonic()
+        with self._lock:
+            if self._in_flight >= self.slots + self.queue_depth:
+                self.counts['busy'] += 1
+                # Time for the queue ahead to drain through the slots
+                raise Overloaded(503, 'Server is busy, please try again shortly',
+                                 self._average * (self._in_flight - self.slots + 1) / self.slots)
+            if self._admitted[client_id] >= self.per_client:
+                self.counts['rate_limited'] += 1
+                raise Overloaded(429, 'Too many executions in progress', self._average)
+            wait = self._take_token(client_id, now)
+            if wait:
+                self.counts['rate_limited'] += 1
+                raise Overloaded(429, 'Too many executions, please slow down', wait)
+            self._in_flight += 1
+            self._admitted[client_id] += 1
+            self.counts['admitted'] += 1
+        return client_id, now
+
+    def release(self, ticket):
+        """Mark an execution admitted by :meth:`acquire` as finished"""
+        client_id, started = ticket
+        duration = time.monotonic() - started
+        with self._lock:
+            self._in_flight -= 1
+            self._admitted[client_id] -= 1
+            if not self._admitted[client_id]:
+                del self._admitted[client_id]
+            self._average += DURATION_SMOOTHING * (duration - self._average)
+
+    @contextmanager
+    def admit(self, client_id):
+        """Hold an admission for the duration of the ``with`` block"""
+        ticket = self.acquire(client_id)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, in_flight=self._in_flight,
+                        capacity=self.slots + self.queue_depth,
+                        average_ms=round(self._average * 1000, 3))
+
+
+admission = AdmissionController(
+    Config.JUDGE_SLOTS,
+    Config.ADMISSION_QUEUE_DEPTH,
+    Config.ADMISSION_RATE,
+    Config.ADMISSION_BURST,
+    Config.ADMISSION_MAX_PER_CLIENT
+)
+metrics.gauge('admission_in_flight', 'Executions admitted and not finished',
+              callback=lambda: admission.stats()['in_flight'])
+metrics.counter('admission_rejected_total', 'Executions not admitted, by reason', ['reason'],
+                callback=lambda: {(reason,): admission.counts[reason] for reason in ('rate_limited', 'busy')})
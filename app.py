@@ -1,744 +1,170 @@
-from flask import Flask, render_template, request, jsonify
-import subprocess
+from flask import Flask, Response, abort, g, render_template, request, jsonify, send_file, session, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
+import base64
+import hmac
 import json
+import mimetypes
+import threading
 import time
-import sys
-import jedi
-from io import StringIO
+import uuid
+import judge
+import leaderboard
+import lint
+import metrics
+import profiling
+import sandbox
+from admission import Overloaded
+from judge_server import JudgeClient, JudgeServerError, JudgeService
+from lint import lint_pool
+from completion import completion_service
+from supersede import Superseded, completion_requests, lint_requests
+from registry import registry
+from assets import assets, MAX_AGE
+from page_cache import cached_page, page_cache
+from profiling import profiler
 from config import Config
+from editor import EditorSession
 try:
-    from flake8.api import legacy as flake8
+    from flask_sock import Sock
 except ImportError:
-    import flake8.api.legacy as flake8
-from config import Config
+    Sock = None
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# Data Structures and Algorithms content
-DSA_CONTENT = {
-    'data_structures': [
-        {
-            'id': 'arrays',
-            'title': 'Arrays',
-            'description': 'Learn about arrays - contiguous memory locations storing elements of the same type.',
-            'content': '''
-<h2>Arrays</h2>
-<p>An array is a collection of elements stored in contiguous memory locations. Each element can be accessed using its index.</p>
-
-<h3>Key Properties:</h3>
-<ul>
-    <li>Fixed size (in most languages)</li>
-    <li>Random access in O(1) time</li>
-    <li>Sequential memory allocation</li>
-    <li>Same data type for all elements</li>
-</ul>
-
-<h3>Common Operations:</h3>
-<ul>
-    <li><strong>Access:</strong> O(1) - Direct index access</li>
-    <li><strong>Search:</strong> O(n) - Linear search, O(log n) if sorted</li>
-    <li><strong>Insertion:</strong> O(n) - May require shifting elements</li>
-    <li><strong>Deletion:</strong> O(n) - May require shifting elements</li>
-</ul>
-
-<h3>Python Example:</h3>
-<pre><code>
-# Creating an array (list in Python)
-arr = [1, 2, 3, 4, 5]
-
-# Accessing elements
-print(arr[0])  # Output: 1
-
-# Modifying elements
-arr[2] = 10
-
-# Iterating through array
-for element in arr:
-    print(element)
-</code></pre>
-            '''
-        },
-        {
-            'id': 'linked_lists',
-            'title': 'Linked Lists',
-            'description': 'Understand linked lists - dynamic data structures with nodes connected by pointers.',
-            'content': '''
-<h2>Linked Lists</h2>
-<p>A linked list is a linear data structure where elements are not stored in contiguous memory. Each element (node) contains data and a reference to the next node.</p>
-
-<h3>Types:</h3>
-<ul>
-    <li><strong>Singly Linked List:</strong> Each node points to the next node</li>
-    <li><strong>Doubly Linked List:</strong> Each node points to both next and previous nodes</li>
-    <li><strong>Circular Linked List:</strong> Last node points back to the first node</li>
-</ul>
-
-<h3>Common Operations:</h3>
-<ul>
-    <li><strong>Access:</strong> O(n) - Must traverse from head</li>
-    <li><strong>Search:</strong> O(n) - Linear traversal required</li>
-    <li><strong>Insertion:</strong> O(1) - At head or known position</li>
-    <li><strong>Deletion:</strong> O(1) - At head or known position</li>
-</ul>
-
-<h3>Python Example:</h3>
-<pre><code>
-class Node:
-    def __init__(self, data):
-        self.data = data
-        self.next = None
-
-class LinkedList:
-    def __init__(self):
-        self.head = None
-    
-    def insert_at_beginning(self, data):
-        new_node = Node(data)
-        new_node.next = self.head
-        self.head = new_node
-    
-    def print_list(self):
-        current = self.head
-        while current:
-            print(current.data, end=" -> ")
-            current = current.next
-        print("None")
-
-# Usage
-ll = LinkedList()
-ll.insert_at_beginning(3)
-ll.insert_at_beginning(2)
-ll.insert_at_beginning(1)
-ll.print_list()  # Output: 1 -> 2 -> 3 -> None
-</code></pre>
-            '''
-        },
-        {
-            'id': 'stacks',
-            'title': 'Stacks',
-            'description': 'Learn about stacks - LIFO (Last In First Out) data structure.',
-            'content': '''
-<h2>Stacks</h2>
-<p>A stack is a linear data structure that follows the LIFO (Last In First Out) principle. The last element added is the first one to be removed.</p>
-
-<h3>Key Operations:</h3>
-<ul>
-    <li><strong>Push:</strong> O(1) - Add element to top</li>
-    <li><strong>Pop:</strong> O(1) - Remove element from top</li>
-    <li><strong>Peek/Top:</strong> O(1) - View top element without removing</li>
-    <li><strong>isEmpty:</strong> O(1) - Check if stack is empty</li>
-</ul>
-
-<h3>Applications:</h3>
-<ul>
-    <li>Function call stack</li>
-    <li>Expression evaluation</li>
-    <li>Undo mechanisms</li>
-    <li>Browser history</li>
-</ul>
-
-<h3>Python Example:</h3>
-<pre><code>
-class Stack:
-    def __init__(self):
-        self.items = []
-    
-    def push(self, item):
-        self.items.append(item)
-    
-    def pop(self):
-        if not self.is_empty():
-            return self.items.pop()
-        return None
-    
-    def peek(self):
-        if not self.is_empty():
-            return self.items[-1]
-        return None
-    
-    def is_empty(self):
-        return len(self.items) == 0
-
-# Usage
-stack = Stack()
-stack.push(1)
-stack.push(2)
-stack.push(3)
-print(stack.pop())  # Output: 3
-print(stack.peek())  # Output: 2
-</code></pre>
-            '''
-        },
-        {
-            'id': 'queues',
-            'title': 'Queues',
-            'description': 'Understand queues - FIFO (First In First Out) data structure.',
-            'content': '''
-<h2>Queues</h2>
-<p>A queue is a linear data structure that follows the FIFO (First In First Out) principle. The first element added is the first one to be removed.</p>
-
-<h3>Key Operations:</h3>
-<ul>
-    <li><strong>Enqueue:</strong> O(1) - Add element to rear</li>
-    <li><strong>Dequeue:</strong> O(1) - Remove element from front</li>
-    <li><strong>Front:</strong> O(1) - View front element</li>
-    <li><strong>isEmpty:</strong> O(1) - Check if queue is empty</li>
-</ul>
-
-<h3>Types:</h3>
-<ul>
-    <li><strong>Simple Queue:</strong> Basic FIFO queue</li>
-    <li><strong>Circular Queue:</strong> Last position connects to first</li>
-    <li><strong>Priority Queue:</strong> Elements have priorities</li>
-    <li><strong>Deque:</strong> Double-ended queue</li>
-</ul>
-
-<h3>Python Example:</h3>
-<pre><code>
-from collections import deque
-
-class Queue:
-    def __init__(self):
-        self.items = deque()
-    
-    def enqueue(self, item):
-        self.items.append(item)
-    
-    def dequeue(self):
-        if not self.is_empty():
-            return self.items.popleft()
-        return None
-    
-    def front(self):
-        if not self.is_empty():
-            return self.items[0]
-        return None
-    
-    def is_empty(self):
-        return len(self.items) == 0
-
-# Usage
-queue = Queue()
-queue.enqueue(1)
-queue.enqueue(2)
-queue.enqueue(3)
-print(queue.dequeue())  # Output: 1
-print(queue.front())  # Output: 2
-</code></pre>
-            '''
-        },
-        {
-            'id': 'trees',
-            'title': 'Trees',
-            'description': 'Master tree structures - hierarchical data structures with nodes connected by edges.',
-            'content': '''
-<h2>Trees</h2>
-<p>A tree is a hierarchical data structure consisting of nodes connected by edges. Each tree has a root node and zero or more child nodes.</p>
-
-<h3>Key Terminology:</h3>
-<ul>
-    <li><strong>Root:</strong> Topmost node in a tree</li>
-    <li><strong>Parent:</strong> Node with child nodes</li>
-    <li><strong>Child:</strong> Node descended from another node</li>
-    <li><strong>Leaf:</strong> Node with no children</li>
-    <li><strong>Height:</strong> Length of longest path from root to leaf</li>
-    <li><strong>Depth:</strong> Length of path from root to a node</li>
-</ul>
-
-<h3>Types:</h3>
-<ul>
-    <li><strong>Binary Tree:</strong> Each node has at most 2 children</li>
-    <li><strong>Binary Search Tree (BST):</strong> Left < Parent < Right</li>
-    <li><strong>AVL Tree:</strong> Self-balancing BST</li>
-    <li><strong>Heap:</strong> Complete binary tree with heap property</li>
-</ul>
-
-<h3>Python Example (Binary Tree):</h3>
-<pre><code>
-class TreeNode:
-    def __init__(self, data):
-        self.data = data
-        self.left = None
-        self.right = None
-
-class BinaryTree:
-    def __init__(self):
-        self.root = None
-    
-    def inorder_traversal(self, node):
-        if node:
-            self.inorder_traversal(node.left)
-            print(node.data, end=" ")
-            self.inorder_traversal(node.right)
-
-# Usage
-root = TreeNode(1)
-root.left = TreeNode(2)
-root.right = TreeNode(3)
-root.left.left = TreeNode(4)
-root.left.right = TreeNode(5)
-
-tree = BinaryTree()
-tree.root = root
-tree.inorder_traversal(root)  # Output: 4 2 5 1 3
-</code></pre>
-            '''
-        }
-    ],
-    'algorithms': [
-        {
-            'id': 'sorting',
-            'title': 'Sorting Algorithms',
-            'description': 'Learn various sorting techniques from basic to advanced.',
-            'content': '''
-<h2>Sorting Algorithms</h2>
-<p>Sorting algorithms arrange elements in a specific order (ascending or descending).</p>
-
-<h3>Common Sorting Algorithms:</h3>
-
-<h4>1. Bubble Sort - O(n²)</h4>
-<p>Repeatedly swaps adjacent elements if they are in wrong order.</p>
-<pre><code>
-def bubble_sort(arr):
-    n = len(arr)
-    for i in range(n):
-        for j in range(0, n-i-1):
-            if arr[j] > arr[j+1]:
-                arr[j], arr[j+1] = arr[j+1], arr[j]
-    return arr
-
-print(bubble_sort([64, 34, 25, 12, 22]))
-</code></pre>
-
-<h4>2. Selection Sort - O(n²)</h4>
-<p>Selects the minimum element and places it at the beginning.</p>
-<pre><code>
-def selection_sort(arr):
-    n = len(arr)
-    for i in range(n):
-        min_idx = i
-        for j in range(i+1, n):
-            if arr[j] < arr[min_idx]:
-                min_idx = j
-        arr[i], arr[min_idx] = arr[min_idx], arr[i]
-    return arr
-</code></pre>
-
-<h4>3. Merge Sort - O(n log n)</h4>
-<p>Divide and conquer algorithm that divides array into halves.</p>
-<pre><code>
-def merge_sort(arr):
-    if len(arr) <= 1:
-        return arr
-    
-    mid = len(arr) // 2
-    left = merge_sort(arr[:mid])
-    right = merge_sort(arr[mid:])
-    
-    return merge(left, right)
+# Behind reverse proxies the client address comes from X-Forwarded-For
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
 
-def merge(left, right):
-    result = []
-    i = j = 0
-    
-    while i < len(left) and j < len(right):
-        if left[i] <= right[j]:
-            result.append(left[i])
-            i += 1
-        else:
-            result.append(right[j])
-            j += 1
-    
-    result.extend(left[i:])
-    result.extend(right[j:])
-    return result
-</code></pre>
-
-<h4>4. Quick Sort - O(n log n) average</h4>
-<p>Picks a pivot and partitions array around it.</p>
-<pre><code>
-def quick_sort(arr):
-    if len(arr) <= 1:
-        return arr
-    
-    pivot = arr[len(arr) // 2]
-    left = [x for x in arr if x < pivot]
-    middle = [x for x in arr if x == pivot]
-    right = [x for x in arr if x > pivot]
-    
-    return quick_sort(left) + middle + quick_sort(right)
-</code></pre>
-            '''
-        },
-        {
-            'id': 'searching',
-            'title': 'Searching Algorithms',
-            'description': 'Master searching techniques for finding elements efficiently.',
-            'content': '''
-<h2>Searching Algorithms</h2>
-<p>Searching algorithms find the position of a target element in a data structure.</p>
-
-<h3>1. Linear Search - O(n)</h3>
-<p>Check each element sequentially until target is found.</p>
-<pre><code>
-def linear_search(arr, target):
-    for i in range(len(arr)):
-        if arr[i] == target:
-            return i
-    return -1
-
-arr = [10, 20, 30, 40, 50]
-print(linear_search(arr, 30))  # Output: 2
-</code></pre>
-
-<h3>2. Binary Search - O(log n)</h3>
-<p>Efficient search on sorted arrays by dividing search space in half.</p>
-<pre><code>
-def binary_search(arr, target):
-    left, right = 0, len(arr) - 1
-    
-    while left <= right:
-        mid = (left + right) // 2
-        
-        if arr[mid] == target:
-            return mid
-        elif arr[mid] < target:
-            left = mid + 1
-        else:
-            right = mid - 1
-    
-    return -1
+# Judging runs in the shared judge server when serve.py started one, else in-process
+if app.config['JUDGE_SOCKET']:
+    judge_service = JudgeClient(app.config['JUDGE_SOCKET'])
+else:
+    judge_service = JudgeService()
 
-arr = [10, 20, 30, 40, 50]
-print(binary_search(arr, 30))  # Output: 2
-</code></pre>
 
-<h3>3. Binary Search (Recursive)</h3>
-<pre><code>
-def binary_search_recursive(arr, target, left, right):
-    if left > right:
-        return -1
-    
-    mid = (left + right) // 2
-    
-    if arr[mid] == target:
-        return mid
-    elif arr[mid] < target:
-        return binary_search_recursive(arr, target, mid + 1, right)
-    else:
-        return binary_search_recursive(arr, target, left, mid - 1)
-
-arr = [10, 20, 30, 40, 50]
-print(binary_search_recursive(arr, 30, 0, len(arr) - 1))
-</code></pre>
-            '''
-        },
-        {
-            'id': 'recursion',
-            'title': 'Recursion',
-            'description': 'Understand recursive problem-solving techniques.',
-            'content': '''
-<h2>Recursion</h2>
-<p>Recursion is a technique where a function calls itself to solve smaller instances of the same problem.</p>
-
-<h3>Key Components:</h3>
-<ul>
-    <li><strong>Base Case:</strong> Condition to stop recursion</li>
-    <li><strong>Recursive Case:</strong> Function calls itself with modified parameters</li>
-</ul>
-
-<h3>Example 1: Factorial</h3>
-<pre><code>
-def factorial(n):
-    # Base case
-    if n == 0 or n == 1:
-        return 1
-    # Recursive case
-    return n * factorial(n - 1)
-
-print(factorial(5))  # Output: 120
-</code></pre>
-
-<h3>Example 2: Fibonacci</h3>
-<pre><code>
-def fibonacci(n):
-    if n <= 1:
-        return n
-    return fibonacci(n - 1) + fibonacci(n - 2)
-
-print(fibonacci(6))  # Output: 8
-</code></pre>
-
-<h3>Example 3: Tower of Hanoi</h3>
-<pre><code>
-def tower_of_hanoi(n, source, auxiliary, destination):
-    if n == 1:
-        print(f"Move disk 1 from {source} to {destination}")
-        return
-    
-    tower_of_hanoi(n - 1, source, destination, auxiliary)
-    print(f"Move disk {n} from {source} to {destination}")
-    tower_of_hanoi(n - 1, auxiliary, source, destination)
-
-tower_of_hanoi(3, 'A', 'B', 'C')
-</code></pre>
-
-<h3>Example 4: Binary Search (Recursive)</h3>
-<pre><code>
-def binary_search(arr, target, left, right):
-    if left > right:
-        return -1
-    
-    mid = (left + right) // 2
-    
-    if arr[mid] == target:
-        return mid
-    elif arr[mid] < target:
-        return binary_search(arr, target, mid + 1, right)
-    else:
-        return binary_search(arr, target, left, mid - 1)
-</code></pre>
-            '''
-        },
-        {
-            'id': 'dynamic_programming',
-            'title': 'Dynamic Programming',
-            'description': 'Learn optimization techniques using dynamic programming.',
-            'content': '''
-<h2>Dynamic Programming (DP)</h2>
-<p>Dynamic Programming is an optimization technique that solves complex problems by breaking them down into simpler subproblems and storing their solutions.</p>
-
-<h3>Key Concepts:</h3>
-<ul>
-    <li><strong>Optimal Substructure:</strong> Solution can be constructed from optimal solutions of subproblems</li>
-    <li><strong>Overlapping Subproblems:</strong> Same subproblems are solved multiple times</li>
-    <li><strong>Memoization:</strong> Top-down approach with caching</li>
-    <li><strong>Tabulation:</strong> Bottom-up approach with table</li>
-</ul>
-
-<h3>Example 1: Fibonacci with Memoization</h3>
-<pre><code>
-def fibonacci_memo(n, memo={}):
-    if n in memo:
-        return memo[n]
-    if n <= 1:
-        return n
+def start_services():
+    """Start the background threads and worker processes of this web process.
+
+    Under serve.py the app is imported once and then forked, so this runs in
+    each worker after the fork; otherwise it runs at import.
+    """
+    # Problems and lessons are loaded from CONTENT_DIR and reloaded when they change
+    if app.config['CONTENT_RELOAD_INTERVAL']:
+        registry.start(app.config['CONTENT_RELOAD_INTERVAL'])
     
-    memo[n] = fibonacci_memo(n - 1, memo) + fibonacci_memo(n - 2, memo)
-    return memo[n]
+    # Lint workers and Jedi are warmed up front so the first keystrokes are fast
+    lint_pool.warm()
+    completion_service.start()
+    judge_service.start()
 
-print(fibonacci_memo(50))
-</code></pre>
 
-<h3>Example 2: Fibonacci with Tabulation</h3>
-<pre><code>
-def fibonacci_tab(n):
-    if n <= 1:
-        return n
-    
-    dp = [0] * (n + 1)
-    dp[1] = 1
-    
-    for i in range(2, n + 1):
-        dp[i] = dp[i - 1] + dp[i - 2]
-    
-    return dp[n]
+if not app.config['WEB_PRELOAD']:
+    start_services()
 
-print(fibonacci_tab(50))
-</code></pre>
+# Fingerprinted, precompressed copies of static/ served under /assets
+assets.build()
 
-<h3>Example 3: Longest Common Subsequence</h3>
-<pre><code>
-def lcs(text1, text2):
-    m, n = len(text1), len(text2)
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-    
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            if text1[i - 1] == text2[j - 1]:
-                dp[i][j] = dp[i - 1][j - 1] + 1
-            else:
-                dp[i][j] = max(dp[i - 1][j], dp[i][j - 1])
-    
-    return dp[m][n]
 
-print(lcs("abcde", "ace"))  # Output: 3
-</code></pre>
+def monaco_url():
+    """Base URL of the Monaco editor, self-hosted when it has been fetched"""
+    version = app.config['MONACO_VERSION']
+    local = f"vendor/monaco-editor/{version}/vs"
+    if assets.has(f"{local}/loader.js"):
+        return assets.url(local)
+    return app.config['MONACO_CDN_URL'].format(version=version)
 
-<h3>Example 4: 0/1 Knapsack Problem</h3>
-<pre><code>
-def knapsack(weights, values, capacity):
-    n = len(weights)
-    dp = [[0] * (capacity + 1) for _ in range(n + 1)]
-    
-    for i in range(1, n + 1):
-        for w in range(1, capacity + 1):
-            if weights[i - 1] <= w:
-                dp[i][w] = max(
-                    values[i - 1] + dp[i - 1][w - weights[i - 1]],
-                    dp[i - 1][w]
-                )
-            else:
-                dp[i][w] = dp[i - 1][w]
-    
-    return dp[n][capacity]
-
-weights = [1, 2, 3, 4]
-values = [10, 20, 30, 40]
-capacity = 5
-print(knapsack(weights, values, capacity))
-</code></pre>
-            '''
-        }
-    ]
-}
-
-# Practice problems with test cases
-PROBLEMS = [
-    {
-        'id': 'two_sum',
-        'title': 'Two Sum',
-        'difficulty': 'Easy',
-        'description': '''Given an array of integers nums and an integer target, return indices of the two numbers such that they add up to target.
-
-You may assume that each input would have exactly one solution, and you may not use the same element twice.
-
-Example:
-Input: nums = [2,7,11,15], target = 9
-Output: [0,1]
-Explanation: Because nums[0] + nums[1] == 9, we return [0, 1].''',
-        'starter_code': '''def two_sum(nums, target):
-    # Write your code here
-    pass
-
-# Test your solution
-print(two_sum([2, 7, 11, 15], 9))''',
-        'test_cases': [
-            {'input': '[[2, 7, 11, 15], 9]', 'expected': '[0, 1]'},
-            {'input': '[[3, 2, 4], 6]', 'expected': '[1, 2]'},
-            {'input': '[[3, 3], 6]', 'expected': '[0, 1]'}
-        ]
-    },
-    {
-        'id': 'reverse_string',
-        'title': 'Reverse String',
-        'difficulty': 'Easy',
-        'description': '''Write a function that reverses a string. The input string is given as an array of characters.
-
-You must do this by modifying the input array in-place with O(1) extra memory.
-
-Example:
-Input: s = ["h","e","l","l","o"]
-Output: ["o","l","l","e","h"]''',
-        'starter_code': '''def reverse_string(s):
-    # Write your code here
-    pass
-
-# Test your solution
-s = ["h", "e", "l", "l", "o"]
-reverse_string(s)
-print(s)''',
-        'test_cases': [
-            {'input': '[["h", "e", "l", "l", "o"]]', 'expected': '["o", "l", "l", "e", "h"]'},
-            {'input': '[["H", "a", "n", "n", "a", "h"]]', 'expected': '["h", "a", "n", "n", "a", "H"]'}
-        ]
-    },
-    {
-        'id': 'valid_parentheses',
-        'title': 'Valid Parentheses',
-        'difficulty': 'Easy',
-        'description': '''Given a string s containing just the characters '(', ')', '{', '}', '[' and ']', determine if the input string is valid.
-
-An input string is valid if:
-1. Open brackets must be closed by the same type of brackets.
-2. Open brackets must be closed in the correct order.
-
-Example:
-Input: s = "()"
-Output: True
-
-Input: s = "()[]{}"
-Output: True
-
-Input: s = "(]"
-Output: False''',
-        'starter_code': '''def is_valid(s):
-    # Write your code here
-    pass
-
-# Test your solution
-print(is_valid("()"))
-print(is_valid("()[]{}"))
-print(is_valid("(]"))''',
-        'test_cases': [
-            {'input': '["()"]', 'expected': 'True'},
-            {'input': '["()[]{}"]', 'expected': 'True'},
-            {'input': '["(]"]', 'expected': 'False'},
-            {'input': '["([)]"]', 'expected': 'False'}
-        ]
-    },
-    {
-        'id': 'binary_search',
-        'title': 'Binary Search',
-        'difficulty': 'Easy',
-        'description': '''Given a sorted array of integers nums and an integer target, write a function to search target in nums. If target exists, return its index. Otherwise, return -1.
-
-You must write an algorithm with O(log n) runtime complexity.
-
-Example:
-Input: nums = [-1,0,3,5,9,12], target = 9
-Output: 4
-Explanation: 9 exists in nums and its index is 4''',
-        'starter_code': '''def binary_search(nums, target):
-    # Write your code here
-    pass
-
-# Test your solution
-print(binary_search([-1, 0, 3, 5, 9, 12], 9))''',
-        'test_cases': [
-            {'input': '[[-1, 0, 3, 5, 9, 12], 9]', 'expected': '4'},
-            {'input': '[[-1, 0, 3, 5, 9, 12], 2]', 'expected': '-1'},
-            {'input': '[[5], 5]', 'expected': '0'}
-        ]
-    },
-    {
-        'id': 'merge_sorted_arrays',
-        'title': 'Merge Two Sorted Arrays',
-        'difficulty': 'Medium',
-        'description': '''Given two sorted arrays, merge them into a single sorted array.
-
-Example:
-Input: arr1 = [1, 3, 5, 7], arr2 = [2, 4, 6, 8]
-Output: [1, 2, 3, 4, 5, 6, 7, 8]''',
-        'starter_code': '''def merge_sorted_arrays(arr1, arr2):
-    # Write your code here
-    pass
-
-# Test your solution
-print(merge_sorted_arrays([1, 3, 5, 7], [2, 4, 6, 8]))''',
-        'test_cases': [
-            {'input': '[[1, 3, 5, 7], [2, 4, 6, 8]]', 'expected': '[1, 2, 3, 4, 5, 6, 7, 8]'},
-            {'input': '[[1, 2, 3], [4, 5, 6]]', 'expected': '[1, 2, 3, 4, 5, 6]'},
-            {'input': '[[], [1, 2, 3]]', 'expected': '[1, 2, 3]'}
-        ]
-    }
-]
+
+app.jinja_env.globals.update(asset_url=assets.url, monaco_url=monaco_url,
+                             editor_socket=Sock is not None)
+
+request_seconds = metrics.histogram('http_request_seconds', 'Time to produce a response, by route',
+                                    ['method', 'route', 'status'])
+
+
+def route_name():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+    if profiler.enabled:
+        profiler.begin(request.method, route_name(), request.path)
+
+
+def finish_profile(status):
+    """Hand this request's profile, if any, to the judge service's store"""
+    profile = profiler.end(status)
+    if profile is None:
+        return
+    try:
+        profiler.apply(judge_service.store_profile(profile))
+    except JudgeServerError:
+        app.logger.exception('Storing a profile failed')
+
+
+@app.after_request
+def observe_latency(response):
+    """Record the request's latency; runs after the other hooks"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_seconds.labels(request.method, route_name(), response.status_code).observe(
+            time.perf_counter() - started)
+    finish_profile(response.status_code)
+    return response
+
+
+@app.teardown_request
+def discard_profile(exc):
+    # Requests that failed before the after_request hooks ran
+    finish_profile(500)
+
+
+@app.after_request
+def add_etag(response):
+    """Content-derived ETag and 304 handling for pages and JSON responses"""
+    if (request.method in ('GET', 'HEAD') and response.status_code == 200
+            and not response.direct_passthrough and not response.is_streamed):
+        if 'ETag' not in response.headers:
+            response.add_etag()
+        if 'Cache-Control' not in response.headers:
+            response.cache_control.no_cache = True
+        response.make_conditional(request)
+    return response
+
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Serve a built asset, precompressed when the client accepts it"""
+    path, encoding = assets.resolve(filename, request.accept_encodings)
+    if path is None:
+        abort(404)
+    
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(path, mimetype=mimetype, max_age=MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 @app.route('/')
+@cached_page
 def home():
     """Home page with overview"""
     return render_template('home.html', 
-                         data_structures=DSA_CONTENT['data_structures'],
-                         algorithms=DSA_CONTENT['algorithms'])
+                         data_structures=registry.lessons('data_structures'),
+                         algorithms=registry.lessons('algorithms'))
 
 
 @app.route('/learn/<category>/<topic_id>')
+@cached_page
 def learn_topic(category, topic_id):
     """Display learning content for a specific topic"""
-    topics = DSA_CONTENT.get(category, [])
-    topic = next((t for t in topics if t['id'] == topic_id), None)
+    topic = registry.lesson(category, topic_id)
     
     if not topic:
         return "Topic not found", 404
@@ -747,15 +173,17 @@ def learn_topic(category, topic_id):
 
 
 @app.route('/problems')
+@cached_page
 def problems_list():
     """List all practice problems"""
-    return render_template('problems.html', problems=PROBLEMS)
+    return render_template('problems.html', problems=registry.problems())
 
 
 @app.route('/problem/<problem_id>')
+@cached_page
 def problem_detail(problem_id):
     """Display a specific problem"""
-    problem = next((p for p in PROBLEMS if p['id'] == problem_id), None)
+    problem = registry.problem(problem_id)
     
     if not problem:
         return "Problem not found", 404
@@ -763,172 +191,358 @@ def problem_detail(problem_id):
     return render_template('problem_detail.html', problem=problem)
 
 
+def client_id():
+    """Anonymous identifier of the requesting user, kept in the session"""
+    if 'uid' not in session:
+        session['uid'] = uuid.uuid4().hex
+    return session['uid']
+
+
+def client_address():
+    """Address of the requesting client, which code executions are admitted
+    and scheduled under: a client can drop its session cookie, not its address"""
+    return request.remote_addr
+
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """429 or 503 for an execution that was not admitted, with when to retry"""
+    response = jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after})
+    response.status_code = e.status
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def validate_submission(data):
+    """Validate a submission request body.
+
+    Returns ``(code, problem, None)`` or ``(None, None, error_response)``.
+    """
+    code = data.get('code', '')
+    problem_id = data.get('problem_id', '')
+    
+    if not code:
+        return None, None, (jsonify({'error': 'No code provided'}), 400)
+    
+    if len(code) > app.config['MAX_CODE_LENGTH']:
+        return None, None, (jsonify({'error': 'Code too long'}), 400)
+    
+    # Find the problem
+    problem = registry.problem(problem_id)
+    if not problem:
+        return None, None, (jsonify({'error': 'Problem not found'}), 404)
+    
+    return code, problem, None
+
+
 @app.route('/submit', methods=['POST'])
 def submit_code():
     """Submit and execute code"""
     try:
-        data = request.get_json()
-        code = data.get('code', '')
-        problem_id = data.get('problem_id', '')
+        code, problem, error = validate_submission(request.get_json())
+        if error:
+            return error
         
-        if not code:
-            return jsonify({'error': 'No code provided'}), 400
+        # Load the submission once and run every test case against it
+        trace = profiling.current()
+        judge_started = time.perf_counter()
+        report = judge_service.judge(code, problem['id'], client_id(), client_address(),
+                                     trace=trace is not None)
+        if trace is not None:
+            trace.add('judge', judge_started, time.perf_counter() - judge_started)
+            trace.extend(report.pop('spans'), judge_started)
         
-        if len(code) > app.config['MAX_CODE_LENGTH']:
-            return jsonify({'error': 'Code too long'}), 400
-        
-        # Find the problem
-        problem = next((p for p in PROBLEMS if p['id'] == problem_id), None)
-        if not problem:
-            return jsonify({'error': 'Problem not found'}), 404
-        
-        # Execute code and run test cases
-        results = []
-        all_passed = True
-        
-        for i, test_case in enumerate(problem['test_cases']):
-            try:
-                # Prepare test code
-                test_code = code + f"\n\n# Test case {i+1}\n"
-                test_code += f"import json\n"
-                test_code += f"args = json.loads('{test_case['input']}')\n"
-                test_code += f"result = {problem['id']}(*args)\n"
-                test_code += f"print(json.dumps(result))"
-                
-                # Execute with timeout
-                start_time = time.time()
-                result = subprocess.run(
-                    [sys.executable, '-c', test_code],
-                    capture_output=True,
-                    text=True,
-                    timeout=app.config['CODE_TIMEOUT']
-                )
-                execution_time = time.time() - start_time
-                
-                output = result.stdout.strip()
-                expected = test_case['expected']
-                
-                # Compare results (normalize strings for comparison)
-                passed = output.replace(' ', '').replace("'", '"') == expected.replace(' ', '').replace("'", '"')
-                
-                if not passed:
-                    all_passed = False
-                
-                results.append({
-                    'test_case': i + 1,
-                    'input': test_case['input'],
-                    'expected': expected,
-                    'output': output,
-                    'passed': passed,
-                    'execution_time': f"{execution_time:.3f}s",
-                    'error': result.stderr if result.stderr else None
-                })
-                
-            except subprocess.TimeoutExpired:
-                all_passed = False
-                results.append({
-                    'test_case': i + 1,
-                    'input': test_case['input'],
-                    'expected': test_case['expected'],
-                    'output': '',
-                    'passed': False,
-                    'execution_time': f">{app.config['CODE_TIMEOUT']}s",
-                    'error': 'Time Limit Exceeded'
-                })
-            except Exception as e:
-                all_passed = False
-                results.append({
-                    'test_case': i + 1,
-                    'input': test_case['input'],
-                    'expected': test_case['expected'],
-                    'output': '',
-                    'passed': False,
-                    'execution_time': '0s',
-                    'error': str(e)
-                })
-        
-        return jsonify({
-            'success': True,
-            'all_passed': all_passed,
-            'results': results
-        })
+        with profiling.span('serialize'):
+            return jsonify(dict(report, success=True))
         
+    except Overloaded as e:
+        return overloaded(e)
+    except Exception as e:
+        app.logger.exception('Judging a submission failed')
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/submissions', methods=['POST'])
+def create_submission_job():
+    """Queue a submission and return its job id right away"""
+    code, problem, error = validate_submission(request.get_json())
+    if error:
+        return error
+    
+    response = judge_service.submit_job(code, problem['id'], client_id(), client_address())
+    response['events_url'] = f"/api/submissions/{response['job_id']}/events"
+    return jsonify(response), 202
+
+
+@app.route('/api/submissions/<job_id>', methods=['GET'])
+def poll_submission_job(job_id):
+    """Polling fallback: job state plus events after ``since``"""
+    since = request.args.get('since', 0, type=int)
+    timeout = min(request.args.get('wait', 0, type=float), app.config['JOB_POLL_MAX_WAIT'])
+    state = judge_service.poll_job(job_id, since, timeout)
+    if not state:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(state)
+
+
+@app.route('/api/submissions/<job_id>/events', methods=['GET'])
+def stream_submission_job(job_id):
+    """Server-Sent Events stream of a job's events"""
+    since = request.headers.get('Last-Event-ID', -1, type=int) + 1
+    if not judge_service.poll_job(job_id, since):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        position = since
+        while True:
+            state = judge_service.poll_job(job_id, position, app.config['SSE_HEARTBEAT'])
+            if not state:
+                return
+            if not state['events']:
+                yield ': keep-alive\n\n'
+                continue
+            for event in state['events']:
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            position = state['next']
+            if state['status'] in ('done', 'cancelled', 'failed'):
+                return
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/submissions/<job_id>', methods=['DELETE'])
+def cancel_submission_job(job_id):
+    """Cancel a queued or running job"""
+    state = judge_service.cancel_job(job_id)
+    if not state:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(state)
+
+
+@app.route('/api/history', methods=['GET'])
+def submission_history():
+    """The user's judged submissions, newest first, optionally for one
+    ``problem_id``; pass ``next`` as ``before`` for the following page"""
+    submissions = judge_service.history(
+        client_id(),
+        problem_id=request.args.get('problem_id'),
+        before=request.args.get('before', type=float),
+        limit=request.args.get('limit', 50, type=int)
+    )
+    return jsonify({'submissions': submissions,
+                    'next': submissions[-1]['created'] if submissions else None})
+
+
+@app.route('/api/history/<submission_id>', methods=['GET'])
+def submission_detail(submission_id):
+    """One of the user's submissions with its test results, timing and code"""
+    submission = judge_service.submission(submission_id, client_id())
+    if submission is None:
+        return jsonify({'error': 'Submission not found'}), 404
+    return jsonify(submission)
+
+
+@app.route('/api/problems/<problem_id>/leaderboard', methods=['GET'])
+def problem_leaderboard(problem_id):
+    """A page of the problem's accepted solutions ranked by ``metric``
+    (``runtime`` or ``memory``), with the user's own rank as ``me``"""
+    if not registry.problem(problem_id):
+        return jsonify({'error': 'Problem not found'}), 404
+    
+    metric = request.args.get('metric', 'runtime')
+    if metric not in leaderboard.METRICS:
+        return jsonify({'error': f"metric must be one of {', '.join(leaderboard.METRICS)}"}), 400
+    
+    return jsonify(judge_service.leaderboard(
+        problem_id, metric,
+        offset=request.args.get('offset', 0, type=int),
+        limit=request.args.get('limit', app.config['LEADERBOARD_PAGE_SIZE'], type=int),
+        client_id=client_id()
+    ))
+
+
+@app.route('/api/analyze', methods=['POST'])
+def analyze_code():
+    """Estimate a submission's time complexity on growing generated inputs"""
+    try:
+        code, problem, error = validate_submission(request.get_json())
+        if error:
+            return error
+
+        if not problem.get('complexity'):
+            return jsonify({'error': 'Complexity analysis is not available for this problem'}), 400
+
+        analysis = judge_service.analyze(code, problem['id'], client_address())
+        return jsonify(dict(analysis, success=True))
+
+    except Overloaded as e:
+        return overloaded(e)
     except Exception as e:
+        app.logger.exception('Complexity analysis failed')
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/calibration', methods=['GET'])
+def calibration():
+    """Reference timings and the per-test time limits derived from them"""
+    return jsonify(judge_service.calibration())
+
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Judge cache, page cache, editor services and scheduler statistics"""
+    return jsonify(dict(judge_service.stats(), **{
+        'page_cache': page_cache.stats(),
+        'lint': lint_pool.stats(),
+        'completion': completion_service.stats(),
+        'supersession': {
+            'lint': lint_requests.stats(),
+            'completion': completion_requests.stats()
+        }
+    }))
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metrics of every web worker and the judge, in the Prometheus text format"""
+    return Response(metrics.render(judge_service.metrics()), mimetype='text/plain; version=0.0.4')
+
+
+def require_admin():
+    """Abort unless the request carries ``Authorization: Bearer <ADMIN_TOKEN>``"""
+    token = app.config['ADMIN_TOKEN']
+    if not token:
+        abort(404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+        abort(403)
+
+
+@app.route('/admin/profiling', methods=['GET'])
+def profiling_status():
+    """Profiling settings and the profiles kept"""
+    require_admin()
+    return jsonify(judge_service.profiling())
+
+
+@app.route('/admin/profiling', methods=['PUT', 'DELETE'])
+def configure_profiling():
+    """Turn profiling on with ``{"mode", "rate", "routes", "count"}``, or off"""
+    require_admin()
+    if request.method == 'DELETE':
+        settings = profiling.make_settings(enabled=False)
+    else:
+        data = request.get_json(silent=True) or {}
+        try:
+            settings = profiling.make_settings(
+                mode=data.get('mode', 'deterministic'),
+                rate=data.get('rate', 1.0),
+                routes=data.get('routes'),
+                count=data.get('count')
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+    settings = judge_service.configure_profiling(settings)
+    profiler.apply(settings)
+    return jsonify(settings)
+
+
+@app.route('/admin/profiling/<int:profile_id>', methods=['GET'])
+def profile_summary(profile_id):
+    """A profile's request, duration and spans"""
+    require_admin()
+    profile = judge_service.profile(profile_id)
+    if profile is None:
+        abort(404)
+    return jsonify(profiling.summary(profile))
+
+
+@app.route('/admin/profiling/<int:profile_id>/<filename>', methods=['GET'])
+def profile_download(profile_id, filename):
+    """A profile in the pstats format (deterministic) or as folded stacks (sampling)"""
+    require_admin()
+    profile = judge_service.profile(profile_id)
+    if profile is None or filename != profiling.filename(profile):
+        abort(404)
+    mimetype = 'application/octet-stream' if profile['mode'] == 'deterministic' else 'text/plain'
+    return Response(base64.b64decode(profile['data']), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+
+def editor_id(data):
+    """Key of the editor sending a lint or completion request.
+
+    Sequence numbers restart with every page load, so each page sends its
+    own ``editor_id``; older clients are keyed by problem.
+    """
+    return f"{client_id()}-{data.get('editor_id') or data.get('problem_id', '')}"
+
+
 @app.route('/api/lint', methods=['POST'])
 def lint_code():
-    """Lint code using flake8"""
+    """Lint code in the warm lint worker pool"""
     try:
         data = request.get_json()
         code = data.get('code', '')
         
-        style_guide = flake8.get_style_guide(ignore=['E501'])
-        
-        # Flake8 API expects a file, so we process the string via a Report helper or temporary approach
-        # A simpler way for string content is using check_files if we write to temp, 
-        # or hooking into the reporting.
-        # However, dealing with in-memory strings is tricky with standard flake8 API.
-        # Alternatively, we can use subprocess which is safer and easier.
-        
-        # Using subprocess for flake8 on stdin
-        proc = subprocess.Popen(
-            [sys.executable, '-m', 'flake8', '-', '--format=%(row)d:%(col)d:%(code)s:%(text)s'],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        stdout, stderr = proc.communicate(input=code)
-        
-        markers = []
-        for line in stdout.splitlines():
-            parts = line.split(':', 3)
-            if len(parts) >= 4:
-                row, col, code, text = parts
-                markers.append({
-                    'startLineNumber': int(row),
-                    'startColumn': int(col),
-                    'endLineNumber': int(row),
-                    'endColumn': int(col) + 1, # Heuristic
-                    'message': f"{code}: {text}",
-                    'severity': 8 # MarkerSeverity.Error = 8
-                })
+        if len(code) > app.config['MAX_CODE_LENGTH']:
+            return jsonify({'error': 'Code too long'}), 400
         
-        return jsonify({'markers': markers})
+        # A newer request from the same editor (page load) supersedes this one
+        editor_key = editor_id(data)
+        problems = lint_requests.run(editor_key, data.get('seq'),
+                                     lambda should_stop: lint_pool.lint(code, should_stop))
+        return jsonify({'markers': lint.markers(problems)})
         
+    except Superseded:
+        return jsonify({'superseded': True})
+    except lint.LintError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
+        app.logger.exception('Linting failed')
         return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/complete', methods=['POST'])
 def complete_code():
-    """Provide code completions using Jedi"""
+    """Provide code completions using the shared Jedi service"""
+    data = request.get_json()
+    code = data.get('code', '')
+    line = data.get('line', 1)
+    column = data.get('column', 0)
+    session_id = editor_id(data)
+    
     try:
-        data = request.get_json()
-        code = data.get('code', '')
-        line = data.get('line', 1)
-        column = data.get('column', 0)
-        
-        script = jedi.Script(code)
-        completions = script.complete(line, column)
+        suggestions, incomplete = completion_requests.run(
+            session_id, data.get('seq'),
+            lambda should_stop: completion_service.complete(session_id, code, line, column, should_stop)
+        )
+    except Superseded:
+        return jsonify({'suggestions': [], 'incomplete': True, 'superseded': True})
+    with profiling.span('serialize'):
+        return jsonify({'suggestions': suggestions, 'incomplete': incomplete})
+
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/ws/editor')
+    def editor_channel(ws):
+        """Editor channel: document deltas in, lint markers and completions out"""
+        send_lock = threading.Lock()
         
-        suggestions = []
-        for c in completions:
-            suggestions.append({
-                'label': c.name,
-                'kind': 1, # 1: Text, can refine based on c.type
-                'insertText': c.name,
-                'detail': c.description
-            })
-            
-        return jsonify({'suggestions': suggestions})
+        def send(replies):
+            with send_lock:
+                for reply in replies:
+                    ws.send(json.dumps(reply))
         
-    except Exception as e:
-        # Jedi can be fragile with incomplete code, return empty on error
-        print(f"Jedi error: {e}")
-        return jsonify({'suggestions': []})
+        editor_session = EditorSession(client_id())
+        try:
+            while True:
+                editor_session.dispatch(json.loads(ws.receive()), send)
+        finally:
+            editor_session.close()
 
 
 @app.route('/run', methods=['POST'])
@@ -944,29 +558,34 @@ def run_code():
         if len(code) > app.config['MAX_CODE_LENGTH']:
             return jsonify({'error': 'Code too long'}), 400
         
-        # Execute code with timeout
-        start_time = time.time()
-        result = subprocess.run(
-            [sys.executable, '-c', code],
-            capture_output=True,
-            text=True,
-            timeout=app.config['CODE_TIMEOUT']
-        )
-        execution_time = time.time() - start_time
+        # Execute code with timeout in a forked sandbox worker
+        reply = judge_service.run(code, client_address())
+        result = sandbox.Execution(**reply['execution'])
+        total_time = reply['total_time']
+        
+        verdict = judge.execution_verdict(result)
+        if verdict == 'TLE':
+            return jsonify({
+                'success': False,
+                'verdict': verdict,
+                'error': 'Time Limit Exceeded'
+            }), 408
         
         return jsonify({
             'success': True,
+            'verdict': verdict or 'OK',
             'output': result.stdout,
-            'error': result.stderr,
-            'execution_time': f"{execution_time:.3f}s"
+            'error': result.stderr or judge.VERDICT_ERRORS.get(verdict, ''),
+            'execution_time': judge.format_duration(result.usage['wall_time']),
+            'cpu_time': judge.format_duration(result.usage['cpu_time']),
+            'peak_rss_kb': result.usage['max_rss_kb'],
+            'overhead_ms': round(max(0.0, total_time - result.usage['wall_time']) * 1000, 3)
         })
         
-    except subprocess.TimeoutExpired:
-        return jsonify({
-            'success': False,
-            'error': 'Time Limit Exceeded'
-        }), 408
+    except Overloaded as e:
+        return overloaded(e)
     except Exception as e:
+        app.logger.exception('Running code failed')
         return jsonify({
             'success': False,
             'error': str(e)
@@ -0,0 +1,136 @@
+"""Fingerprinted, precompressed static assets.
+
+At start-up every file under ``static/`` is copied into ``ASSET_BUILD_DIR``
+under a name containing a hash of its content (``css/style.3f2a9c1d0b7e.css``),
+next to ``.gz`` and, when the ``brotli`` package is installed, ``.br``
+variants.  Since a changed file gets a new URL, assets can be cached by
+browsers forever.  Files under ``vendor/`` keep their names, as third-party
+bundles load each other by relative path; their directories already carry
+the bundle's version.
+
+Build outputs are named after their content, so building again, or from
+several processes at once, only writes what is missing.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from config import Config
+
+# Extensions worth storing compressed; images and fonts are already compressed
+COMPRESSIBLE = {'.css', '.js', '.json', '.html', '.svg', '.map', '.txt', '.ttf'}
+
+# Files smaller than this are served as they are
+MIN_COMPRESS_SIZE = 512
+
+# Encodings by preference, with the suffix of their precompressed files
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+HASH_LENGTH = 12
+
+# Assets are cached by browsers for a year without revalidation
+MAX_AGE = 365 * 24 * 3600
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class AssetManifest:
+    """Maps static file names to their fingerprinted URLs and variants"""
+
+    def __init__(self, source, build_dir, url_prefix='/assets'):
+        self.source = source
+        self.build_dir = build_dir
+        self.url_prefix = url_prefix
+        self.files = {}  # static file name -> built file name
+        self.encodings = {}  # built file name -> encodings available besides identity
+
+    def _build_file(self, name):
+        with open(os.path.join(self.source, name), 'rb') as f:
+            data = f.read()
+        if name.startswith('vendor/'):
+            built = name
+        else:
+            stem, ext = os.path.splitext(name)
+            built = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+        path = os.path.join(self.build_dir, built)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Vendor files are versioned by their directory, not their name
+        written = not os.path.exists(path) or (built == name and os.path.getsize(path) != len(data))
+        if written:
+            _write_atomic(path, data)
+
+        encodings = set()
+        if os.path.splitext(name)[1] in COMPRESSIBLE and len(data) >= MIN_COMPRESS_SIZE:
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                if written or not os.path.exists(path + suffix):
+                    compressed = _compress(encoding, data)
+                    if len(compressed) >= len(data):
+                        continue
+                    _write_atomic(path + suffix, compressed)
+                encodings.add(encoding)
+        return built, encodings
+
+    def build(self):
+        """Fingerprint and compress every static file, then swap in the new manifest"""
+        files, encodings = {}, {}
+        for root, dirs, names in os.walk(self.source):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(names):
+                if name.startswith('.'):
+                    continue
+                rel = os.path.relpath(os.path.join(root, name), self.source).replace(os.sep, '/')
+                built, available = self._build_file(rel)
+                files[rel] = built
+                encodings[built] = available
+        self.files, self.encodings = files, encodings
+        return len(files)
+
+    def url(self, name):
+        """URL of a static file; unknown files get their unversioned URL"""
+        return f"{self.url_prefix}/{self.files.get(name, name)}"
+
+    def has(self, name):
+        return name in self.files
+
+    def resolve(self, built, accept_encodings):
+        """Path and encoding of the best variant of a built file for a request.
+
+        ``accept_encodings`` is the request's ``Accept-Encoding`` header as
+        parsed by Werkzeug.  Returns ``(None, None)`` for unknown files.
+        """
+        available = self.encodings.get(built)
+        if available is None:
+            return None, None
+        path = os.path.join(self.build_dir, built)
+        for encoding, suffix in ENCODINGS:
+            if encoding in available and accept_encodings[encoding]:
+                return path + suffix, encoding
+        return path, None
+
+
+assets = AssetManifest(Config.STATIC_DIR, Config.ASSET_BUILD_DIR)
+
+
+if __name__ == '__main__':
+    count = assets.build()
+    compressed = sum(1 for available in assets.encodings.values() if available)
+    print(f"{count} assets built in {assets.build_dir} ({compressed} precompressed)")
@@ -0,0 +1,363 @@
+"""Load and latency benchmarks of the app's endpoints.
+
+Usage::
+
+    python bench.py [--url http://127.0.0.1:5000] [--scenarios pages,submit,editor]
+                    [--concurrency 1,4,16] [--duration 10] [--warmup 2]
+    python bench.py --compare before.json after.json
+
+Without ``--url`` the app is driven in-process through Flask's test client;
+with it, over HTTP with one keep-alive connection per simulated user.  Each
+scenario runs at each concurrency level, with that many users sending
+requests back to back:
+
+- ``pages``: the home page, problem list, problem pages and lessons
+- ``submit``: ``/submit`` with a correct, a wrong, a timing-out and a
+  huge-output submission for every problem, each made unique so that the
+  result cache cannot answer it (unless ``--cached``)
+- ``editor``: the reference solution typed out keystroke by keystroke,
+  with completions requested on identifiers and lint every few keystrokes,
+  ``--keystroke-interval`` seconds apart, as the problem page would
+
+Throughput and p50/p95/p99 latencies are printed per scenario and request
+kind, and written as JSON to ``--output`` for comparison between releases.
+Only requests completed within the measured window count; those still
+running when it closes are reported as ``unfinished``, and a scenario
+without any completed request is flagged, as its duration is too short.
+Executions are rate-limited per client address (see ``ADMISSION_*``), which
+all simulated users share; in-process runs raise the limits unless they are
+set, and 429 responses are reported.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+import urllib.parse
+
+# In-process runs measure capacity, not the per-client rate limits
+for name, value in (('ADMISSION_RATE', '1000'), ('ADMISSION_BURST', '1000'),
+                    ('ADMISSION_MAX_PER_CLIENT', '1000')):
+    os.environ.setdefault(name, value)
+
+from config import Config  # noqa: E402
+from registry import registry  # noqa: E402
+
+PERCENTILES = (50, 95, 99)
+
+# Keystrokes between lint requests while typing
+LINT_EVERY = 8
+
+
+# -- clients ------------------------------------------------------------------
+
+class InProcessClient:
+    """One user of the app through Flask's test client"""
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HTTPClient:
+    """One user of a running server over a keep-alive connection"""
+
+    def __init__(self, url, timeout=60):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.timeout = timeout
+        self.cookie = None
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, data, headers)
+                response = self.conn.getresponse()
+                payload = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # The server closed an idle keep-alive connection
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, payload
+
+
+# -- payloads -----------------------------------------------------------------
+
+def submissions(problem):
+    """``(kind, code)`` of a correct, wrong, timing-out and huge-output submission"""
+    starter = problem['starter_code']
+    return [
+        ('correct', problem['reference']),
+        ('wrong', starter),
+        ('timeout', starter.replace('pass', 'while True: pass', 1)),
+        ('output', starter.replace('pass', "print('x' * 10 ** 7)", 1)),
+    ]
+
+
+def page_requests():
+    paths = ['/', '/problems']
+    paths += [f"/problem/{problem['id']}" for problem in registry.problems()]
+    for category in ('data_structures', 'algorithms'):
+        paths += [f"/learn/{category}/{lesson['id']}" for lesson in registry.lessons(category)]
+    while True:
+        for path in paths:
+            yield 'page', 'GET', path, None, 0
+
+
+def submit_requests(cached):
+    while True:
+        for problem in registry.problems():
+            for kind, code in submissions(problem):
+                if not cached:
+                    # A new statement changes the AST, so the result cache cannot answer
+                    code += f"\n_bench_nonce = {random.getrandbits(64)}\n"
+                yield f"submit:{kind}", 'POST', '/submit', {'code': code, 'problem_id': problem['id']}, 0
+
+
+def editor_requests(keystroke_interval):
+    """Typing each reference solution, as the problem page's editor would"""
+    seq = 0
+    while True:
+        for problem in registry.problems():
+            code = problem['reference']
+            for end in range(1, len(code) + 1):
+                text = code[:end]
+                lines = text.split('\n')
+                char = text[-1]
+                if char.isalnum() or char in '_.':
+                    seq += 1
+                    yield 'complete', 'POST', '/api/complete', {
+                        'code': text, 'line': len(lines), 'column': len(lines[-1]),
+                        'problem_id': problem['id'], 'seq': seq,
+                    }, keystroke_interval
+                if end % LINT_EVERY == 0 or end == len(code):
+                    seq += 1
+                    yield 'lint', 'POST', '/api/lint', {
+                        'code': text, 'problem_id': problem['id'], 'seq': seq,
+                    }, keystroke_interval
+
+
+def scenario_requests(name, args):
+    if name == 'pages':
+        return page_requests()
+    if name == 'submit':
+        return submit_requests(args.cached)
+    if name == 'editor':
+        return editor_requests(args.keystroke_interval)
+    raise SystemExit(f"Unknown scenario {name!r}")
+
+
+# -- running ------------------------------------------------------------------
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, -(-len(ordered) * p // 100) - 1))]
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles in ms and status counts of ``(latency, status)`` samples"""
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    summary = {
+        'requests': len(samples),
+        'throughput': round(len(samples) / elapsed, 3) if elapsed else 0,
+        'statuses': statuses,
+        'latency_ms': {
+            f"p{p}": round(percentile(latencies, p) * 1000, 3) if latencies else None
+            for p in PERCENTILES
+        },
+    }
+    if latencies:
+        summary['latency_ms'].update(mean=round(sum(latencies) / len(latencies) * 1000, 3),
+                                     max=round(latencies[-1] * 1000, 3))
+    return summary
+
+
+def run(scenario, concurrency, args, make_client):
+    """Run ``scenario`` with ``concurrency`` users; returns its summary"""
+    samples = []
+    lock = threading.Lock()
+    start = time.monotonic() + args.warmup
+    stop = start + args.duration
+    errors = []
+    in_flight = []
+
+    def user(index):
+        client = make_client()
+        recorded = []
+        unfinished = []
+        # Users start at different points of the scenario instead of in lockstep
+        requests = itertools.islice(scenario_requests(scenario, args), index, None)
+        try:
+            for label, method, path, body, pause in requests:
+                if time.monotonic() >= stop:
+                    break
+                began = time.perf_counter()
+                status, _ = client.request(method, path, body)
+                latency = time.perf_counter() - began
+                # Only requests completed within the measured window count;
+                # those still running when it closed are reported apart
+                finished = time.monotonic()
+                if start <= finished <= stop:
+                    recorded.append((label, latency, status))
+                elif finished > stop:
+                    unfinished.append(label)
+                if pause:
+                    time.sleep(pause)
+        except Exception as e:
+            errors.append(str(e))
+        with lock:
+            samples.extend(recorded)
+            in_flight.extend(unfinished)
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = args.duration
+    result = dict(summarize([(latency, status) for _, latency, status in samples], elapsed),
+                  scenario=scenario, concurrency=concurrency, duration=elapsed, errors=errors[:10],
+                  unfinished=len(in_flight))
+    labels = sorted({label for label, _, _ in samples})
+    result['by_kind'] = {
+        label: summarize([(latency, status) for l, latency, status in samples if l == label], elapsed)
+        for label in labels
+    }
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _latencies(summary):
+    latency = summary['latency_ms']
+    return '  '.join(f"p{p} {latency[f'p{p}']}ms" if latency[f'p{p}'] is not None else f"p{p} -"
+                     for p in PERCENTILES)
+
+
+def print_result(result):
+    print(f"{result['scenario']:>8} x{result['concurrency']:<4} {result['throughput']:>9.1f} req/s  "
+          f"{_latencies(result)}  {result['statuses']}")
+    if result['unfinished']:
+        print(f"{'':>15}{result['unfinished']} requests still running when the window closed, not counted")
+    if not result['requests']:
+        print(f"{'':>15}warning: no request completed within the measured window; raise --duration")
+    for label, summary in result['by_kind'].items():
+        print(f"{'':>15}{label:<16} {summary['throughput']:>9.1f} req/s  {_latencies(summary)}  "
+              f"{summary['statuses']}")
+    for error in result['errors']:
+        print(f"{'':>15}error: {error}")
+
+
+def compare(before_path, after_path):
+    """Print throughput and latency changes between two result files"""
+    with open(before_path) as f:
+        before = {(r['scenario'], r['concurrency']): r for r in json.load(f)['runs']}
+    with open(after_path) as f:
+        after = {(r['scenario'], r['concurrency']): r for r in json.load(f)['runs']}
+
+    def change(old, new):
+        if not old or new is None:
+            return 'n/a'
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    for key in sorted(before.keys() & after.keys()):
+        old, new = before[key], after[key]
+        print(f"{key[0]:>8} x{key[1]:<4} throughput {change(old['throughput'], new['throughput'])}  " + '  '.join(
+            f"p{p} {change(old['latency_ms'][f'p{p}'], new['latency_ms'][f'p{p}'])}" for p in PERCENTILES
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='benchmark a running server instead of the app in-process')
+    parser.add_argument('--scenarios', default='pages,submit,editor')
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated numbers of users')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds measured per run')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds not measured at the start of each run')
+    parser.add_argument('--cached', action='store_true',
+                        help='resubmit identical code, measuring the result cache instead of the judge')
+    parser.add_argument('--keystroke-interval', type=float, default=0.1, help='seconds between keystrokes')
+    parser.add_argument('--output', default='bench_results', help='directory for the JSON results')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.url:
+        def make_client():
+            return HTTPClient(args.url)
+    else:
+        InProcessClient()  # Import the app and start its services before the clock runs
+
+        def make_client():
+            return InProcessClient()
+
+    runs = []
+    for scenario in args.scenarios.split(','):
+        for concurrency in [int(n) for n in args.concurrency.split(',')]:
+            result = run(scenario, concurrency, args, make_client)
+            print_result(result)
+            runs.append(result)
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, time.strftime('bench-%Y%m%d-%H%M%S.json'))
+    with open(path, 'w') as f:
+        json.dump({
+            'meta': {
+                'created': time.time(),
+                'revision': git_revision(),
+                'target': args.url or 'in-process',
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+                'duration': args.duration,
+                'warmup': args.warmup,
+                'keystroke_interval': args.keystroke_interval,
+                'cached': args.cached,
+                'judge_slots': Config.JUDGE_SLOTS,
+                'code_timeout': Config.CODE_TIMEOUT,
+            },
+            'runs': runs,
+        }, f, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == '__main__':
+    main()
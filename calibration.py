@@ -0,0 +1,107 @@
+"""Per-test time limits calibrated against each problem's reference solution"""
+import threading
+import time
+
+import judge
+from config import Config
+from result_cache import suite_version
+
+
+class Calibrator:
+    """Times reference solutions on this machine and derives time limits.
+
+    Each test case's limit is ``multiplier`` times the reference solution's
+    fastest time over ``runs`` runs, clamped to ``[minimum, maximum]``.
+    Problems are calibrated at start-up and then every ``interval``
+    seconds, so limits follow the hardware and its current load; until a
+    problem has been calibrated, or after its tests change, its tests get
+    the ``maximum`` limit.  ``problems`` is a callable returning the
+    problems to calibrate.
+    """
+
+    def __init__(self, problems, multiplier, minimum, maximum, runs=3, interval=0):
+        self.problems = problems
+        self.multiplier = multiplier
+        self.minimum = minimum
+        self.maximum = maximum
+        self.runs = runs
+        self.interval = interval
+        self._entries = {}  # problem id -> latest calibration
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _measure(self, problem):
+        """Fastest time of each test case over ``runs`` reference runs"""
+        best = None
+        for _ in range(self.runs):
+            results, all_passed, _ = judge.run_submission(
+                problem['reference'], problem, self.maximum, Config.SUBMIT_TIME_BUDGET,
+                client_id='calibration'
+            )
+            if not all_passed:
+                failed = next(r for r in results if not r['passed'])
+                raise ValueError(f"Reference solution fails test case {failed['test_case']}: "
+                                 f"{failed['verdict']}")
+            times = [r['wall_time_ms'] / 1000 for r in results]
+            best = times if best is None else [min(a, b) for a, b in zip(best, times)]
+        return best
+
+    def calibrate(self, problem):
+        """Recalibrate one problem; failures are recorded, keeping old limits"""
+        started = time.monotonic()
+        suite = suite_version(problem)
+        previous = self._entries.get(problem['id'], {})
+        if previous.get('suite') != suite:
+            previous = {}
+        entry = dict(previous, calibrated_at=time.time(), error=None, suite=suite)
+        try:
+            reference = self._measure(problem)
+        except Exception as e:
+            entry['error'] = str(e)
+        else:
+            entry['reference_ms'] = [round(t * 1000, 3) for t in reference]
+            entry['limits'] = [min(self.maximum, max(self.minimum, t * self.multiplier))
+                               for t in reference]
+        entry['duration_ms'] = round((time.monotonic() - started) * 1000, 3)
+        with self._lock:
+            self._entries[problem['id']] = entry
+        return entry
+
+    def calibrate_all(self):
+        for problem in self.problems():
+            if problem.get('reference') and not self._stop.is_set():
+                self.calibrate(problem)
+
+    def test_limits(self, problem):
+        """Per-test time limits in seconds, or None while uncalibrated"""
+        with self._lock:
+            entry = self._entries.get(problem['id'])
+        if not entry or entry['suite'] != suite_version(problem):
+            return None
+        return entry.get('limits')
+
+    def snapshot(self):
+        with self._lock:
+            problems = {pid: dict(entry) for pid, entry in self._entries.items()}
+        return {
+            'multiplier': self.multiplier,
+            'minimum': self.minimum,
+            'maximum': self.maximum,
+            'interval': self.interval,
+            'problems': problems,
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.calibrate_all()
+            if not self.interval or self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        """Calibrate in a background thread, repeating every ``interval``"""
+        self._thread = threading.Thread(target=self._run, name='calibrator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,155 @@
+"""Framed result channel between the judge harness and the parent.
+
+Each frame is ``kind (1 byte) | meta length (4) | value length (4)`` followed
+by a JSON metadata object and the serialized return value.  Values are
+encoded either as tagged JSON or, for long lists of integers, as a packed
+array of 64-bit integers that the parent can compare without parsing.
+
+Fixture input files reuse the value encoding: they hold the call's
+arguments as a sequence of length-prefixed encoded values.
+
+This module is imported by the sandboxed child and must only use the
+standard library.
+"""
+import json
+import struct
+from array import array
+
+FRAME = struct.Struct('>cII')
+ARG_SIZE = struct.Struct('>Q')
+
+# Frame kinds
+LOADED = b'R'
+LOAD_ERROR = b'L'
+TEST = b'T'
+
+# Value encodings
+JSON = b'j'
+INT_ARRAY = b'q'
+
+# Lists of at least this many integers are sent as packed arrays
+ARRAY_THRESHOLD = 256
+
+_INT64_MIN, _INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class Unordered(list):
+    """Decoded set: compared without regard to order"""
+
+
+class Opaque(str):
+    """Decoded value that could not be serialized; holds its repr"""
+
+
+def _tag(value):
+    """Convert a value to JSON-serializable form, tagging non-JSON types"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_tag(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {'$set': [_tag(v) for v in value]}
+    if isinstance(value, dict):
+        if all(isinstance(k, str) and not k.startswith('$') for k in value):
+            return {k: _tag(v) for k, v in value.items()}
+        return {'$dict': [[_tag(k), _tag(v)] for k, v in value.items()]}
+    return {'$repr': repr(value)}
+
+
+def _untag(obj):
+    if len(obj) == 1:
+        if '$set' in obj:
+            return Unordered(obj['$set'])
+        if '$repr' in obj:
+            return Opaque(obj['$repr'])
+        if '$dict' in obj:
+            try:
+                return {_hashable(k): v for k, v in obj['$dict']}
+            except TypeError:
+                return obj['$dict']
+    return obj
+
+
+def _hashable(value):
+    if isinstance(value, list):
+        return tuple(_hashable(v) for v in value)
+    return value
+
+
+def _is_int64_list(value):
+    return (isinstance(value, (list, tuple)) and len(value) >= ARRAY_THRESHOLD
+            and all(type(v) is int and _INT64_MIN <= v <= _INT64_MAX for v in value))
+
+
+def encode_value(value):
+    """Serialize a return value for the result channel"""
+    if _is_int64_list(value):
+        return INT_ARRAY + array('q', value).tobytes()
+    try:
+        data = json.dumps(_tag(value))
+    except (RecursionError, ValueError):
+        data = json.dumps({'$repr': repr(value)})
+    return JSON + data.encode('utf-8')
+
+
+def decode_value(data):
+    """Inverse of :func:`encode_value`; ``data`` may be any bytes-like object"""
+    encoding, body = bytes(data[:1]), data[1:]
+    if encoding == INT_ARRAY:
+        values = array('q')
+        values.frombytes(body)
+        return values
+    return json.loads(bytes(body), object_hook=_untag)
+
+
+def encode_args(args):
+    """Serialize a list of call arguments for a fixture input file"""
+    parts = []
+    for arg in args:
+        data = encode_value(arg)
+        parts.append(ARG_SIZE.pack(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def decode_args(data):
+    """Inverse of :func:`encode_args`, reading from a bytes-like object
+    such as an mmap; packed arrays are turned back into lists"""
+    args = []
+    view = memoryview(data)
+    offset = 0
+    try:
+        while offset < len(view):
+            size, = ARG_SIZE.unpack_from(view, offset)
+            offset += ARG_SIZE.size
+            value = decode_value(view[offset:offset + size])
+            args.append(value.tolist() if isinstance(value, array) else value)
+            offset += size
+    finally:
+        view.release()
+    return args
+
+
+def encode_frame(kind, meta, value=b''):
+    meta = json.dumps(meta).encode('utf-8')
+    return FRAME.pack(kind, len(meta), len(value)) + meta + value
+
+
+class FrameReader:
+    """Incrementally splits a byte stream into ``(kind, meta, value)`` frames"""
+
+    def __init__(self, on_frame):
+        self.on_frame = on_frame
+        self._buffer = bytearray()
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        while len(self._buffer) >= FRAME.size:
+            kind, meta_size, value_size = FRAME.unpack_from(self._buffer)
+            end = FRAME.size + meta_size + value_size
+            if len(self._buffer) < end:
+                break
+            meta = json.loads(bytes(self._buffer[FRAME.size:FRAME.size + meta_size]))
+            value = bytes(self._buffer[FRAME.size + meta_size:end])
+            del self._buffer[:end]
+            self.on_frame(kind, meta, value)
@@ -0,0 +1,131 @@
+"""Typed comparison of submission results against expected values.
+
+Problems may tune comparison with a ``compare`` dict:
+
+- ``unordered``: the top-level sequence may be returned in any order
+- ``float_tol``: absolute/relative tolerance for floating point numbers
+- ``early_exit``: stop judging at the first failing test case
+"""
+import ast
+import json
+import math
+import os
+from array import array
+
+from channel import Opaque, Unordered
+
+# Maximum length of the output preview shown to the user
+PREVIEW_LIMIT = 2000
+
+
+def parse_expected(text):
+    """Parse an expected value written as JSON or as a Python literal"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
+
+def encoded_equal(data, path, chunk_size=1 << 20):
+    """True if the encoded value ``data`` is byte-identical to the file at
+    ``path``, reading the file a chunk at a time"""
+    if os.path.getsize(path) != len(data):
+        return False
+    view = memoryview(data)
+    offset = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            if view[offset:offset + len(chunk)] != chunk:
+                return False
+            offset += len(chunk)
+    return True
+
+
+def _sorted(values):
+    try:
+        return sorted(values)
+    except TypeError:
+        return sorted(values, key=repr)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _sequences_equal(actual, expected, tol):
+    if len(actual) != len(expected):
+        return False
+    if isinstance(actual, array):
+        # Packed integer results compare in C without building any strings
+        try:
+            return actual == array(actual.typecode, expected)
+        except (TypeError, OverflowError):
+            pass
+    return all(_equal(a, e, tol) for a, e in zip(actual, expected))
+
+
+def _equal(actual, expected, tol):
+    if isinstance(actual, Opaque):
+        return False
+    if isinstance(actual, bool) or isinstance(expected, bool):
+        return type(actual) is bool and type(expected) is bool and actual == expected
+    if _is_number(actual) and _is_number(expected):
+        if tol is not None and (isinstance(actual, float) or isinstance(expected, float)):
+            return math.isclose(actual, expected, rel_tol=tol, abs_tol=tol)
+        return actual == expected
+    if isinstance(actual, Unordered):
+        return (isinstance(expected, (list, tuple))
+                and _sequences_equal(_sorted(actual), _sorted(expected), tol))
+    if isinstance(actual, (list, tuple, array)) and isinstance(expected, (list, tuple)):
+        return _sequences_equal(actual, expected, tol)
+    if isinstance(actual, dict) and isinstance(expected, dict):
+        return (actual.keys() == expected.keys()
+                and all(_equal(actual[k], expected[k], tol) for k in actual))
+    return type(actual) is type(expected) and actual == expected
+
+
+def values_equal(actual, expected, options=None):
+    """Compare a decoded result with an expected value using ``options``"""
+    options = options or {}
+    tol = options.get('float_tol')
+    if (options.get('unordered') and isinstance(actual, (list, tuple, array))
+            and isinstance(expected, (list, tuple))):
+        return _sequences_equal(_sorted(actual), _sorted(expected), tol)
+    return _equal(actual, expected, tol)
+
+
+def format_value(value, limit=PREVIEW_LIMIT):
+    """Render a value in Python literal style, truncated to about ``limit`` characters"""
+    parts = []
+    size = [0]
+
+    def emit(text):
+        parts.append(text)
+        size[0] += len(text)
+        return size[0] < limit
+
+    def walk(v):
+        if isinstance(v, Opaque):
+            return emit(str(v))
+        if isinstance(v, str):
+            return emit(json.dumps(v))
+        if isinstance(v, dict):
+            if not emit('{'):
+                return False
+            for i, (k, item) in enumerate(v.items()):
+                if (i and not emit(', ')) or not walk(k) or not emit(': ') or not walk(item):
+                    return False
+            return emit('}')
+        if isinstance(v, (list, tuple, array)):
+            open_, close = ('{', '}') if isinstance(v, Unordered) else ('[', ']')
+            if not emit(open_):
+                return False
+            for i, item in enumerate(v):
+                if (i and not emit(', ')) or not walk(item):
+                    return False
+            return emit(close)
+        return emit(repr(v))
+
+    if not walk(value):
+        return ''.join(parts)[:limit] + '...'
+    return ''.join(parts)
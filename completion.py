@@ -0,0 +1,180 @@
+"""Code completion backed by a long-lived Jedi state.
+
+Jedi keeps parsed modules and inferred stdlib modules in process-wide
+caches, so the service holds one environment and project for its whole
+life, preloads the modules submissions commonly use, and gives each editor
+session its own virtual file path: Jedi then reparses only the changed part
+of a session's buffer between requests.
+
+While the user keeps typing the same identifier, the completions computed
+for a shorter prefix are filtered instead of asking Jedi again.  Jedi calls
+run one at a time on a dedicated thread; a request that is not answered
+within the deadline gets the names found in the buffer, marked as
+incomplete so the editor asks again on the next keystroke, and the Jedi
+result is kept for that next request.
+"""
+import builtins
+import keyword
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import jedi
+
+import metrics
+import profiling
+from config import Config
+from lru import LRUCache
+from supersede import Superseded
+
+logger = logging.getLogger(__name__)
+
+completion_seconds = metrics.histogram('completion_seconds', 'Time to answer a completion request, by outcome',
+                                       ['outcome'])
+
+# monaco.languages.CompletionItemKind values by Jedi completion type
+KINDS = {
+    'module': 8,  # Module
+    'class': 5,  # Class
+    'instance': 4,  # Variable
+    'function': 1,  # Function
+    'param': 4,  # Variable
+    'path': 20,  # File
+    'keyword': 17,  # Keyword
+    'property': 9,  # Property
+    'statement': 4,  # Variable
+}
+TEXT_KIND = 18
+
+# How often a request waiting for Jedi checks whether it is still wanted
+POLL_INTERVAL = 0.02
+
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+PREFIX = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+
+# Names offered when Jedi misses the deadline, besides those in the buffer
+FALLBACK_NAMES = sorted(set(keyword.kwlist) | {n for n in dir(builtins) if not n.startswith('_')})
+
+
+def _suggestion(name, kind, detail):
+    return {'label': name, 'kind': kind, 'insertText': name, 'detail': detail}
+
+
+class CompletionService:
+    """Completions for many editor sessions sharing one warm Jedi state"""
+
+    def __init__(self, preload=(), timeout=0.5, sessions=1024):
+        self.preload = list(preload)
+        self.timeout = timeout
+        self.project = jedi.Project(os.path.join(tempfile.gettempdir(), 'dsa-completion'),
+                                    smart_sys_path=False)
+        self.environment = jedi.InterpreterEnvironment()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jedi')
+        self._sessions = LRUCache(sessions)  # session -> completions at its last position
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'jedi': 0, 'filtered': 0, 'incomplete': 0, 'errors': 0}
+
+    def start(self):
+        """Preload modules on the Jedi thread, ahead of the first request"""
+        if self.preload:
+            self._executor.submit(jedi.preload_module, *self.preload)
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _jedi_complete(self, session, code, line, column, context, should_stop):
+        if should_stop is not None and should_stop():
+            raise Superseded()
+        path = os.path.join(self.project.path, f"{session}.py")
+        script = jedi.Script(code, path=path, environment=self.environment, project=self.project)
+        completions = [(c.name, KINDS.get(c.type, TEXT_KIND), c.description)
+                       for c in script.complete(line, column)]
+        self._sessions.set(session, dict(context, completions=completions))
+        return completions
+
+    def _wait(self, future, should_stop):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError()
+            try:
+                return future.result(timeout=min(remaining, POLL_INTERVAL))
+            except TimeoutError:
+                if should_stop is not None and should_stop():
+                    raise Superseded()
+
+    def complete(self, session, code, line, column, should_stop=None):
+        """Completions at 1-based ``line`` and 0-based ``column``.
+
+        Returns ``(suggestions, incomplete)`` with suggestions in Monaco's
+        format.  Raises :class:`supersede.Superseded` if ``should_stop()``
+        turns true before Jedi answers; work still queued is then skipped.
+        """
+        self._count('requests')
+        started = time.perf_counter()
+        lines = code.split('\n')
+        text = lines[line - 1][:column] if 0 < line <= len(lines) else ''
+        prefix = PREFIX.search(text)
+        prefix = prefix.group() if prefix else ''
+        start = column - len(prefix)
+        context = {'line': line, 'before': text[:start], 'prefix': prefix}
+
+        previous = self._sessions.get(session)
+        if (previous is not None and previous['line'] == line and previous['before'] == context['before']
+                and prefix.startswith(previous['prefix'])):
+            self._count('filtered')
+            completions = previous['completions']
+            incomplete = False
+            outcome = 'filtered'
+        else:
+            future = self._executor.submit(self._jedi_complete, session, code, line, column,
+                                           context, should_stop)
+            self._count('jedi')
+            try:
+                with profiling.span('jedi'):
+                    completions = self._wait(future, should_stop)
+                incomplete = False
+                outcome = 'jedi'
+            except Superseded:
+                completion_seconds.labels('superseded').observe(time.perf_counter() - started)
+                raise
+            except TimeoutError:
+                self._count('incomplete')
+                names = set(IDENTIFIER.findall(code))
+                if not context['before'].rstrip().endswith('.'):
+                    names.update(FALLBACK_NAMES)
+                names.discard(prefix)
+                completions = [(name, TEXT_KIND, '') for name in sorted(names)]
+                incomplete = True
+                outcome = 'incomplete'
+            except Exception:
+                # Jedi can be fragile with incomplete code
+                self._count('errors')
+                logger.exception('Jedi failed to complete session %s at %s:%s', session, line, column)
+                completion_seconds.labels('error').observe(time.perf_counter() - started)
+                return [], False
+
+        lowered = prefix.lower()
+        with profiling.span('filter', candidates=len(completions)):
+            suggestions = [_suggestion(name, kind, detail) for name, kind, detail in completions
+                           if name.lower().startswith(lowered)]
+        completion_seconds.labels(outcome).observe(time.perf_counter() - started)
+        return suggestions, incomplete
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return dict(counts, sessions=len(self._sessions))
+
+
+completion_service = CompletionService(
+    preload=Config.COMPLETION_PRELOAD_MODULES,
+    timeout=Config.COMPLETION_TIMEOUT,
+    sessions=Config.COMPLETION_SESSIONS
+)
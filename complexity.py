@@ -0,0 +1,101 @@
+"""Empirical time complexity estimation.
+
+A submission is timed on inputs of geometrically increasing size (see
+:func:`judge.analyze_complexity`) and the ``(size, seconds)`` points are
+fitted against each candidate growth class as ``a + b * f(n)``, weighting
+every point by its inverse time so that the error is relative.  The class
+with the smallest error wins; its confidence says how much better it fits
+than the runner-up.
+"""
+import math
+
+# Candidate classes from slowest to fastest growing
+CLASSES = [
+    ('1', lambda n: 1.0),
+    ('log n', lambda n: math.log2(n)),
+    ('n', lambda n: float(n)),
+    ('n log n', lambda n: n * math.log2(n)),
+    ('n^2', lambda n: float(n) ** 2),
+    ('2^n', lambda n: 2.0 ** n if n < 1000 else math.inf),
+]
+
+RANK = {name: rank for rank, (name, _) in enumerate(CLASSES)}
+
+# Shortest time a single measurement is timed for, and how many
+# measurements are taken per size (the fastest is kept)
+MEASURE_MIN_TIME = 0.005
+MEASURE_REPEAT = 3
+
+# Classes whose error is within this fraction of the best one are
+# considered a tie, won by the simpler class
+_TIE = 0.1
+
+
+def _ties(error, best):
+    return error <= best * (1 + _TIE) + 1e-6
+
+
+def _fit_class(f, points):
+    """Weighted least-squares fit of ``a + b * f(n)``; returns ``(a, b, error)``"""
+    xs = [f(n) for n, _ in points]
+    if any(math.isinf(x) for x in xs):
+        return None
+    ts = [max(t, 1e-9) for _, t in points]
+    ws = [1 / (t * t) for t in ts]
+    sw = sum(ws)
+    sx = sum(w * x for w, x in zip(ws, xs))
+    st = sum(w * t for w, t in zip(ws, ts))
+    sxx = sum(w * x * x for w, x in zip(ws, xs))
+    sxt = sum(w * x * t for w, x, t in zip(ws, xs, ts))
+    det = sw * sxx - sx * sx
+    b = (sw * sxt - sx * st) / det if det > 0 else 0.0
+    a = (st - b * sx) / sw
+    if b < 0:
+        a, b = st / sw, 0.0
+    elif a < 0:
+        a, b = 0.0, sxt / sxx
+    error = math.sqrt(sum(w * (a + b * x - t) ** 2 for w, x, t in zip(ws, xs, ts)) / len(ts))
+    return a, b, error
+
+
+def fit(points):
+    """Fit ``[(size, seconds)]`` against every candidate class.
+
+    Returns ``(name, confidence, errors)`` where ``errors`` maps each
+    class to its relative RMS error, or ``(None, 0.0, {})`` with fewer
+    than three points.
+    """
+    if len(points) < 3:
+        return None, 0.0, {}
+    errors = {}
+    for name, f in CLASSES:
+        result = _fit_class(f, points)
+        if result is not None:
+            errors[name] = result[2]
+    ranked = sorted(errors, key=lambda name: (errors[name], RANK[name]))
+    best = ranked[0]
+    # Prefer the simplest class that fits as well as the best one
+    for name in sorted(errors, key=RANK.get):
+        if _ties(errors[name], errors[best]):
+            best = name
+            break
+    others = [errors[name] for name in errors if not _ties(errors[name], errors[best])]
+    confidence = 1 - errors[best] / min(others) if others and min(others) > 0 else 0.0
+    return best, max(0.0, confidence), errors
+
+
+def check_required(required, errors):
+    """Whether the fitted timings are consistent with class ``required``.
+
+    Returns ``(met, confidence)``: the requirement is violated when some
+    slower class fits better than every allowed one, with a confidence of
+    how much better it fits.
+    """
+    allowed = [errors[name] for name in errors if RANK[name] <= RANK[required]]
+    slower = [errors[name] for name in errors if RANK[name] > RANK[required]]
+    if not allowed or not slower:
+        return True, 0.0
+    best_allowed, best_slower = min(allowed), min(slower)
+    if _ties(best_allowed, best_slower):
+        return True, 1 - best_allowed / best_slower if best_slower > best_allowed else 0.0
+    return False, 1 - best_slower / best_allowed
@@ -7,6 +7,113 @@ class Config:
     HOST = os.environ.get('HOST', '0.0.0.0')
     PORT = int(os.environ.get('PORT', 5000))
     
+    # Production server (python serve.py): preforked web workers sharing one judge server
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 2))  # web processes
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 16))  # request threads per web process
+    WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 60))  # seconds a silent worker is given before it is restarted
+    WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))  # seconds to finish requests on reload/shutdown
+    WEB_MAX_REQUESTS = int(os.environ.get('WEB_MAX_REQUESTS', 0))  # requests before a worker is replaced, 0 never
+    WEB_PRELOAD = os.environ.get('WEB_PRELOAD', 'False') == 'True'  # set by serve.py: services start after fork
+    JUDGE_SOCKET = os.environ.get('JUDGE_SOCKET', '')  # Unix socket of the shared judge server; empty judges in-process
+
+    # Metrics
+    METRICS_PUSH_INTERVAL = float(os.environ.get('METRICS_PUSH_INTERVAL', 5))  # seconds between worker pushes
+
+    # Profiling (the /admin endpoints are disabled without a token)
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', 32))  # profiles kept
+    PROFILE_SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))  # seconds between samples
+
     # Code execution settings
     CODE_TIMEOUT = 5  # seconds
+    SUBMIT_TIME_BUDGET = 20  # seconds, wall-clock budget for all test cases of a submission
     MAX_CODE_LENGTH = 10000  # characters
+
+    # Resource limits enforced in the sandboxed child; a problem can override
+    # any of them with a ``limits`` dict (cpu_time, memory_mb, output_bytes, processes)
+    CPU_TIME_LIMIT = int(os.environ.get('CPU_TIME_LIMIT', CODE_TIMEOUT))  # CPU seconds per test case or run
+    MEMORY_LIMIT_MB = int(os.environ.get('MEMORY_LIMIT_MB', 256))  # address space of the child
+    OUTPUT_LIMIT_BYTES = int(os.environ.get('OUTPUT_LIMIT_BYTES', 1024 * 1024))  # stdout + stderr
+    PROCESS_LIMIT = int(os.environ.get('PROCESS_LIMIT', 0))  # extra processes a submission may start
+
+    # Problems and lessons
+    CONTENT_DIR = os.environ.get('CONTENT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'content'))
+    CONTENT_RELOAD_INTERVAL = int(os.environ.get('CONTENT_RELOAD_INTERVAL', 2))  # seconds between checks, 0 disables
+    PAGE_CACHE_BYTES = int(os.environ.get('PAGE_CACHE_BYTES', 32 * 1024 * 1024))  # rendered pages kept in memory
+
+    # Static assets, fingerprinted and precompressed into ASSET_BUILD_DIR at start-up
+    STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    ASSET_BUILD_DIR = os.environ.get('ASSET_BUILD_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build', 'assets'))
+
+    # Monaco editor, served from static/vendor once fetched with fetch_monaco.py
+    # and from the CDN otherwise
+    MONACO_VERSION = '0.44.0'
+    MONACO_CDN_URL = 'https://cdnjs.cloudflare.com/ajax/libs/monaco-editor/{version}/min/vs'
+
+    # Generated hidden test fixtures, built on first use
+    FIXTURE_DIR = os.environ.get('FIXTURE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixture_data'))
+
+    # Per-test time limits calibrated against each problem's reference
+    # solution; CODE_TIMEOUT is the ceiling and applies until calibrated
+    CALIBRATE_TIME_LIMITS = os.environ.get('CALIBRATE_TIME_LIMITS', 'True') == 'True'
+    TIME_LIMIT_MULTIPLIER = float(os.environ.get('TIME_LIMIT_MULTIPLIER', 3.0))  # x reference time
+    TIME_LIMIT_MIN = 0.5  # seconds, floor for test cases the reference solves instantly
+    CALIBRATION_RUNS = 3  # reference runs per calibration, the fastest time is kept
+    CALIBRATION_INTERVAL = int(os.environ.get('CALIBRATION_INTERVAL', 600))  # seconds, 0 calibrates once
+
+    # Empirical complexity analysis of submissions
+    COMPLEXITY_SIZES = [2 ** k for k in range(10, 21)]  # input sizes timed, smallest first
+    COMPLEXITY_POINT_TIMEOUT = 2  # seconds; larger sizes are skipped after a slower one
+    COMPLEXITY_MIN_CONFIDENCE = 0.5  # needed to reject a submission for its complexity
+
+    # Editor linting in a pool of warm worker processes
+    LINT_WORKERS = int(os.environ.get('LINT_WORKERS', 2))
+    LINT_TIMEOUT = float(os.environ.get('LINT_TIMEOUT', 2))  # seconds per request, including the wait for a worker
+    LINT_CACHE_SIZE = 1024  # results kept by hash of the code
+    LINT_IGNORE = ['E501']  # on top of flake8's default ignore list
+    LINT_COALESCE_WINDOW = 0.1  # seconds a lint request waits for a newer one from the same editor
+
+    # Editor completion from a shared, warm Jedi state
+    COMPLETION_TIMEOUT = float(os.environ.get('COMPLETION_TIMEOUT', 0.5))  # seconds before partial results are returned
+    COMPLETION_SESSIONS = 1024  # editor sessions whose last completions are kept
+    COMPLETION_COALESCE_WINDOW = 0.02  # seconds, as LINT_COALESCE_WINDOW
+    COMPLETION_PRELOAD_MODULES = ['builtins', 'collections', 'heapq', 'bisect', 'itertools', 'functools', 'math', 're', 'typing']
+
+    # Sandbox worker pool (pre-forked zygotes), 0 disables it
+    SANDBOX_POOL_SIZE = int(os.environ.get('SANDBOX_POOL_SIZE', os.cpu_count() or 2))
+    SANDBOX_MAX_USES = int(os.environ.get('SANDBOX_MAX_USES', 200))  # executions before a zygote is recycled
+    SANDBOX_PREWARM_MODULES = ['json', 'collections', 'heapq', 'bisect', 'itertools', 'functools', 'math', 're']
+
+    # Scheduling of sandbox executions
+    JUDGE_SLOTS = int(os.environ.get('JUDGE_SLOTS', os.cpu_count() or 2))  # concurrent executions host-wide
+    JUDGE_MAX_SHARDS = int(os.environ.get('JUDGE_MAX_SHARDS', os.cpu_count() or 2))  # parallel processes per submission
+
+    # Admission control of code executions (/run, /submit, submission jobs, analysis)
+    ADMISSION_QUEUE_DEPTH = int(os.environ.get('ADMISSION_QUEUE_DEPTH', JUDGE_SLOTS * 4))  # waiting executions before 503
+    ADMISSION_RATE = float(os.environ.get('ADMISSION_RATE', 0.5))  # executions per second per client, sustained
+    ADMISSION_BURST = int(os.environ.get('ADMISSION_BURST', 5))  # executions a client may start in a burst
+    ADMISSION_MAX_PER_CLIENT = int(os.environ.get('ADMISSION_MAX_PER_CLIENT', 3))  # admitted at once per client, else 429
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))  # reverse proxies whose X-Forwarded-For gives the client address
+
+    # Cache of judge results keyed by the submission's normalized AST
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 4096))  # entries
+    RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 3600))  # seconds
+
+    # Submission history in SQLite, written in batches by a background thread
+    SUBMISSION_DB = os.environ.get('SUBMISSION_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'submissions.db'))  # empty disables
+    SUBMISSION_BATCH_SIZE = 256  # submissions per transaction
+    SUBMISSION_FLUSH_INTERVAL = float(os.environ.get('SUBMISSION_FLUSH_INTERVAL', 0.5))  # seconds a write waits to be batched
+    SUBMISSION_QUEUE_SIZE = 10000  # submissions waiting to be written before new ones are dropped
+    SUBMISSION_CODE_RETENTION = int(os.environ.get('SUBMISSION_CODE_RETENTION', 30 * 86400))  # seconds code is kept, 0 forever
+    SUBMISSION_COMPACT_INTERVAL = 3600  # seconds between removals of expired code
+
+    # Per-problem leaderboards of accepted submissions, snapshotted to disk
+    LEADERBOARD_SNAPSHOT = os.environ.get('LEADERBOARD_SNAPSHOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'leaderboard.json'))  # empty keeps them in memory
+    LEADERBOARD_SNAPSHOT_INTERVAL = int(os.environ.get('LEADERBOARD_SNAPSHOT_INTERVAL', 60))  # seconds between snapshots of changes
+    LEADERBOARD_PAGE_SIZE = 20  # entries per page unless requested otherwise
+
+    # Asynchronous submission jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', SANDBOX_POOL_SIZE or 2))
+    JOB_RETENTION = 300  # seconds a finished job stays available
+    JOB_POLL_MAX_WAIT = 25  # seconds a long-poll request may block
+    SSE_HEARTBEAT = 15  # seconds between keep-alive comments on event streams
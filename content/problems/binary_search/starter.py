@@ -0,0 +1,6 @@
+def binary_search(nums, target):
+    # Write your code here
+    pass
+
+# Test your solution
+print(binary_search([-1, 0, 3, 5, 9, 12], 9))
@@ -0,0 +1,6 @@
+def merge_sorted_arrays(arr1, arr2):
+    # Write your code here
+    pass
+
+# Test your solution
+print(merge_sorted_arrays([1, 3, 5, 7], [2, 4, 6, 8]))
@@ -0,0 +1,8 @@
+def reverse_string(s):
+    # Write your code here
+    pass
+
+# Test your solution
+s = ["h", "e", "l", "l", "o"]
+reverse_string(s)
+print(s)
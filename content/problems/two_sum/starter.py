@@ -0,0 +1,6 @@
+def two_sum(nums, target):
+    # Write your code here
+    pass
+
+# Test your solution
+print(two_sum([2, 7, 11, 15], 9))
@@ -0,0 +1,8 @@
+def is_valid(s):
+    # Write your code here
+    pass
+
+# Test your solution
+print(is_valid("()"))
+print(is_valid("()[]{}"))
+print(is_valid("(]"))
@@ -0,0 +1,174 @@
+"""Server side of the editor channel.
+
+A problem page opens one WebSocket and keeps a copy of its buffer on the
+server: it sends the full text once (``open``) and then only the edits
+Monaco reports (``change``).  Lint and completion requests name no code at
+all, they run against the copy the server already has.
+
+Messages from the page::
+
+    {'type': 'open', 'problem_id': ..., 'version': 1, 'text': ...}
+    {'type': 'change', 'base': 1, 'version': 2, 'length': 120,
+     'changes': [{'offset': 10, 'length': 0, 'text': 'x'}]}
+    {'type': 'lint', 'id': 7}
+    {'type': 'complete', 'id': 8, 'line': 3, 'column': 12}
+
+Offsets and lengths are in UTF-16 code units, as in the browser.  Edits are
+applied in the order given, which Monaco guarantees to be safe.  When a
+change does not apply to the server's version of the document, or leaves it
+with a different length than the page's, the server answers ``resync`` and
+the page sends its full text again.
+
+Lint and completion requests run in the background, so that newer requests
+can supersede older ones (see :mod:`supersede`); message ids serve as their
+sequence numbers, and superseded requests are answered with ``superseded``.
+"""
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import lint
+from completion import completion_service
+from config import Config
+from lint import lint_pool
+from supersede import Superseded, completion_requests, lint_requests
+
+# Lint and completion requests of one connection running at once
+BACKGROUND_WORKERS = 2
+
+
+def utf16_length(text):
+    return len(text) if text.isascii() else len(text.encode('utf-16-le')) // 2
+
+
+def _index(text, offset):
+    """Index in ``text`` of a UTF-16 offset"""
+    if text.isascii():
+        return offset
+    units = 0
+    for i, char in enumerate(text):
+        if units >= offset:
+            return i
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(text)
+
+
+def apply_changes(text, changes):
+    for change in changes:
+        start = _index(text, change['offset'])
+        end = _index(text, change['offset'] + change['length'])
+        text = text[:start] + change['text'] + text[end:]
+    return text
+
+
+class EditorSession:
+    """Document and requests of one editor connection"""
+
+    def __init__(self, client):
+        self.client = client
+        self.key = uuid.uuid4().hex  # editor key for supersession
+        self.problem_id = ''
+        self.text = None
+        self.version = None
+        self._lock = threading.RLock()
+        self._executor = None
+
+    def dispatch(self, message, send):
+        """Handle a message, passing its replies to ``send``.
+
+        Lint and completion requests are answered from a background thread.
+        """
+        if message.get('type') not in ('lint', 'complete'):
+            send(self.handle(message))
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS,
+                                                thread_name_prefix='editor')
+        self._executor.submit(lambda: send(self.handle(message)))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def handle(self, message):
+        """Replies to one message from the page"""
+        handler = getattr(self, f"_on_{message.get('type')}", None)
+        if handler is None:
+            return [{'type': 'error', 'id': message.get('id'), 'error': 'Unknown message type'}]
+        try:
+            return handler(message)
+        except Superseded:
+            return [{'type': 'superseded', 'id': message.get('id')}]
+
+    def _resync(self, message):
+        with self._lock:
+            self.text = self.version = None
+        return [{'type': 'resync', 'id': message.get('id')}]
+
+    def _on_open(self, message):
+        text = message.get('text', '')
+        with self._lock:
+            if len(text) > Config.MAX_CODE_LENGTH:
+                self.text = self.version = None
+                return [{'type': 'error', 'error': 'Code too long'}]
+            self.problem_id = message.get('problem_id', '')
+            self.text, self.version = text, message.get('version')
+        return []
+
+    def _on_change(self, message):
+        with self._lock:
+            if self.text is None:
+                return []  # Waiting for the page to resend the document
+            if message.get('base') != self.version:
+                return self._resync(message)
+            try:
+                text = apply_changes(self.text, message['changes'])
+            except (KeyError, TypeError):
+                return self._resync(message)
+            if utf16_length(text) != message.get('length'):
+                return self._resync(message)
+            if len(text) > Config.MAX_CODE_LENGTH:
+                self.text = self.version = None
+                return [{'type': 'error', 'error': 'Code too long'}]
+            self.text, self.version = text, message.get('version')
+        return []
+
+    def _document(self, message):
+        """The text and version a request applies to.
+
+        Raises :class:`Superseded` if the document has changed since the
+        request was sent, and returns ``(None, None)`` if the server has
+        no copy.
+        """
+        with self._lock:
+            if self.text is None:
+                return None, None
+            if message.get('version', self.version) != self.version:
+                raise Superseded()
+            return self.text, self.version
+
+    def _on_lint(self, message):
+        text, version = self._document(message)
+        if text is None:
+            return self._resync(message)
+        try:
+            problems = lint_requests.run(self.key, message.get('id'),
+                                         lambda should_stop: lint_pool.lint(text, should_stop))
+        except lint.LintError as e:
+            return [{'type': 'error', 'id': message.get('id'), 'error': str(e)}]
+        return [{'type': 'markers', 'id': message.get('id'), 'version': version,
+                 'markers': lint.markers(problems)}]
+
+    def _on_complete(self, message):
+        text, _ = self._document(message)
+        if text is None:
+            return self._resync(message)
+        session = f"{self.client}-{self.problem_id}"
+        suggestions, incomplete = completion_requests.run(
+            self.key, message.get('id'),
+            lambda should_stop: completion_service.complete(
+                session, text, message.get('line', 1), message.get('column', 0), should_stop
+            )
+        )
+        return [{'type': 'completions', 'id': message.get('id'), 'suggestions': suggestions,
+                 'incomplete': incomplete}]
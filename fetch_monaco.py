@@ -0,0 +1,61 @@
+"""Download the Monaco editor into static/vendor so it is served locally.
+
+Usage: ``python fetch_monaco.py [version]``
+
+The ``min/vs`` directory of the ``monaco-editor`` npm package is extracted
+to ``static/vendor/monaco-editor/<version>/vs``; the package tarball is
+checked against the checksum published by the registry.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import urllib.request
+
+from config import Config
+
+REGISTRY_URL = 'https://registry.npmjs.org/monaco-editor/{version}'
+
+PREFIX = 'package/min/vs/'
+
+
+def monaco_dir(version):
+    return os.path.join(Config.STATIC_DIR, 'vendor', 'monaco-editor', version, 'vs')
+
+
+def fetch(version):
+    with urllib.request.urlopen(REGISTRY_URL.format(version=version), timeout=30) as response:
+        dist = json.load(response)['dist']
+    with urllib.request.urlopen(dist['tarball'], timeout=300) as response:
+        data = response.read()
+    if hashlib.sha1(data).hexdigest() != dist['shasum']:
+        raise ValueError(f"Checksum mismatch for {dist['tarball']}")
+
+    target = monaco_dir(version)
+    tmp = target + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+        for member in tar.getmembers():
+            if not member.isfile() or not member.name.startswith(PREFIX):
+                continue
+            rel = os.path.normpath(member.name[len(PREFIX):])
+            if rel.startswith('..') or os.path.isabs(rel):
+                continue
+            path = os.path.join(tmp, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with tar.extractfile(member) as src, open(path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return target
+
+
+if __name__ == '__main__':
+    version = sys.argv[1] if len(sys.argv) > 1 else Config.MONACO_VERSION
+    if os.path.exists(os.path.join(monaco_dir(version), 'loader.js')):
+        print(f"Monaco {version} is already in {monaco_dir(version)}")
+    else:
+        print(f"Monaco {version} saved to {fetch(version)}")
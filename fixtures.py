@@ -0,0 +1,156 @@
+"""On-disk store of large hidden test fixtures.
+
+Problems list fixtures as specs such as
+``{'generator': 'binary_search', 'size': 10 ** 6, 'seed': 1}``; any other
+keys are passed to the generator.  A fixture is produced once by its seeded
+generator and written to ``FIXTURE_DIR`` as
+
+- ``<key>.in``: the call's arguments (see :func:`channel.encode_args`)
+- ``<key>.out``: the encoded expected value
+- ``<key>.json``: the spec, written last to mark the fixture complete
+
+Fixtures are built lazily on first use or ahead of time with
+``python fixtures.py``.  Sandbox children only receive the file paths and
+memory-map the inputs, so every worker shares the same read-only pages.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+
+import channel
+from config import Config
+
+# Bump when a generator changes so that stale files are not reused
+GENERATOR_VERSION = 1
+
+
+def _two_sum(rng, size):
+    # Multiples of four plus exactly one pair of numbers that are 1 mod 4:
+    # no other pair can add up to the target
+    nums = [4 * v for v in rng.sample(range(-10 ** 8, 10 ** 8), size)]
+    i, j = sorted(rng.sample(range(size), 2))
+    nums[i], nums[j] = 4 * rng.randrange(10 ** 6) + 1, 4 * rng.randrange(10 ** 6) + 1
+    return [nums, nums[i] + nums[j]], [i, j]
+
+
+def _reverse_string(rng, size):
+    s = rng.choices('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ', k=size)
+    return [s], s[::-1]
+
+
+def _valid_parentheses(rng, size, valid=True):
+    pairs = {'(': ')', '[': ']', '{': '}'}
+    chars, stack = [], []
+    while len(chars) + len(stack) < size:
+        if stack and rng.random() < 0.5:
+            chars.append(pairs[stack.pop()])
+        else:
+            stack.append(rng.choice('([{'))
+            chars.append(stack[-1])
+    chars.extend(pairs[c] for c in reversed(stack))
+    if not valid:
+        # Swap the last closing bracket for a different kind
+        chars[-1] = {')': ']', ']': '}', '}': ')'}[chars[-1]]
+    return [''.join(chars)], valid
+
+
+def _binary_search(rng, size, present=True):
+    nums = sorted(rng.sample(range(-10 ** 9, 10 ** 9, 2), size))
+    if present:
+        index = rng.randrange(size)
+        return [nums, nums[index]], index
+    return [nums, nums[rng.randrange(size)] + 1], -1
+
+
+def _merge_sorted_arrays(rng, size):
+    merged = sorted(rng.randrange(-10 ** 9, 10 ** 9) for _ in range(size))
+    arr1, arr2 = [], []
+    for value in merged:
+        (arr1 if rng.random() < 0.5 else arr2).append(value)
+    return [arr1, arr2], merged
+
+
+GENERATORS = {
+    'two_sum': _two_sum,
+    'reverse_string': _reverse_string,
+    'valid_parentheses': _valid_parentheses,
+    'binary_search': _binary_search,
+    'merge_sorted_arrays': _merge_sorted_arrays,
+}
+
+
+def fixture_key(spec):
+    """Stable file name stem for a fixture spec"""
+    data = json.dumps(dict(spec, version=GENERATOR_VERSION), sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class FixtureStore:
+    """Lazily built fixture files shared by all judge workers"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._cases = {}  # (problem id, specs) -> list of fixture test cases
+
+    def _paths(self, problem_id, spec):
+        stem = os.path.join(self.root, problem_id, fixture_key(spec))
+        return stem + '.in', stem + '.out', stem + '.json'
+
+    def build(self, problem_id, spec):
+        """Generate one fixture's files unless they already exist.
+
+        Returns its test case dict.
+        """
+        input_path, expected_path, meta_path = self._paths(problem_id, spec)
+        if not os.path.exists(meta_path):
+            params = {k: v for k, v in spec.items() if k not in ('generator', 'size', 'seed')}
+            rng = random.Random(spec.get('seed', 0))
+            args, expected = GENERATORS[spec['generator']](rng, spec['size'], **params)
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+            _write_atomic(input_path, channel.encode_args(args))
+            _write_atomic(expected_path, channel.encode_value(expected))
+            _write_atomic(meta_path, json.dumps(spec, sort_keys=True).encode('utf-8'))
+        return {
+            'input_path': input_path,
+            'expected_path': expected_path,
+            'hidden': True,
+        }
+
+    def test_cases(self, problem):
+        """The problem's inline test cases followed by its fixtures"""
+        specs = problem.get('fixtures')
+        if not specs:
+            return problem['test_cases']
+        key = (problem['id'], json.dumps(specs, sort_keys=True))
+        cases = self._cases.get(key)
+        if cases is None:
+            with self._lock:
+                cases = self._cases.get(key)
+                if cases is None:
+                    cases = [self.build(problem['id'], spec) for spec in specs]
+                    self._cases[key] = cases
+        return problem['test_cases'] + cases
+
+    def count(self, problem):
+        """Number of test cases of :meth:`test_cases`, without building fixtures"""
+        return len(problem['test_cases']) + len(problem.get('fixtures') or ())
+
+
+fixture_store = FixtureStore(Config.FIXTURE_DIR)
+
+
+if __name__ == '__main__':
+    from registry import registry
+    for problem in registry.problems():
+        for case in fixture_store.test_cases(problem)[len(problem['test_cases']):]:
+            print(f"{problem['id']}: {case['input_path']} ({os.path.getsize(case['input_path'])} bytes)")
@@ -0,0 +1,319 @@
+"""Judge harness executed inside the sandboxed child interpreter.
+
+The parent writes a JSON payload to stdin; the submission is compiled and
+loaded once, then every test case is run against it.  One result frame per
+test case is written to the result channel (``payload['result_fd']``) as
+soon as that test finishes, separately from anything the submission prints.
+Large fixture inputs are not part of the payload: the child memory-maps
+the fixture file named by a test's ``input_path``.  With a ``measure``
+dict in the payload the tests are only timed, for complexity analysis.
+
+Resource limits from ``payload['limits']`` are applied to the child before
+any submitted code runs.  Plain ``'run'`` executions also go through this
+module so that they are limited the same way.
+
+The submission runs in this interpreter, so the harness keeps its own
+references to the clocks and ``os.write`` and moves the result channel to
+an unpredictable descriptor before loading it.  That stops the obvious
+tampering, not a determined submission: anything ranked is measured by
+the parent instead (see :mod:`leaderboard`).
+"""
+import fcntl
+import io
+import json
+import math
+import mmap
+import os
+import random
+import resource
+import signal
+import sys
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+
+import channel
+
+# Bound before any submitted code runs, which may replace the module attributes
+_perf_counter = time.perf_counter
+_process_time = time.process_time
+_monotonic = time.monotonic
+_write = os.write
+
+
+class TestTimeout(BaseException):
+    """Raised inside the child when a single test case runs out of time"""
+
+
+class OutputLimitExceeded(BaseException):
+    """Raised inside the child when the submission prints too much"""
+
+
+def _on_alarm(signum, frame):
+    raise TestTimeout()
+
+
+class _CapturedOutput(io.StringIO):
+    """Captured stdout/stderr drawing on a quota shared by the whole run"""
+
+    def __init__(self, quota):
+        super().__init__()
+        self.quota = quota
+
+    def write(self, s):
+        self.quota[0] -= len(s)
+        if self.quota[0] < 0:
+            raise OutputLimitExceeded()
+        return super().write(s)
+
+
+def _setrlimit(which, limit, hard=None):
+    hard = limit if hard is None else hard
+    _, current = resource.getrlimit(which)
+    if current != resource.RLIM_INFINITY:
+        limit, hard = min(limit, current), min(hard, current)
+    try:
+        resource.setrlimit(which, (limit, hard))
+    except (ValueError, OSError):
+        pass
+
+
+def _process_count():
+    """Number of processes owned by this user, or None when unknown"""
+    uid = os.getuid()
+    try:
+        names = os.listdir('/proc')
+    except OSError:
+        return None
+    count = 0
+    for name in names:
+        if name.isdigit():
+            try:
+                count += os.stat('/proc/' + name).st_uid == uid
+            except OSError:
+                pass
+    return count
+
+
+def apply_limits(limits, cpu_seconds):
+    """Restrict this process to ``limits`` and ``cpu_seconds`` of CPU time in total"""
+    _setrlimit(resource.RLIMIT_CORE, 0)
+    if cpu_seconds:
+        seconds = math.ceil(cpu_seconds)
+        # SIGXCPU at the soft limit, SIGKILL one second later
+        _setrlimit(resource.RLIMIT_CPU, seconds, seconds + 1)
+    if limits.get('memory_mb'):
+        _setrlimit(resource.RLIMIT_AS, limits['memory_mb'] * 1024 * 1024)
+    if limits.get('output_bytes'):
+        _setrlimit(resource.RLIMIT_FSIZE, limits['output_bytes'])
+    # RLIMIT_NPROC counts every process of the user and does not apply to root
+    if limits.get('processes') is not None and hasattr(resource, 'RLIMIT_NPROC') and os.getuid():
+        count = _process_count()
+        if count is not None:
+            _setrlimit(resource.RLIMIT_NPROC, count + limits['processes'])
+
+
+def _format_exception():
+    """Format the current exception without the harness' own frames"""
+    etype, value, tb = sys.exc_info()
+    while tb is not None and tb.tb_frame.f_code.co_filename == __file__:
+        tb = tb.tb_next
+    return ''.join(traceback.format_exception(etype, value, tb))
+
+
+def _emit(fd, kind, meta, value=b''):
+    data = memoryview(channel.encode_frame(kind, meta, value))
+    while data:
+        data = data[_write(fd, data):]
+
+
+def _hide_fd(fd):
+    """Move ``fd`` to a random descriptor above the usual ones and close it"""
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    top = 4096 if soft == resource.RLIM_INFINITY else min(soft, 4096)
+    if top <= 64:
+        return fd
+    # Not the random module's state, which every child forked from a zygote shares
+    hidden = fcntl.fcntl(fd, fcntl.F_DUPFD_CLOEXEC, random.SystemRandom().randrange(64, top))
+    os.close(fd)
+    return hidden
+
+
+def _test_args(test):
+    """Arguments for a test: inline JSON or a memory-mapped fixture file"""
+    if 'input_path' not in test:
+        return json.loads(test['input'])
+    with open(test['input_path'], 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return channel.decode_args(data)
+
+
+def _time_per_call(func, args, first, measure):
+    """Fastest per-call time over ``measure['repeat']`` rounds, each calling
+    ``func`` enough times to last at least ``measure['min_time']``"""
+    number = min(100000, max(1, int(measure['min_time'] / first))) if first > 0 else 100000
+    best = first
+    for _ in range(measure['repeat']):
+        start = _perf_counter()
+        for _ in range(number):
+            func(*args)
+        best = min(best, (_perf_counter() - start) / number)
+    return best
+
+
+def _load_submission(code, quota):
+    """Compile and execute the submission once.
+
+    Returns ``(namespace, status, error)``.
+    """
+    namespace = {'__name__': '__main__'}
+    stdout, stderr = _CapturedOutput(quota), _CapturedOutput(quota)
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exec(compile(code, '<submission>', 'exec'), namespace)
+    except TestTimeout:
+        return None, 'timeout', 'Time Limit Exceeded'
+    except MemoryError:
+        return None, 'memory', 'Memory Limit Exceeded'
+    except OutputLimitExceeded:
+        return None, 'output', 'Output Limit Exceeded'
+    except BaseException:
+        return None, 'error', stderr.getvalue() + _format_exception()
+    return namespace, 'ok', None
+
+
+def run_tests(payload):
+    """Run every test case in ``payload`` against the submission"""
+    fd = _hide_fd(payload.pop('result_fd'))
+    tests = payload['tests']
+    test_timeout = payload['test_timeout']
+    deadline = _monotonic() + payload['budget']
+    limits = payload.get('limits') or {}
+    cpu_limit = limits.get('cpu_time')
+    quota = [limits.get('output_bytes') or float('inf')]
+
+    # Per-test CPU time is checked with a profiling timer; the rlimit is a
+    # backstop for code that never returns to the interpreter loop
+    signal.signal(signal.SIGALRM, _on_alarm)
+    signal.signal(signal.SIGPROF, _on_alarm)
+    signal.signal(signal.SIGXCPU, _on_alarm)
+    apply_limits(limits, cpu_limit and cpu_limit * (len(tests) + 1))
+
+    signal.setitimer(signal.ITIMER_REAL, payload['budget'])
+    if cpu_limit:
+        signal.setitimer(signal.ITIMER_PROF, cpu_limit)
+    load_start, load_cpu = _perf_counter(), _process_time()
+    namespace, load_status, load_error = _load_submission(payload['code'], quota)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    signal.setitimer(signal.ITIMER_PROF, 0)
+    _emit(fd, channel.LOADED, {'time': _perf_counter() - load_start,
+                               'cpu_time': _process_time() - load_cpu})
+
+    if load_error is not None:
+        _emit(fd, channel.LOAD_ERROR, {'status': load_status, 'error': load_error})
+        return
+
+    func = namespace.get(payload['function'])
+    if not callable(func):
+        _emit(fd, channel.LOAD_ERROR,
+              {'status': 'error',
+               'error': f"NameError: function '{payload['function']}' is not defined"})
+        return
+
+    result_arg = payload.get('result_arg')
+    measure = payload.get('measure')
+    owner = os.getpid()
+    for test in tests:
+        index = test['index']
+        remaining = deadline - _monotonic()
+        if remaining <= 0:
+            _emit(fd, channel.TEST, {'index': index, 'status': 'timeout', 'time': 0.0,
+                                     'error': 'Time budget for the submission exhausted'})
+            continue
+
+        meta = {'index': index, 'status': 'ok', 'error': None}
+        value = b''
+        stdout, stderr = _CapturedOutput(quota), _CapturedOutput(quota)
+        elapsed = cpu_time = None
+        start, cpu_start = _perf_counter(), _process_time()
+        try:
+            args = _test_args(test)
+            signal.setitimer(signal.ITIMER_REAL, min(test.get('timeout', test_timeout), remaining))
+            if cpu_limit:
+                signal.setitimer(signal.ITIMER_PROF, cpu_limit)
+            try:
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    start, cpu_start = _perf_counter(), _process_time()
+                    result = func(*args)
+                    elapsed = _perf_counter() - start
+                    cpu_time = _process_time() - cpu_start
+                    if measure:
+                        # Timing only: report the per-call time, not the value
+                        elapsed = _time_per_call(func, args, elapsed, measure)
+                    else:
+                        if result_arg is not None:
+                            result = args[result_arg]
+                        value = channel.encode_value(result)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.setitimer(signal.ITIMER_PROF, 0)
+        except TestTimeout:
+            meta['status'] = 'timeout'
+            meta['error'] = 'Time Limit Exceeded'
+        except MemoryError:
+            meta['status'] = 'memory'
+            meta['error'] = 'Memory Limit Exceeded'
+        except OutputLimitExceeded:
+            meta['status'] = 'output'
+            meta['error'] = 'Output Limit Exceeded'
+        except BaseException:
+            meta['status'] = 'error'
+            meta['error'] = stderr.getvalue() + _format_exception()
+        if elapsed is None:
+            elapsed, cpu_time = _perf_counter() - start, _process_time() - cpu_start
+        meta['time'] = elapsed
+        meta['cpu_time'] = cpu_time
+        # Peak resident set size of the child so far, in kilobytes on Linux
+        meta['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        meta['stdout'] = stdout.getvalue()
+        if meta['error'] is None and stderr.getvalue():
+            meta['error'] = stderr.getvalue()
+        if os.getpid() != owner:
+            # A process forked by the submission must not write results
+            os._exit(0)
+        _emit(fd, channel.TEST, meta, value)
+
+
+def run_script(payload):
+    """Execute ``payload['code']`` as a script under the payload's limits"""
+    limits = payload.get('limits') or {}
+    apply_limits(limits, limits.get('cpu_time'))
+    exec(compile(payload['code'], '<string>', 'exec'), {'__name__': '__main__'})
+
+
+def run(mode, payload):
+    """Body of the sandboxed child; returns its exit status"""
+    try:
+        if mode == 'submit':
+            run_tests(payload)
+        else:
+            run_script(payload)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        sys.stderr.write(_format_exception())
+        return 1
+    return 0
+
+
+def main():
+    payload = json.loads(sys.stdin.read())
+    status = run(payload.get('mode', 'submit'), payload)
+    sys.stdout.flush()
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
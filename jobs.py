@@ -0,0 +1,160 @@
+"""Asynchronous submission jobs with per-test result events"""
+import collections
+import threading
+import time
+import uuid
+
+import metrics
+
+queue_wait_seconds = metrics.histogram('judge_job_queue_wait_seconds',
+                                       'Time submission jobs wait in the queue for a worker')
+
+
+class Job:
+    """A queued or running submission and the events it has produced"""
+
+    def __init__(self, code, problem, client_id=None, context=None, total=None, address=None):
+        self.id = uuid.uuid4().hex
+        self.code = code
+        self.problem = problem
+        self.total = len(problem['test_cases']) if total is None else total
+        self.client_id = client_id
+        self.address = address  # client address its executions are scheduled under
+        self.context = context  # passed back to ``on_finish``
+        self.status = 'queued'
+        self.events = []
+        self.created = time.time()
+        self.finished = None
+        self.cancel_requested = False
+        self._cond = threading.Condition()
+
+    def publish(self, event_type, **data):
+        with self._cond:
+            data['type'] = event_type
+            data['id'] = len(self.events)
+            self.events.append(data)
+            self._cond.notify_all()
+
+    def wait_events(self, since, timeout):
+        """Return events after index ``since``, blocking up to ``timeout``"""
+        with self._cond:
+            if len(self.events) <= since and not self.done:
+                self._cond.wait(timeout)
+            return self.events[since:]
+
+    @property
+    def done(self):
+        return self.status in ('done', 'cancelled', 'failed')
+
+    def to_dict(self, position=0, since=0):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'position': position,
+            'total': self.total,
+            'events': self.events[since:],
+            'next': len(self.events)
+        }
+
+
+class JobManager:
+    """FIFO queue of submission jobs served by a fixed set of worker threads.
+
+    ``judge`` is called as ``judge(job, on_result, should_stop)`` and returns
+    the judge report, which is published with the ``done`` event.
+    ``on_finish(job)`` is called once a job is done, cancelled or failed.
+    """
+
+    def __init__(self, judge, workers, retention, on_finish=None):
+        self.judge = judge
+        self.retention = retention
+        self.on_finish = on_finish
+        self._jobs = {}
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f'judge-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, code, problem, client_id=None, context=None, total=None, address=None):
+        """Queue a job; ``total`` is its number of test cases if not the problem's"""
+        job = Job(code, problem, client_id, context, total, address)
+        with self._cond:
+            self._prune()
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            job.publish('queued', position=len(self._queue))
+            self._cond.notify()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """1-based position of ``job`` in the queue, 0 once it has started"""
+        with self._cond:
+            try:
+                return self._queue.index(job) + 1
+            except ValueError:
+                return 0
+
+    def cancel(self, job):
+        with self._cond:
+            if job.done:
+                return False
+            job.cancel_requested = True
+            if job in self._queue:
+                self._queue.remove(job)
+                self._finish(job, 'cancelled')
+                self._publish_positions()
+        return True
+
+    def stats(self):
+        with self._cond:
+            running = sum(1 for job in self._jobs.values() if job.status == 'running')
+            return {'queued': len(self._queue), 'running': running, 'retained': len(self._jobs)}
+
+    def _finish(self, job, status, **data):
+        job.status = status
+        job.finished = time.time()
+        job.publish(status, **data)
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def _publish_positions(self):
+        for position, queued in enumerate(self._queue, 1):
+            queued.publish('queued', position=position)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.done and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.status = 'running'
+                self._publish_positions()
+            queue_wait_seconds.observe(time.time() - job.created)
+            job.publish('started')
+            try:
+                report = self.judge(
+                    job,
+                    lambda result: job.publish('result', result=result),
+                    lambda: job.cancel_requested
+                )
+            except Exception as e:
+                with self._cond:
+                    self._finish(job, 'failed', error=str(e))
+                continue
+            with self._cond:
+                if job.cancel_requested:
+                    self._finish(job, 'cancelled')
+                else:
+                    self._finish(job, 'done', **report)
@@ -0,0 +1,411 @@
+"""Batch judging of submissions against a problem's test cases"""
+import signal
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import sandbox
+from config import Config
+from channel import LOAD_ERROR, LOADED, FrameReader, decode_value
+from compare import encoded_equal, format_value, parse_expected, values_equal
+from complexity import MEASURE_MIN_TIME, MEASURE_REPEAT, check_required, fit
+from fixtures import fixture_store
+from profiling import timed
+from result_cache import cache_key, is_cacheable, result_cache
+from scheduler import scheduler
+
+# Extra wall-clock time granted to the child on top of the submission budget
+# so that it can report its own per-test timeouts before being killed
+BUDGET_GRACE = 1.0
+
+# Verdicts for a harness test status other than ``ok``
+VERDICTS = {'timeout': 'TLE', 'memory': 'MLE', 'output': 'OLE', 'error': 'RE'}
+
+test_seconds = metrics.histogram('judge_test_seconds', 'Wall time of each test case, by verdict', ['verdict'])
+tests_total = metrics.counter('judge_tests_total', 'Test cases judged, by verdict', ['verdict'])
+submissions_total = metrics.counter('judge_submissions_total', 'Submissions judged, by verdict',
+                                    ['verdict', 'cached'])
+submission_seconds = metrics.histogram('judge_submission_seconds', 'Time to judge a submission, by verdict',
+                                       ['verdict'])
+
+VERDICT_ERRORS = {
+    'TLE': 'Time Limit Exceeded',
+    'MLE': 'Memory Limit Exceeded',
+    'OLE': 'Output Limit Exceeded',
+    'RE': 'Runtime Error',
+}
+
+
+def build_payload(code, problem, indices, test_timeout, budget, test_limits=None):
+    """Build the harness payload running the test cases at ``indices``.
+
+    Fixture inputs are passed by path for the child to map.  ``test_limits``
+    optionally gives each test case its own time limit in place of
+    ``test_timeout``.
+    """
+    test_cases = fixture_store.test_cases(problem)
+    tests = []
+    for i in indices:
+        if 'input_path' in test_cases[i]:
+            test = {'index': i, 'input_path': test_cases[i]['input_path']}
+        else:
+            test = {'index': i, 'input': test_cases[i]['input']}
+        if test_limits:
+            test['timeout'] = test_limits[i]
+        tests.append(test)
+    return {
+        'code': code,
+        'function': problem.get('function', problem['id']),
+        'result_arg': problem.get('result_arg'),
+        'tests': tests,
+        'test_timeout': test_timeout,
+        'budget': budget,
+        'limits': sandbox.resolve_limits(problem.get('limits')),
+    }
+
+
+def execution_verdict(execution):
+    """Verdict for a child that ended without reporting, or None if it
+    exited normally"""
+    if execution.output_exceeded:
+        return 'OLE'
+    if execution.timed_out or execution.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+        # SIGKILL comes from the hard CPU rlimit when not sent by us
+        return 'TLE'
+    if 'MemoryError' in execution.stderr.strip().rpartition('\n')[2]:
+        return 'MLE'
+    if execution.returncode:
+        return 'RE'
+    return None
+
+
+def format_duration(seconds):
+    """Human readable duration keeping sub-millisecond precision"""
+    if seconds < 1:
+        return f"{seconds * 1000:.3f}ms"
+    return f"{seconds:.3f}s"
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def _matches(value, actual, test_case, options):
+    """Compare a test's result with the expected value of ``test_case``"""
+    path = test_case.get('expected_path')
+    if path is None:
+        return values_equal(actual, parse_expected(test_case['expected']), options)
+    # Identical encodings are equal under any options; only decode the
+    # expected fixture when they differ
+    if encoded_equal(value, path):
+        return True
+    with open(path, 'rb') as f:
+        expected = decode_value(f.read())
+    if isinstance(expected, array):
+        expected = expected.tolist()
+    return values_equal(actual, expected, options)
+
+
+def make_result(index, test_case, record, value, test_timeout, options, missing_error=None,
+                missing_verdict=None):
+    """Build the API result entry for one test case.
+
+    ``record`` is the harness metadata for the test and ``value`` the
+    encoded return value, or ``record`` is None when the child never
+    reported the test, in which case ``missing_error`` and
+    ``missing_verdict`` explain why.
+
+    The ``verdict`` is one of AC, WA, TLE, MLE, OLE, RE, or SKIPPED and
+    CANCELLED for tests that were never run.  Results of hidden test cases
+    only carry the verdict and timing: no input, expected value, output or
+    error message that could reveal the test.
+    """
+    if record is None:
+        verdict = missing_verdict or 'TLE'
+        error = missing_error or VERDICT_ERRORS.get(verdict)
+        execution_time = f">{test_timeout:g}s" if verdict == 'TLE' and not missing_error else '0s'
+        record = {'error': error, 'stdout': ''}
+    elif record['status'] == 'timeout':
+        verdict = 'TLE'
+        execution_time = f">{test_timeout:g}s"
+    else:
+        verdict = VERDICTS.get(record['status'])
+        execution_time = format_duration(record['time'])
+
+    output = ''
+    passed = False
+    if record.get('status') == 'ok':
+        actual = decode_value(value)
+        output = format_value(actual)
+        passed = _matches(value, actual, test_case, options)
+        verdict = 'AC' if passed else 'WA'
+
+    result = {
+        'test_case': index + 1,
+        'passed': passed,
+        'hidden': test_case.get('hidden', False),
+        'verdict': verdict,
+        'execution_time': execution_time,
+        'wall_time_ms': _ms(record.get('time')),
+        'cpu_time_ms': _ms(record.get('cpu_time')),
+        'peak_rss_kb': record.get('peak_rss_kb'),
+    }
+    if result['hidden']:
+        result['error'] = VERDICT_ERRORS.get(verdict)
+    else:
+        result.update(input=test_case['input'], expected=test_case['expected'], output=output,
+                      stdout=record.get('stdout', ''), error=record.get('error'))
+    return result
+
+
+def shard_indices(count, shards):
+    """Spread ``count`` test indices over ``shards`` interleaved shards"""
+    return [list(range(count))[k::shards] for k in range(shards)]
+
+
+def run_submission(code, problem, test_timeout, budget, on_result=None, should_stop=None,
+                   client_id=None, test_limits=None, trace=None):
+    """Run all of a problem's test cases against ``code``.
+
+    Results come back from the harness over a framed result channel and are
+    compared as typed values according to the problem's ``compare`` options
+    (see :mod:`compare`).
+
+    The test cases are spread over up to ``JUDGE_MAX_SHARDS`` harness
+    processes which run in parallel, each holding one of the scheduler's
+    slots on behalf of ``client_id``.  ``on_result`` is called with each
+    test's result entry as soon as it is known, and judging is abandoned
+    once ``should_stop()`` returns true.  ``test_limits`` optionally sets a
+    time limit per test case (see :mod:`calibration`).  With a ``trace``
+    (see :mod:`profiling`), each shard records the time it waited for a
+    slot, built its payload, spawned its child, executed and compared.
+
+    Returns ``(results, all_passed, timing)`` where ``results`` has one
+    entry per test case, in order, and ``timing`` separates time spent in
+    the submission from judge overhead.
+    """
+    test_cases = fixture_store.test_cases(problem)
+    options = problem.get('compare') or {}
+    deadline = time.monotonic() + budget
+    results = {}
+    failed = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    timing = {'load_ms': 0.0, 'child_wall_ms': 0.0, 'child_cpu_ms': 0.0, 'max_rss_kb': 0,
+              'processes': 0}
+
+    def limit(index):
+        return test_limits[index] if test_limits else test_timeout
+
+    def cancelled():
+        return should_stop is not None and should_stop()
+
+    def stop():
+        return cancelled() or (options.get('early_exit') and bool(failed))
+
+    def report(index, result):
+        with lock:
+            if index in results:
+                return
+            results[index] = result
+            if not result['passed']:
+                failed.append(index)
+        if on_result is not None:
+            on_result(result)
+
+    def run_shard(shard, indices):
+        load_error = []
+        load_verdict = []
+        compared = [0.0]
+
+        def on_frame(kind, meta, value):
+            if kind == LOADED:
+                with lock:
+                    timing['load_ms'] += meta['time'] * 1000
+            elif kind == LOAD_ERROR:
+                load_error.append(meta['error'])
+                load_verdict.append(VERDICTS[meta['status']])
+            else:
+                index = meta['index']
+                compare_started = time.perf_counter()
+                result = make_result(index, test_cases[index], meta, value, limit(index), options)
+                compared[0] += time.perf_counter() - compare_started
+                report(index, result)
+
+        wait_started = time.perf_counter()
+        with scheduler.slot(client_id):
+            if trace is not None:
+                trace.add('slot_wait', wait_started, time.perf_counter() - wait_started, shard=shard)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or stop():
+                execution = None
+            else:
+                with timed(trace, 'build', shard=shard):
+                    payload = build_payload(code, problem, indices, test_timeout, remaining, test_limits)
+                reader = FrameReader(on_frame)
+                execute_started = time.perf_counter()
+                execution = sandbox.execute('submit', payload, remaining + BUDGET_GRACE,
+                                            on_result=reader.feed, should_stop=stop)
+                if trace is not None:
+                    spawn_time = execution.usage['spawn_time']
+                    trace.add('spawn', execute_started, spawn_time, shard=shard)
+                    trace.add('execute', execute_started + spawn_time,
+                              time.perf_counter() - execute_started - spawn_time, shard=shard)
+                    # Results are compared as they stream in during the execution
+                    trace.add('compare', execute_started + spawn_time, compared[0], shard=shard,
+                              tests=len(indices))
+                with lock:
+                    timing['processes'] += 1
+                    timing['child_wall_ms'] += execution.usage['wall_time'] * 1000
+                    timing['child_cpu_ms'] += execution.usage['cpu_time'] * 1000
+                    timing['max_rss_kb'] = max(timing['max_rss_kb'], execution.usage['max_rss_kb'])
+
+        # The child failed to load, died, was stopped or was killed before
+        # reporting these tests
+        if load_error:
+            missing_error, missing_verdict = load_error[0], load_verdict[0]
+        elif cancelled():
+            missing_error, missing_verdict = 'Cancelled', 'CANCELLED'
+        elif stop():
+            missing_error, missing_verdict = 'Skipped after an earlier failure', 'SKIPPED'
+        elif execution is None:
+            missing_error, missing_verdict = 'Time budget for the submission exhausted', 'TLE'
+        else:
+            missing_verdict = execution_verdict(execution) or 'RE'
+            missing_error = execution.stderr or None
+            if missing_verdict in ('MLE', 'OLE') or (missing_verdict == 'TLE' and not execution.timed_out):
+                missing_error = VERDICT_ERRORS[missing_verdict]
+        for i in indices:
+            report(i, make_result(i, test_cases[i], None, None, limit(i), options, missing_error,
+                                  missing_verdict))
+
+    shards = shard_indices(len(test_cases), max(1, min(len(test_cases), Config.JUDGE_MAX_SHARDS)))
+    if len(shards) == 1:
+        run_shard(0, shards[0])
+    else:
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            for future in [executor.submit(run_shard, shard, indices) for shard, indices in enumerate(shards)]:
+                future.result()
+
+    results = [results[i] for i in range(len(test_cases))]
+    for result in results:
+        tests_total.labels(result['verdict']).inc()
+        if result['wall_time_ms'] is not None:
+            test_seconds.labels(result['verdict']).observe(result['wall_time_ms'] / 1000)
+    user_ms = sum(r['wall_time_ms'] or 0 for r in results)
+    timing.update({
+        'wall_ms': (time.monotonic() - started) * 1000,
+        'user_ms': user_ms,
+        'user_cpu_ms': sum(r['cpu_time_ms'] or 0 for r in results),
+        # Interpreter start-up, fork, IPC and teardown in the sandbox children
+        'overhead_ms': max(0.0, timing['child_wall_ms'] - timing['load_ms'] - user_ms),
+    })
+    timing = {k: round(v, 3) if isinstance(v, float) else v for k, v in timing.items()}
+    return results, all(r['passed'] for r in results), timing
+
+
+def analyze_complexity(code, problem, should_stop=None, client_id=None):
+    """Estimate the time complexity of ``code`` empirically.
+
+    The submission is timed on inputs from the generator named in the
+    problem's ``complexity`` spec, at ``COMPLEXITY_SIZES`` (or the spec's
+    ``sizes``) in increasing order, in one sandbox child.  Larger sizes are
+    skipped once one takes longer than ``COMPLEXITY_POINT_TIMEOUT``.
+
+    Returns None for problems without a ``complexity`` spec, else a dict
+    with the estimated ``class``, its ``confidence``, the measured
+    ``points``, each class' fit ``errors`` and any ``error`` raised by the
+    submission.  When the spec names a ``required`` class, ``met`` is false
+    if a slower class fits the timings better with at least
+    ``COMPLEXITY_MIN_CONFIDENCE``.
+    """
+    spec = problem.get('complexity')
+    if not spec:
+        return None
+    params = {k: v for k, v in spec.items() if k not in ('required', 'sizes')}
+    sizes = spec.get('sizes', Config.COMPLEXITY_SIZES)
+    cases = [fixture_store.build(problem['id'], dict(params, size=n)) for n in sizes]
+
+    payload = build_payload(code, problem, [], Config.COMPLEXITY_POINT_TIMEOUT,
+                            Config.SUBMIT_TIME_BUDGET)
+    payload['tests'] = [{'index': i, 'input_path': case['input_path']} for i, case in enumerate(cases)]
+    payload['measure'] = {'min_time': MEASURE_MIN_TIME, 'repeat': MEASURE_REPEAT}
+    records = {}
+    load_error = []
+
+    def on_frame(kind, meta, value):
+        if kind == LOAD_ERROR:
+            load_error.append(meta['error'])
+        elif kind != LOADED:
+            records[meta['index']] = meta
+
+    def stop():
+        return ((should_stop is not None and should_stop())
+                or any(r['status'] != 'ok' for r in records.values()))
+
+    with scheduler.slot(client_id):
+        reader = FrameReader(on_frame)
+        sandbox.execute('submit', payload, Config.SUBMIT_TIME_BUDGET + BUDGET_GRACE,
+                        on_result=reader.feed, should_stop=stop)
+
+    errors = load_error + [r['error'] for r in records.values() if r['status'] not in ('ok', 'timeout')]
+    points = [(sizes[i], records[i]['time']) for i in sorted(records) if records[i]['status'] == 'ok']
+    name, confidence, fits = fit(points) if not errors else (None, 0.0, {})
+    analysis = {
+        'class': name,
+        'confidence': round(confidence, 3),
+        'points': [{'size': n, 'time_ms': _ms(t)} for n, t in points],
+        'errors': {k: round(v, 4) for k, v in fits.items()},
+        'error': errors[0] if errors else None,
+    }
+    if spec.get('required'):
+        met, required_confidence = check_required(spec['required'], fits) if name else (True, 0.0)
+        analysis['required'] = spec['required']
+        analysis['met'] = met or required_confidence < Config.COMPLEXITY_MIN_CONFIDENCE
+        analysis['required_confidence'] = round(required_confidence, 3)
+    return analysis
+
+
+def judge_submission(code, problem, test_timeout, budget, on_result=None, should_stop=None,
+                     client_id=None, test_limits=None, trace=None):
+    """Like :func:`run_submission` but served from the result cache when an
+    equivalent submission has already been judged.
+
+    Submissions that pass every test of a problem with a required
+    complexity class are then analyzed (see :func:`analyze_complexity`) and
+    get the ``SLOW`` verdict when they do not meet it.
+
+    Returns a report dict with ``all_passed``, the overall ``verdict`` (that
+    of the first test case that did not pass), ``cached``, ``timing``,
+    ``results`` and ``complexity``.
+    """
+    with timed(trace, 'cache_lookup'):
+        key = cache_key(code, problem)
+        cached = result_cache.get(key) if key is not None else None
+    if cached is not None:
+        if on_result is not None:
+            for result in cached['results']:
+                on_result(result)
+        submissions_total.labels(cached['verdict'], 'true').inc()
+        return dict(cached, cached=True)
+
+    started = time.perf_counter()
+    results, all_passed, timing = run_submission(code, problem, test_timeout, budget, on_result,
+                                                 should_stop, client_id, test_limits, trace)
+    verdict = next((r['verdict'] for r in results if not r['passed']), 'AC')
+    complexity = None
+    if all_passed and (problem.get('complexity') or {}).get('required'):
+        with timed(trace, 'complexity'):
+            complexity = analyze_complexity(code, problem, should_stop, client_id)
+        if not complexity['met']:
+            all_passed, verdict = False, 'SLOW'
+    report = {'all_passed': all_passed, 'verdict': verdict, 'cached': False, 'timing': timing,
+              'results': results, 'complexity': complexity}
+    submissions_total.labels(verdict, 'false').inc()
+    submission_seconds.labels(verdict).observe(time.perf_counter() - started)
+    cancelled = should_stop is not None and should_stop()
+    if key is not None and is_cacheable(results) and not cancelled:
+        result_cache.set(key, report)
+    return report
@@ -0,0 +1,398 @@
+"""Judging shared by every web worker of a server.
+
+:class:`JudgeService` owns everything that runs or schedules submissions:
+the sandbox pool, the fair scheduler, the result cache, the calibrator,
+the submission job queue, the submission store and the leaderboards.  The
+development server uses one in-process.  Under ``serve.py`` a single judge
+server process runs it instead (``python judge_server.py <socket>``), and
+each preforked web worker talks to it through a :class:`JudgeClient` over
+a Unix socket.  Every web worker then shares one set of sandbox processes,
+one host-wide execution limit and one job queue, so a job can be polled
+from any worker.
+
+Requests and replies are single lines of JSON: ``{'op': ..., 'args': {...}}``
+answered by ``{'result': ...}`` or ``{'error': ...}``.
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+
+import judge
+import metrics
+import profiling
+import sandbox
+from admission import Overloaded, admission
+from calibration import Calibrator
+from config import Config
+from fixtures import fixture_store
+from jobs import JobManager
+from leaderboard import leaderboards
+from registry import registry
+from result_cache import result_cache
+from scheduler import scheduler
+from store import store
+
+
+class JudgeServerError(Exception):
+    """Raised by :class:`JudgeClient` when the judge server fails a request"""
+
+
+class JudgeService:
+    """The judging operations behind the web endpoints"""
+
+    OPS = ('judge', 'analyze', 'run', 'submit_job', 'poll_job', 'cancel_job', 'calibration', 'stats',
+           'metrics', 'push_metrics', 'configure_profiling', 'store_profile', 'profiling', 'profile',
+           'history', 'submission', 'leaderboard')
+
+    def __init__(self):
+        # Per-test time limits derived from each problem's reference solution
+        self.calibrator = Calibrator(
+            registry.problems,
+            multiplier=Config.TIME_LIMIT_MULTIPLIER,
+            minimum=Config.TIME_LIMIT_MIN,
+            maximum=Config.CODE_TIMEOUT,
+            runs=Config.CALIBRATION_RUNS,
+            interval=Config.CALIBRATION_INTERVAL
+        )
+        self.jobs = None
+        self.worker_metrics = metrics.Aggregator()
+        self.profiles = profiling.ProfileStore(Config.PROFILE_BUFFER_SIZE)
+
+    def start(self):
+        """Start the job workers, the submission store, the leaderboards and,
+        if enabled, calibration"""
+        store.start()
+        leaderboards.start(store.accepted)
+        self.jobs = JobManager(self._judge_job, workers=Config.JOB_WORKERS,
+                               retention=Config.JOB_RETENTION,
+                               on_finish=lambda job: admission.release(job.context))
+        metrics.gauge('judge_jobs_queued', 'Submission jobs waiting for a worker',
+                      callback=lambda: self.jobs.stats()['queued'])
+        metrics.gauge('judge_jobs_running', 'Submission jobs being judged',
+                      callback=lambda: self.jobs.stats()['running'])
+        if Config.CALIBRATE_TIME_LIMITS:
+            self.calibrator.start()
+
+    def _problem(self, problem_id):
+        problem = registry.problem(problem_id)
+        if not problem:
+            raise ValueError('Problem not found')
+        return problem
+
+    def _record(self, submission_id, code, problem_id, client_id, report):
+        """Store a judged submission and rank it if it was accepted"""
+        created = time.time()
+        store.record(submission_id, code, problem_id, client_id, report, created)
+        leaderboards.record(problem_id, client_id, submission_id, created, report)
+
+    def _judge_job(self, job, on_result, should_stop):
+        """Judge a queued submission job, streaming each test's result"""
+        report = judge.judge_submission(
+            job.code, job.problem,
+            test_timeout=Config.CODE_TIMEOUT,
+            budget=Config.SUBMIT_TIME_BUDGET,
+            on_result=on_result,
+            should_stop=should_stop,
+            client_id=job.address,
+            test_limits=self.calibrator.test_limits(job.problem)
+        )
+        if not job.cancel_requested:
+            self._record(job.id, job.code, job.problem['id'], job.client_id, report)
+        return dict(report, submission_id=job.id)
+
+    def judge(self, code, problem_id, client_id=None, address=None, trace=False):
+        """Judge a submission synchronously and return its report, recorded
+        in the submission store under its ``submission_id``.
+
+        The submission belongs to ``client_id``; its executions are admitted
+        and scheduled under the client's ``address``, which unlike the
+        session's id the client cannot change at will.
+
+        With ``trace``, the report carries the judge's ``spans`` (see
+        :mod:`profiling`).
+        """
+        problem = self._problem(problem_id)
+        judge_trace = profiling.Trace() if trace else None
+        with admission.admit(address):
+            report = judge.judge_submission(
+                code, problem,
+                test_timeout=Config.CODE_TIMEOUT,
+                budget=Config.SUBMIT_TIME_BUDGET,
+                client_id=address,
+                test_limits=self.calibrator.test_limits(problem),
+                trace=judge_trace
+            )
+        submission_id = uuid.uuid4().hex
+        self._record(submission_id, code, problem_id, client_id, report)
+        report = dict(report, submission_id=submission_id)
+        if judge_trace is not None:
+            report = dict(report, spans=judge_trace.spans)
+        return report
+
+    def analyze(self, code, problem_id, address=None):
+        problem = self._problem(problem_id)
+        with admission.admit(address):
+            return judge.analyze_complexity(code, problem, client_id=address)
+
+    def run(self, code, address=None):
+        """Run code as a script; returns the execution and the total time it took"""
+        with admission.admit(address), scheduler.slot(address):
+            start_time = time.time()
+            payload = {'code': code, 'limits': sandbox.resolve_limits()}
+            result = sandbox.execute('run', payload, Config.CODE_TIMEOUT)
+            total_time = time.time() - start_time
+        return {'execution': result._asdict(), 'total_time': total_time}
+
+    def submit_job(self, code, problem_id, client_id=None, address=None):
+        problem = self._problem(problem_id)
+        # Admitted until the job finishes
+        ticket = admission.acquire(address)
+        job = self.jobs.submit(code, problem, client_id, context=ticket, total=fixture_store.count(problem),
+                               address=address)
+        return job.to_dict(position=self.jobs.position(job))
+
+    def poll_job(self, job_id, since=0, wait=0):
+        """Job state plus the events after ``since``, waiting up to ``wait``
+        seconds for new ones; None for unknown jobs"""
+        job = self.jobs.get(job_id)
+        if not job:
+            return None
+        if wait > 0:
+            job.wait_events(since, wait)
+        return job.to_dict(position=self.jobs.position(job), since=since)
+
+    def cancel_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job:
+            return None
+        cancelled = self.jobs.cancel(job)
+        return {'job_id': job.id, 'cancelled': cancelled, 'status': job.status}
+
+    def calibration(self):
+        return self.calibrator.snapshot()
+
+    def stats(self):
+        return {'result_cache': result_cache.stats(), 'scheduler': scheduler.stats(),
+                'admission': admission.stats(), 'jobs': self.jobs.stats(), 'store': store.stats(),
+                'leaderboards': leaderboards.stats()}
+
+    def push_metrics(self, pid, snapshot):
+        """Store the latest metrics snapshot of web worker ``pid``;
+        returns the profiling settings"""
+        self.worker_metrics.update(pid, snapshot)
+        return dict(self.profiles.settings)
+
+    def metrics(self, pid=None, snapshot=None):
+        """Metrics of this process and every web worker, merged"""
+        if snapshot is not None:
+            self.push_metrics(pid, snapshot)
+        return self.worker_metrics.collect(metrics.registry.snapshot())
+
+    def configure_profiling(self, settings):
+        return self.profiles.configure(settings)
+
+    def store_profile(self, profile):
+        return self.profiles.add(profile)
+
+    def profiling(self):
+        """Profiling settings and summaries of the stored profiles"""
+        return self.profiles.list()
+
+    def profile(self, profile_id):
+        return self.profiles.get(profile_id)
+
+    def history(self, client_id, problem_id=None, before=None, limit=50):
+        """Summaries of a client's stored submissions, newest first"""
+        return store.history(client_id, problem_id, before, limit)
+
+    def submission(self, submission_id, client_id):
+        """A stored submission of ``client_id`` in full, or None"""
+        return store.get(submission_id, client_id)
+
+    def leaderboard(self, problem_id, metric='runtime', offset=0, limit=20, client_id=None):
+        """A page of a problem's ranking by ``metric``, and ``client_id``'s entry"""
+        return leaderboards.top(problem_id, metric, offset, limit, client_id)
+
+
+class JudgeClient:
+    """Proxy for a :class:`JudgeService` running in the judge server.
+
+    Each thread keeps its own connection, opened on first use.  Once
+    started, the client pushes this process' metrics to the judge server
+    every ``METRICS_PUSH_INTERVAL`` seconds and adopts the profiling
+    settings it answers with.
+    """
+
+    def __init__(self, path, timeout=None):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            conn = self._local.conn = sock.makefile('rwb')
+        return conn
+
+    def _call(self, op, **args):
+        request = json.dumps({'op': op, 'args': args}).encode('utf-8') + b'\n'
+        try:
+            conn = self._connection()
+            conn.write(request)
+            conn.flush()
+            line = conn.readline()
+            if not line:
+                raise OSError('Judge server closed the connection')
+        except OSError as e:
+            self._local.conn = None
+            raise JudgeServerError(f"Judge server unavailable: {e}")
+        reply = json.loads(line)
+        if 'overloaded' in reply:
+            raise Overloaded(reply['overloaded']['status'], reply['error'],
+                             reply['overloaded']['retry_after'])
+        if 'error' in reply:
+            raise JudgeServerError(reply['error'])
+        return reply['result']
+
+    def start(self):
+        threading.Thread(target=self._push_metrics_forever, daemon=True).start()
+
+    def _push_metrics_forever(self):
+        while True:
+            time.sleep(Config.METRICS_PUSH_INTERVAL)
+            try:
+                settings = self._call('push_metrics', pid=os.getpid(), snapshot=metrics.registry.snapshot())
+            except JudgeServerError:
+                continue
+            profiling.profiler.apply(settings)
+
+    def judge(self, code, problem_id, client_id=None, address=None, trace=False):
+        return self._call('judge', code=code, problem_id=problem_id, client_id=client_id, address=address,
+                          trace=trace)
+
+    def analyze(self, code, problem_id, address=None):
+        return self._call('analyze', code=code, problem_id=problem_id, address=address)
+
+    def run(self, code, address=None):
+        return self._call('run', code=code, address=address)
+
+    def submit_job(self, code, problem_id, client_id=None, address=None):
+        return self._call('submit_job', code=code, problem_id=problem_id, client_id=client_id,
+                          address=address)
+
+    def poll_job(self, job_id, since=0, wait=0):
+        return self._call('poll_job', job_id=job_id, since=since, wait=wait)
+
+    def cancel_job(self, job_id):
+        return self._call('cancel_job', job_id=job_id)
+
+    def calibration(self):
+        return self._call('calibration')
+
+    def stats(self):
+        return self._call('stats')
+
+    def metrics(self):
+        return self._call('metrics', pid=os.getpid(), snapshot=metrics.registry.snapshot())
+
+    def configure_profiling(self, settings):
+        return self._call('configure_profiling', settings=settings)
+
+    def store_profile(self, profile):
+        return self._call('store_profile', profile=profile)
+
+    def profiling(self):
+        return self._call('profiling')
+
+    def profile(self, profile_id):
+        return self._call('profile', profile_id=profile_id)
+
+    def history(self, client_id, problem_id=None, before=None, limit=50):
+        return self._call('history', client_id=client_id, problem_id=problem_id, before=before, limit=limit)
+
+    def submission(self, submission_id, client_id):
+        return self._call('submission', submission_id=submission_id, client_id=client_id)
+
+    def leaderboard(self, problem_id, metric='runtime', offset=0, limit=20, client_id=None):
+        return self._call('leaderboard', problem_id=problem_id, metric=metric, offset=offset, limit=limit,
+                          client_id=client_id)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        service = self.server.service
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if request['op'] not in JudgeService.OPS:
+                    raise ValueError(f"Unknown operation {request['op']!r}")
+                reply = {'result': getattr(service, request['op'])(**request.get('args', {}))}
+            except Overloaded as e:
+                reply = {'error': str(e),
+                         'overloaded': {'status': e.status, 'retry_after': e.retry_after}}
+            except Exception as e:
+                reply = {'error': str(e)}
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class JudgeServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service):
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+        self.service = service
+
+
+def connect(path, timeout):
+    """Wait until the judge server at ``path`` accepts connections"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(path)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def main(path):
+    service = JudgeService()
+    if Config.CONTENT_RELOAD_INTERVAL:
+        registry.start(Config.CONTENT_RELOAD_INTERVAL)
+    server = JudgeServer(path, service)
+    service.start()
+
+    def shutdown(signum, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+        store.close()
+        leaderboards.snapshot()
+        pool = sandbox.get_pool()
+        if pool is not None:
+            pool.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else Config.JUDGE_SOCKET)
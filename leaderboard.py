@@ -0,0 +1,271 @@
+"""Per-problem leaderboards of accepted submissions.
+
+Each problem has a leaderboard per metric, ``runtime`` (the CPU time of
+the sandbox processes that ran the submission's tests, ``child_cpu_ms``)
+and ``memory`` (their peak resident memory, ``max_rss_kb``), holding each
+user's best accepted submission.  Both are measured by the judge from the
+kernel's accounting of the finished processes (``wait4``), never taken
+from the timings the submission's own process reports.
+
+A leaderboard is a sorted list of ``(value, created, client)`` keys, ties
+going to the earlier submission, so recording a submission and looking up
+a rank take O(log n) and a page of the top entries O(log n + k).  With
+``sortedcontainers`` installed its ``SortedList`` is used; otherwise a
+plain list kept sorted with bisect, whose inserts move the entries after
+them.
+
+Every ``LEADERBOARD_SNAPSHOT_INTERVAL`` seconds, changed leaderboards are
+written to ``LEADERBOARD_SNAPSHOT`` along with the time of the latest
+submission they include.  At start-up they are loaded from the snapshot
+and only the accepted submissions the :mod:`store` has recorded since
+are replayed; a snapshot of another ``SNAPSHOT_VERSION`` is ignored and
+every stored submission replayed.
+
+Users appear under a pseudonym derived from their anonymous id.
+"""
+import atexit
+import bisect
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from config import Config
+
+try:
+    from sortedcontainers import SortedList
+except ImportError:
+    SortedList = None
+
+logger = logging.getLogger(__name__)
+
+METRICS = {'runtime': 'child_cpu_ms', 'memory': 'max_rss_kb'}
+
+MAX_PAGE = 100
+
+SNAPSHOT_VERSION = 2
+
+# Seconds before a snapshot's latest submission that are replayed too, for
+# submissions judged earlier but recorded after it; replaying is idempotent
+REPLAY_OVERLAP = 60
+
+
+class _BisectList:
+    """The parts of ``SortedList`` used here, on a list kept sorted with bisect"""
+
+    def __init__(self, iterable=()):
+        self._items = sorted(iterable)
+
+    def add(self, value):
+        bisect.insort(self._items, value)
+
+    def remove(self, value):
+        del self._items[self.index(value)]
+
+    def index(self, value):
+        i = bisect.bisect_left(self._items, value)
+        if i == len(self._items) or self._items[i] != value:
+            raise ValueError(f"{value!r} is not in list")
+        return i
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+def _sorted_list(iterable=()):
+    return SortedList(iterable) if SortedList is not None else _BisectList(iterable)
+
+
+def pseudonym(client_id):
+    return hashlib.sha256(client_id.encode('utf-8')).hexdigest()[:10]
+
+
+class Ranking:
+    """Best submission of each user for one problem and metric"""
+
+    def __init__(self, entries=()):
+        self._best = {}  # client -> (value, created, submission id)
+        for client_id, value, created, submission_id in entries:
+            self._best[client_id] = (value, created, submission_id)
+        self._order = _sorted_list((value, created, client_id)
+                                   for client_id, (value, created, _) in self._best.items())
+
+    def update(self, client_id, value, created, submission_id):
+        """Record a submission; returns whether it is the user's new best"""
+        best = self._best.get(client_id)
+        if best is not None:
+            if (value, created) >= best[:2]:
+                return False
+            self._order.remove((best[0], best[1], client_id))
+        self._best[client_id] = (value, created, submission_id)
+        self._order.add((value, created, client_id))
+        return True
+
+    def rank(self, client_id):
+        """1-based rank of the user's best, or None without an accepted submission"""
+        best = self._best.get(client_id)
+        if best is None:
+            return None
+        return self._order.index((best[0], best[1], client_id)) + 1
+
+    def entry(self, client_id, rank=None):
+        value, created, submission_id = self._best[client_id]
+        return {'rank': rank or self.rank(client_id), 'user': pseudonym(client_id), 'value': value,
+                'created': created, 'submission_id': submission_id}
+
+    def page(self, offset, limit):
+        return [self.entry(client_id, rank)
+                for rank, (_, _, client_id) in enumerate(self._order[offset:offset + limit], offset + 1)]
+
+    def entries(self):
+        return [[client_id, value, created, submission_id]
+                for client_id, (value, created, submission_id) in self._best.items()]
+
+    def __contains__(self, client_id):
+        return client_id in self._best
+
+    def __len__(self):
+        return len(self._order)
+
+
+class Leaderboards:
+    """The rankings of every problem, snapshotted to ``path`` when changed"""
+
+    def __init__(self, path, snapshot_interval):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self._rankings = {}  # (problem id, metric) -> Ranking
+        self._through = 0.0  # created time of the latest submission recorded
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self, submissions=None):
+        """Load the snapshot, replay the accepted submissions of the
+        ``submissions(since)`` iterable recorded after it, and start
+        snapshotting"""
+        if self._started:
+            return
+        self._started = True
+        self.load()
+        if submissions is not None:
+            replayed = 0
+            for submission in submissions(self._through - REPLAY_OVERLAP):
+                self.record(submission['problem_id'], submission['client_id'], submission['id'],
+                            submission['created'], submission)
+                replayed += 1
+            if replayed:
+                logger.info('Replayed %d accepted submissions into the leaderboards', replayed)
+        if self.path and self.snapshot_interval:
+            threading.Thread(target=self._snapshot_forever, name='leaderboard-snapshot', daemon=True).start()
+        atexit.register(self.snapshot)
+
+    def record(self, problem_id, client_id, submission_id, created, report):
+        """Rank an accepted submission given its report's ``timing``;
+        returns the metrics it improved the user's best in"""
+        timing = report.get('timing') or {}
+        improved = []
+        if client_id is None or not report['all_passed']:
+            return improved
+        with self._lock:
+            for metric, field in METRICS.items():
+                value = timing.get(field)
+                if value is None:
+                    continue
+                ranking = self._rankings.get((problem_id, metric))
+                if ranking is None:
+                    ranking = self._rankings[(problem_id, metric)] = Ranking()
+                if ranking.update(client_id, value, created, submission_id):
+                    improved.append(metric)
+            self._through = max(self._through, created)
+            self._dirty = self._dirty or bool(improved)
+        return improved
+
+    def top(self, problem_id, metric, offset=0, limit=20, client_id=None):
+        """A page of the leaderboard, plus the entry of ``client_id`` if ranked"""
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+        offset = max(0, offset)
+        limit = max(1, min(limit, MAX_PAGE))
+        with self._lock:
+            ranking = self._rankings.get((problem_id, metric)) or Ranking()
+            entries = ranking.page(offset, limit)
+            mine = ranking.entry(client_id) if client_id in ranking else None
+            total = len(ranking)
+        for entry in entries:
+            entry['you'] = mine is not None and entry['user'] == mine['user']
+        return {'problem_id': problem_id, 'metric': metric, 'unit': 'ms' if metric == 'runtime' else 'kB',
+                'total': total, 'offset': offset, 'entries': entries, 'me': mine}
+
+    # -- snapshots --------------------------------------------------------------
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            logger.exception('Reading the leaderboard snapshot %s failed', self.path)
+            return
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            return
+        with self._lock:
+            self._rankings = {
+                (problem_id, metric): Ranking(entries)
+                for problem_id, metrics in snapshot['rankings'].items()
+                for metric, entries in metrics.items() if metric in METRICS
+            }
+            self._through = snapshot['through']
+
+    def snapshot(self):
+        """Write the rankings to ``path`` if they changed since the last snapshot"""
+        if not self.path:
+            return False
+        with self._lock:
+            if not self._dirty:
+                return False
+            rankings = {}
+            for (problem_id, metric), ranking in self._rankings.items():
+                rankings.setdefault(problem_id, {})[metric] = ranking.entries()
+            snapshot = {'version': SNAPSHOT_VERSION, 'created': time.time(), 'through': self._through,
+                        'rankings': rankings}
+            self._dirty = False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temporary, 'w') as f:
+                json.dump(snapshot, f, separators=(',', ':'))
+            os.replace(temporary, self.path)
+        except OSError:
+            with self._lock:
+                self._dirty = True
+            raise
+        return True
+
+    def _snapshot_forever(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            try:
+                self.snapshot()
+            except OSError:
+                logger.exception('Writing the leaderboard snapshot %s failed', self.path)
+
+    def stats(self):
+        with self._lock:
+            return {'problems': len({problem_id for problem_id, _ in self._rankings}),
+                    'entries': sum(len(ranking) for ranking in self._rankings.values()),
+                    'through': self._through, 'sorted_list': 'sortedcontainers' if SortedList else 'bisect'}
+
+
+leaderboards = Leaderboards(Config.LEADERBOARD_SNAPSHOT, Config.LEADERBOARD_SNAPSHOT_INTERVAL)
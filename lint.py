@@ -0,0 +1,260 @@
+"""Pool of warm lint workers checking code in memory.
+
+Each worker is a long-lived interpreter that has already imported pyflakes
+and pycodestyle and lints one buffer at a time, reading JSON requests from
+stdin and answering on stdout.  Problems are reported with flake8's codes
+and columns, so the results match ``flake8 -`` without starting a process
+per request.  A worker that exceeds the time budget is killed and replaced.
+
+Results are cached by a hash of the code, since editors send the same
+buffer again after cursor moves and undos.
+"""
+import ast
+import hashlib
+import json
+import os
+import queue
+import re
+import select
+import subprocess
+import sys
+import threading
+import time
+
+import pycodestyle
+from flake8.plugins.pyflakes import FLAKE8_PYFLAKES_CODES
+from pyflakes import checker
+
+import metrics
+from config import Config
+from lru import LRUCache
+from supersede import Superseded
+
+# Codes ignored besides LINT_IGNORE: flake8's own defaults
+DEFAULT_IGNORE = ('E121', 'E123', 'E126', 'E226', 'E24', 'E704', 'W503', 'W504')
+
+# How often a request waiting for a worker checks whether it is still wanted
+POLL_INTERVAL = 0.05
+
+lint_seconds = metrics.histogram('lint_seconds', 'Time to lint a buffer, by outcome', ['outcome'])
+
+# ``# noqa`` and ``# noqa: E501,F401`` comments, as understood by flake8
+NOQA = re.compile(r'# noqa(?::[\s]?(?P<codes>([A-Z]+[0-9]+(?:[,\s]+)?)+))?', re.IGNORECASE)
+
+
+class LintError(Exception):
+    """Raised when a lint worker dies or exceeds its time budget"""
+
+
+# -- worker side --------------------------------------------------------------
+
+def _style_guide(ignore):
+    class Report(pycodestyle.BaseReport):
+        def init_file(self, filename, lines, expected, line_offset):
+            super().init_file(filename, lines, expected, line_offset)
+            self.problems = []
+
+        def error(self, line_number, offset, text, check):
+            code = text[:4]
+            if not self._ignore_code(code):
+                self.problems.append((line_number, offset + 1, code, text[5:]))
+
+    return pycodestyle.StyleGuide(ignore=list(ignore), reporter=Report, quiet=True)
+
+
+def check(code, style):
+    """flake8-style ``(row, col, code, text)`` problems of a source string"""
+    try:
+        tree = compile(code, 'stdin', 'exec', ast.PyCF_ONLY_AST, dont_inherit=True)
+    except SyntaxError as e:
+        return [(e.lineno or 1, (e.offset or 0) + 1, 'E999', f"{type(e).__name__}: {e.msg}")]
+    except ValueError as e:
+        return [(1, 1, 'E999', f"{type(e).__name__}: {e}")]
+
+    lines = code.splitlines(True)
+    problems = []
+    for message in checker.Checker(tree, filename='stdin').messages:
+        name = FLAKE8_PYFLAKES_CODES.get(type(message).__name__, 'F999')
+        problems.append((message.lineno, message.col + 1, name,
+                         message.message % message.message_args))
+    pep8 = style.checker_class(lines=lines, options=style.options)
+    pep8.check_all()
+    problems.extend(pep8.report.problems)
+
+    kept = []
+    for row, col, name, text in sorted(problems):
+        match = NOQA.search(lines[row - 1]) if 0 < row <= len(lines) else None
+        if match:
+            codes = match.group('codes')
+            if not codes or any(name.startswith(c) for c in re.split(r'[,\s]+', codes.strip())):
+                continue
+        kept.append((row, col, name, text))
+    return kept
+
+
+def serve_worker(ignore):
+    """Worker main loop: one JSON request per line on stdin"""
+    style = _style_guide(ignore)
+    check('import os\n', style)  # load everything before the first request
+    for line in sys.stdin:
+        request = json.loads(line)
+        sys.stdout.write(json.dumps({'problems': check(request['code'], style)}) + '\n')
+        sys.stdout.flush()
+
+
+# -- parent side --------------------------------------------------------------
+
+class LintWorker:
+    """Handle on one lint worker process"""
+
+    def __init__(self, ignore):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), ','.join(ignore)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            close_fds=True,
+            text=True
+        )
+        self.uses = 0
+        self.healthy = True
+
+    def check(self, code, deadline):
+        self.uses += 1
+        try:
+            self.proc.stdin.write(json.dumps({'code': code}) + '\n')
+            self.proc.stdin.flush()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.proc.stdout], [], [], remaining)[0]:
+                raise LintError('Lint time budget exceeded')
+            line = self.proc.stdout.readline()
+            if not line:
+                raise LintError('Lint worker exited unexpectedly')
+        except OSError as e:
+            self.healthy = False
+            raise LintError(str(e))
+        except LintError:
+            self.healthy = False
+            raise
+        return [tuple(problem) for problem in json.loads(line)['problems']]
+
+    def close(self):
+        try:
+            self.proc.kill()
+            self.proc.wait()
+        except OSError:
+            pass
+
+
+class LintPool:
+    """Bounded pool of lint workers with a cache of results by code hash"""
+
+    def __init__(self, size, timeout, cache_size, ignore=(), max_uses=1000):
+        self.size = size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.ignore = list(DEFAULT_IGNORE) + list(ignore)
+        self.cache = LRUCache(cache_size)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all = set()
+
+    def _checkout(self, deadline, should_stop=None):
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LintError('No lint worker available')
+            if self._slots.acquire(timeout=min(remaining, POLL_INTERVAL)):
+                break
+            if should_stop is not None and should_stop():
+                raise Superseded()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            worker = LintWorker(self.ignore)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._all.add(worker)
+        return worker
+
+    def _checkin(self, worker):
+        if worker.healthy and worker.uses < self.max_uses and worker.proc.poll() is None:
+            self._idle.put(worker)
+        else:
+            with self._lock:
+                self._all.discard(worker)
+            worker.close()
+        self._slots.release()
+
+    def lint(self, code, should_stop=None):
+        """Problems found in ``code``, from the cache when possible.
+
+        Raises :class:`LintError` when no result is ready within the time
+        budget, and :class:`supersede.Superseded` if ``should_stop()``
+        turns true before a worker picks the request up.
+        """
+        started = time.perf_counter()
+        key = hashlib.sha256(code.encode('utf-8')).hexdigest()
+        problems = self.cache.get(key)
+        if problems is not None:
+            lint_seconds.labels('cached').observe(time.perf_counter() - started)
+            return problems
+        outcome = 'error'
+        try:
+            deadline = time.monotonic() + self.timeout
+            worker = self._checkout(deadline, should_stop)
+            try:
+                if should_stop is not None and should_stop():
+                    raise Superseded()
+                problems = worker.check(code, deadline)
+            finally:
+                self._checkin(worker)
+            outcome = 'linted'
+        except Superseded:
+            outcome = 'superseded'
+            raise
+        finally:
+            lint_seconds.labels(outcome).observe(time.perf_counter() - started)
+        self.cache.set(key, problems)
+        return problems
+
+    def warm(self):
+        """Start every worker ahead of the first request"""
+        workers = [self._checkout(time.monotonic() + self.timeout) for _ in range(self.size)]
+        for worker in workers:
+            self._checkin(worker)
+
+    def stats(self):
+        return dict(self.cache.stats(), workers=len(self._all), max_workers=self.size)
+
+    def close(self):
+        with self._lock:
+            workers = list(self._all)
+            self._all.clear()
+        for worker in workers:
+            worker.close()
+
+
+def markers(problems):
+    """Monaco editor markers for lint problems"""
+    return [{
+        'startLineNumber': row,
+        'startColumn': col,
+        'endLineNumber': row,
+        'endColumn': col + 1,  # Heuristic
+        'message': f"{code}: {text}",
+        'severity': 8  # MarkerSeverity.Error = 8
+    } for row, col, code, text in problems]
+
+
+lint_pool = LintPool(Config.LINT_WORKERS, Config.LINT_TIMEOUT, Config.LINT_CACHE_SIZE,
+                     ignore=Config.LINT_IGNORE)
+metrics.register_cache('lint_cache', lint_pool.cache)
+
+
+if __name__ == '__main__':
+    serve_worker([code for code in sys.argv[1].split(',') if code] if len(sys.argv) > 1 else [])
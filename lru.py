@@ -0,0 +1,78 @@
+"""Thread-safe LRU cache with optional time-to-live"""
+import collections
+import threading
+import time
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded mapping evicting the least recently used entries.
+
+    Entries older than ``ttl`` seconds are treated as missing.  With a
+    ``weigh`` function, ``maxsize`` bounds the total weight of the entries
+    (for example their size in bytes) instead of their number.  Hit and
+    miss counts are kept for reporting through :meth:`stats`.
+    """
+
+    def __init__(self, maxsize, ttl=None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.weigh = weigh
+        self.weight = 0
+        self._data = collections.OrderedDict()  # key -> (expires, value, weight)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] is not None and entry[0] < time.monotonic():
+                del self._data[key]
+                self.weight -= entry[2]
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        weight = self.weigh(value) if self.weigh else 1
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.weight -= old[2]
+            if weight > self.maxsize:
+                return
+            self._data[key] = (expires, value, weight)
+            self.weight += weight
+            while self.weight > self.maxsize:
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.weight -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'weight': self.weight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
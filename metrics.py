@@ -0,0 +1,260 @@
+"""Metrics in the Prometheus text format.
+
+Counters and histograms record into cells private to the recording thread,
+so recording takes no lock; the cells are summed only when the metrics are
+collected.  Values kept elsewhere (queue lengths, cache statistics) are
+read from callbacks at collection time.
+
+Under ``serve.py`` each web worker and the judge server have their own
+metrics.  Workers push a :meth:`Registry.snapshot` to the judge server every
+``METRICS_PUSH_INTERVAL`` seconds and when they are scraped, and the judge
+server merges them with its own (see :class:`Aggregator`), so any worker
+answers a scrape for the whole host.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; from a cached page to a slow submission
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Child:
+    """A metric with its label values bound"""
+
+    __slots__ = ('metric', 'values')
+
+    def __init__(self, metric, values):
+        self.metric = metric
+        self.values = values
+
+    def _cell(self):
+        cells = self.metric._cells()
+        cell = cells.get(self.values)
+        if cell is None:
+            cell = cells[self.values] = [0] * self.metric.size
+        return cell
+
+    def inc(self, amount=1):
+        self._cell()[0] += amount
+
+    def observe(self, value):
+        cell = self._cell()
+        cell[bisect.bisect_left(self.metric.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the ``with`` block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Metric:
+    """A counter, gauge or histogram, optionally with labels.
+
+    Histogram cells hold one count per bucket, one for ``+Inf`` and the sum
+    of the observed values.  Metrics with a ``callback`` record nothing
+    themselves: the callback returns the current value, or a dict mapping
+    tuples of label values to values.
+    """
+
+    def __init__(self, kind, name, help, labels=(), buckets=None, callback=None):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labels_names = tuple(labels)
+        self.buckets = tuple(buckets or ())
+        self.size = len(self.buckets) + 2 if kind == 'histogram' else 1
+        self.callback = callback
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads = []  # (thread, {label values: cell})
+        self._retired = {}  # cells of threads that have exited, summed
+        self._children = {}
+
+    def _cells(self):
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells = self._local.cells = {}
+            with self._lock:
+                self._threads.append((threading.current_thread(), cells))
+            return cells
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, _Child(self, tuple(str(v) for v in values)))
+        return child
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self):
+        """``[[label values, values], ...]`` summed over every thread"""
+        if self.callback is not None:
+            value = self.callback()
+            if not isinstance(value, dict):
+                value = {(): value}
+            return [[list(key), [value]] for key, value in value.items()]
+        totals = {}
+        with self._lock:
+            threads = []
+            for thread, cells in self._threads:
+                if thread.is_alive():
+                    threads.append((thread, cells))
+                else:
+                    # Exited threads write no more, fold their cells away
+                    _add(self._retired, list(cells.items()))
+            self._threads = threads
+            _add(totals, list(self._retired.items()))
+            for _, cells in threads:
+                _add(totals, list(cells.items()))
+        return [[list(key), values] for key, values in totals.items()]
+
+
+def _add(totals, items):
+    for key, values in items:
+        total = totals.get(key)
+        if total is None:
+            totals[key] = list(values)
+        else:
+            totals[key] = [a + b for a, b in zip(total, values)]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=(), callback=None):
+        return self._register(Metric('counter', name, help, labels, callback=callback))
+
+    def gauge(self, name, help, labels=(), callback=None):
+        return self._register(Metric('gauge', name, help, labels, callback=callback))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Metric('histogram', name, help, labels, buckets))
+
+    def snapshot(self):
+        """Current values of every metric, as JSON-serializable data"""
+        return {name: {
+            'type': metric.kind,
+            'help': metric.help,
+            'labels': list(metric.labels_names),
+            'buckets': list(metric.buckets),
+            'samples': metric.samples(),
+        } for name, metric in self._metrics.items()}
+
+
+def merge(snapshots):
+    """Sum snapshots of several processes into one"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, dict(metric, samples={}))
+            _add(target['samples'], [(tuple(key), values) for key, values in metric['samples']])
+    for metric in merged.values():
+        metric['samples'] = [[list(key), values] for key, values in metric['samples'].items()]
+    return merged
+
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'le="{extra}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """Prometheus text exposition of a snapshot"""
+    lines = []
+    for name in sorted(snapshot):
+        metric = snapshot[name]
+        names = metric['labels']
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for values, cell in sorted(metric['samples']):
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_labels(names, values)} {_number(cell[0])}")
+                continue
+            count = 0
+            for bound, bucket in zip(metric['buckets'] + ['+Inf'], cell):
+                count += bucket
+                lines.append(f"{name}_bucket{_labels(names, values, bound)} {count}")
+            lines.append(f"{name}_sum{_labels(names, values)} {_number(cell[-1])}")
+            lines.append(f"{name}_count{_labels(names, values)} {count}")
+    return '\n'.join(lines) + '\n'
+
+
+class Aggregator:
+    """Latest snapshot pushed by each web worker.
+
+    Counters and histograms of workers that have exited are kept, so that
+    they never go backwards; their gauges are dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._workers = {}  # pid -> snapshot
+        self._retired = {}
+
+    def update(self, pid, snapshot):
+        with self._lock:
+            self._workers[pid] = snapshot
+
+    def _prune(self):
+        for pid in list(self._workers):
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                snapshot = self._workers.pop(pid)
+                self._retired = merge([self._retired, {
+                    name: metric for name, metric in snapshot.items() if metric['type'] != 'gauge'
+                }])
+            except PermissionError:
+                pass
+
+    def collect(self, own):
+        """``own`` merged with every worker's snapshot"""
+        with self._lock:
+            self._prune()
+            return merge([own, self._retired] + list(self._workers.values()))
+
+
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
+
+
+def register_cache(name, cache):
+    """Export the statistics of an :class:`lru.LRUCache` as ``<name>_*``"""
+    for key in ('hits', 'misses', 'evictions'):
+        counter(f"{name}_{key}_total", f"{name.replace('_', ' ').capitalize()} {key}",
+                callback=lambda key=key: cache.stats()[key])
+    gauge(f"{name}_entries", f"Entries in the {name.replace('_', ' ')}",
+          callback=lambda: cache.stats()['size'])
@@ -0,0 +1,51 @@
+"""In-memory cache of rendered content pages.
+
+Pages are keyed by endpoint, view arguments and the catalog version, so
+any change to the problems or lessons makes every cached page stale; the
+cache is emptied as soon as a request sees a new version.  Each page is
+stored with an ETag derived from its content, so browsers revalidating a
+page they already have get an empty 304 response.
+"""
+import functools
+import hashlib
+
+from flask import Response, request
+
+import metrics
+from config import Config
+from lru import LRUCache
+from registry import registry
+
+# Rendered pages and their ETags, bounded by the pages' total size in bytes
+page_cache = LRUCache(Config.PAGE_CACHE_BYTES, weigh=lambda entry: len(entry[0]))
+metrics.register_cache('page_cache', page_cache)
+
+_version = [registry.version]
+
+
+def cached_page(view):
+    """Serve a view's rendered HTML from :data:`page_cache`.
+
+    Only successful responses, returned by the view as a plain string, are
+    cached.
+    """
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        version = registry.version
+        if version != _version[0]:
+            _version[0] = version
+            page_cache.clear()
+        key = (request.endpoint, tuple(sorted(kwargs.items())), version)
+        entry = page_cache.get(key)
+        if entry is None:
+            response = view(**kwargs)
+            if not isinstance(response, str):
+                return response
+            body = response.encode('utf-8')
+            entry = (body, hashlib.sha256(body).hexdigest()[:32])
+            page_cache.set(key, entry)
+        body, etag = entry
+        response = Response(body, mimetype='text/html')
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    return wrapper
@@ -0,0 +1,281 @@
+"""Opt-in profiling of web requests.
+
+An admin turns profiling on for a fraction of requests, optionally only for
+some routes (see the ``/admin/profiling`` endpoints).  Each profiled request
+gets:
+
+- a :class:`Trace` of span timings for its phases, including those of the
+  judge, which may run in another thread or in the judge server and hands
+  its spans back with its report
+- a ``deterministic`` profile of the request thread (cProfile), downloadable
+  in the pstats format, or a ``sampling`` profile of every thread of the
+  process taken every ``PROFILE_SAMPLE_INTERVAL`` seconds while the request
+  runs, downloadable as folded stacks for flamegraph tools
+
+The settings and the last ``PROFILE_BUFFER_SIZE`` profiles are kept in
+memory by the judge service (see :class:`ProfileStore`), so that under
+``serve.py`` they are shared by every web worker; workers pick up new
+settings when they push their metrics.  While profiling is off, requests
+only check one attribute, and spans are a thread-local lookup.
+"""
+import base64
+import collections
+import cProfile
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import Config
+
+MODES = ('deterministic', 'sampling')
+
+_local = threading.local()
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """Span timings of one request, relative to its start"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, start, duration, **fields):
+        """Record a span that began at ``perf_counter()`` time ``start``"""
+        self.spans.append(dict(fields, name=name, start_ms=round((start - self.started) * 1000, 3),
+                               duration_ms=round(duration * 1000, 3)))
+
+    def extend(self, spans, start):
+        """Add spans of a trace that began at ``start``, possibly in another process"""
+        offset = (start - self.started) * 1000
+        for span in spans:
+            self.spans.append(dict(span, start_ms=round(span['start_ms'] + offset, 3)))
+
+    @contextmanager
+    def span(self, name, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter() - start, **fields)
+
+
+def timed(trace, name, **fields):
+    """Span of ``trace``, or a no-op without one"""
+    return NO_SPAN if trace is None else trace.span(name, **fields)
+
+
+def current():
+    """Trace of the request being profiled in this thread, if any"""
+    return getattr(_local, 'trace', None)
+
+
+def span(name, **fields):
+    """Span of the current request's trace, or a no-op when it is not profiled"""
+    return timed(current(), name, **fields)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _Sampler:
+    """Collects the stacks of every thread until stopped"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='profile-sampler')
+        self._thread.start()
+
+    def _run(self):
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == self._thread.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profile:
+    """Profile of one request while it runs"""
+
+    def __init__(self, mode, method, route, path, sample_interval):
+        self.mode = mode
+        self.method = method
+        self.route = route
+        self.path = path
+        self.created = time.time()
+        self.trace = Trace()
+        self._profiler = self._sampler = None
+        if mode == 'deterministic':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._sampler = _Sampler(sample_interval)
+
+    def stop(self, status):
+        """Stop profiling; returns the profile as JSON-serializable data"""
+        duration = time.perf_counter() - self.trace.started
+        if self._profiler is not None:
+            self._profiler.disable()
+            data = marshal.dumps(pstats.Stats(self._profiler).stats)
+        else:
+            data = self._sampler.stop().encode('utf-8')
+        return {
+            'mode': self.mode,
+            'method': self.method,
+            'route': self.route,
+            'path': self.path,
+            'created': self.created,
+            'status': status,
+            'duration_ms': round(duration * 1000, 3),
+            'pid': os.getpid(),
+            'spans': sorted(self.trace.spans, key=lambda span: span['start_ms']),
+            'data': base64.b64encode(data).decode('ascii'),
+        }
+
+
+def filename(profile):
+    return f"profile-{profile['id']}.{'pstats' if profile['mode'] == 'deterministic' else 'folded'}"
+
+
+def summary(profile):
+    """A stored profile without its data"""
+    return dict({k: v for k, v in profile.items() if k != 'data'},
+                size=len(profile['data']) * 3 // 4,
+                download=f"/admin/profiling/{profile['id']}/{filename(profile)}")
+
+
+def make_settings(enabled=True, mode='deterministic', rate=1.0, routes=None, count=None):
+    """Validated profiling settings: profile a ``rate`` fraction of the
+    requests to ``routes`` (all when empty), at most ``count`` of them"""
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    rate = float(rate)
+    if not 0 < rate <= 1:
+        raise ValueError('rate must be in (0, 1]')
+    if count is not None:
+        count = int(count)
+        if count < 1:
+            raise ValueError('count must be positive')
+    if routes is not None and (isinstance(routes, str) or not all(isinstance(r, str) for r in routes)):
+        raise ValueError('routes must be a list of routes')
+    return {'enabled': bool(enabled), 'mode': mode, 'rate': rate,
+            'routes': sorted(routes) if routes else None, 'remaining': count}
+
+
+class ProfileStore:
+    """Profiling settings and the most recent profiles of every web worker"""
+
+    def __init__(self, size):
+        self.settings = make_settings(enabled=False)
+        self._profiles = collections.deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def configure(self, settings):
+        """Replace the settings (see :func:`make_settings`); returns them"""
+        with self._lock:
+            self.settings = dict(settings)
+            return dict(self.settings)
+
+    def add(self, profile):
+        """Store a finished profile; returns the settings"""
+        with self._lock:
+            self._profiles.append(dict(profile, id=next(self._ids)))
+            remaining = self.settings['remaining']
+            if remaining is not None:
+                self.settings['remaining'] = remaining = max(0, remaining - 1)
+                if not remaining:
+                    self.settings['enabled'] = False
+            return dict(self.settings)
+
+    def list(self):
+        with self._lock:
+            return {'settings': dict(self.settings, buffer_size=self._profiles.maxlen),
+                    'profiles': [summary(profile) for profile in reversed(self._profiles)]}
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((profile for profile in self._profiles if profile['id'] == profile_id), None)
+
+
+class Profiler:
+    """Chooses the requests of this process to profile"""
+
+    def __init__(self, sample_interval):
+        self.enabled = False
+        self.sample_interval = sample_interval
+        self._settings = {}
+        self._lock = threading.Lock()
+
+    def apply(self, settings):
+        """Adopt the settings of the :class:`ProfileStore`"""
+        with self._lock:
+            self._settings = dict(settings)
+            self.enabled = settings['enabled']
+
+    def begin(self, method, route, path):
+        """Start profiling this thread's request if it is selected"""
+        if not self.enabled:
+            return
+        with self._lock:
+            settings = self._settings
+            if not settings['enabled'] or (settings['routes'] and route not in settings['routes']):
+                return
+            if random.random() >= settings['rate']:
+                return
+            if settings['remaining'] is not None:
+                # Counted again by the store, this keeps a single worker from overshooting
+                settings['remaining'] -= 1
+                if settings['remaining'] <= 0:
+                    settings['enabled'] = self.enabled = False
+        try:
+            profile = Profile(settings['mode'], method, route, path, self.sample_interval)
+        except ValueError:
+            # Another profiler is active in this thread
+            return
+        _local.trace = profile.trace
+        _local.profile = profile
+
+    def end(self, status):
+        """Finish this thread's profile; returns it, or None if there was none"""
+        profile = getattr(_local, 'profile', None)
+        if profile is None:
+            return None
+        _local.trace = _local.profile = None
+        return profile.stop(status)
+
+
+profiler = Profiler(Config.PROFILE_SAMPLE_INTERVAL)
@@ -0,0 +1,235 @@
+"""Disk-backed catalog of practice problems and lessons.
+
+Content lives under ``CONTENT_DIR``::
+
+    problems/<problem_id>/problem.json     metadata (title, difficulty, category, order,
+                                           judge settings)
+    problems/<problem_id>/description.txt
+    problems/<problem_id>/starter.py
+    problems/<problem_id>/reference.py
+    problems/<problem_id>/tests.json       inline test cases
+    lessons/<category>/<lesson_id>/lesson.json   title, description, order
+    lessons/<category>/<lesson_id>/content.html
+
+Only the metadata files are read when the catalog is indexed; the other
+files are read the first time a field is accessed.  A background thread
+polls modification times and rebuilds the indexes for changed entries,
+swapping them in as a whole so readers never see a half-built catalog.
+"""
+import collections
+import json
+import os
+import threading
+from collections.abc import Mapping
+
+from config import Config
+
+PROBLEM_FIELDS = {
+    'description': 'description.txt',
+    'starter_code': 'starter.py',
+    'reference': 'reference.py',
+    'test_cases': 'tests.json',
+}
+
+LESSON_FIELDS = {
+    'content': 'content.html',
+}
+
+# Length of the description excerpt shown in the problem list
+SUMMARY_LENGTH = 150
+
+
+def _summary(record):
+    return record.read('description')[:SUMMARY_LENGTH]
+
+
+# Fields computed from other fields once per record
+PROBLEM_DERIVED = {
+    'summary': _summary,
+}
+
+Index = collections.namedtuple(
+    'Index', 'version problems by_difficulty by_category lessons lessons_by_category'
+)
+
+
+class Record(Mapping):
+    """A catalog entry whose heavy fields are read from disk on first access"""
+
+    def __init__(self, path, meta, fields, derived=None):
+        self.path = path
+        self._meta = meta
+        self._fields = fields  # key -> file name, for the files that exist
+        self._derived = derived or {}
+        self._loaded = {}
+
+    def read(self, key):
+        """Read a heavy field from disk without keeping it"""
+        with open(os.path.join(self.path, self._fields[key]), encoding='utf-8') as f:
+            if self._fields[key].endswith('.json'):
+                return json.load(f)
+            return f.read().rstrip('\n')
+
+    def __getitem__(self, key):
+        if key in self._meta:
+            return self._meta[key]
+        if key not in self._fields and key not in self._derived:
+            raise KeyError(key)
+        try:
+            return self._loaded[key]
+        except KeyError:
+            pass
+        if key in self._fields:
+            value = self.read(key)
+        else:
+            value = self._derived[key](self)
+        self._loaded[key] = value
+        return value
+
+    def __iter__(self):
+        yield from self._meta
+        yield from self._fields
+        yield from self._derived
+
+    def __len__(self):
+        return len(self._meta) + len(self._fields) + len(self._derived)
+
+    def __repr__(self):
+        return f"<Record {self._meta.get('id')!r}>"
+
+
+def _stamp(path):
+    """Modification state of an entry directory, to detect changes"""
+    try:
+        return tuple(sorted((e.name, e.stat().st_mtime_ns, e.stat().st_size)
+                            for e in os.scandir(path) if e.is_file()))
+    except OSError:
+        return None
+
+
+def _subdirs(path):
+    try:
+        return sorted(e.name for e in os.scandir(path) if e.is_dir() and not e.name.startswith('.'))
+    except OSError:
+        return []
+
+
+def _sort_key(record):
+    return (record.get('order', 0), record['id'])
+
+
+class Registry:
+    """Indexed catalog with O(1) lookups and hot reload"""
+
+    def __init__(self, root):
+        self.root = root
+        self.errors = {}  # entry path -> error of its last failed load
+        self._index = Index(0, {}, {}, {}, {}, {})
+        self._stamps = {}  # entry path -> (stamp, record)
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _record(self, path, meta_file, fields, extra, derived=None):
+        """Record for the entry at ``path``, reusing the previous one if unchanged"""
+        stamp = _stamp(path)
+        previous = self._stamps.get(path)
+        if previous is not None and previous[0] == stamp:
+            return previous[1]
+        try:
+            with open(os.path.join(path, meta_file), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError) as e:
+            self.errors[path] = str(e)
+            # Keep serving the last good version while a file is being edited
+            return previous[1] if previous is not None else None
+        self.errors.pop(path, None)
+        meta.update(extra)
+        names = set(os.listdir(path))
+        record = Record(path, meta, {k: v for k, v in fields.items() if v in names}, derived)
+        self._stamps[path] = (stamp, record)
+        return record
+
+    def reload(self):
+        """Rescan the content directory and swap in fresh indexes.
+
+        Returns True if anything changed.
+        """
+        with self._reload_lock:
+            problems = {}
+            problems_dir = os.path.join(self.root, 'problems')
+            for name in _subdirs(problems_dir):
+                record = self._record(os.path.join(problems_dir, name), 'problem.json',
+                                      PROBLEM_FIELDS, {'id': name}, PROBLEM_DERIVED)
+                if record is not None:
+                    problems[name] = record
+
+            lessons = {}
+            lessons_dir = os.path.join(self.root, 'lessons')
+            for category in _subdirs(lessons_dir):
+                for name in _subdirs(os.path.join(lessons_dir, category)):
+                    record = self._record(os.path.join(lessons_dir, category, name), 'lesson.json',
+                                          LESSON_FIELDS, {'id': name, 'category': category})
+                    if record is not None:
+                        lessons[(category, name)] = record
+
+            old = self._index
+            if (problems.keys() == old.problems.keys() and lessons.keys() == old.lessons.keys()
+                    and all(problems[k] is old.problems[k] for k in problems)
+                    and all(lessons[k] is old.lessons[k] for k in lessons)):
+                return False
+            live = {record.path for record in problems.values()}
+            live.update(record.path for record in lessons.values())
+            self._stamps = {path: entry for path, entry in self._stamps.items() if path in live}
+
+            ordered = sorted(problems.values(), key=_sort_key)
+            by_difficulty, by_category = {}, {}
+            for record in ordered:
+                by_difficulty.setdefault(record.get('difficulty'), []).append(record)
+                by_category.setdefault(record.get('category'), []).append(record)
+            lessons_by_category = {}
+            for record in sorted(lessons.values(), key=_sort_key):
+                lessons_by_category.setdefault(record['category'], []).append(record)
+
+            self._index = Index(old.version + 1, {r['id']: r for r in ordered}, by_difficulty,
+                                by_category, lessons, lessons_by_category)
+            return True
+
+    @property
+    def version(self):
+        """Number incremented every time the catalog changes"""
+        return self._index.version
+
+    def problem(self, problem_id):
+        return self._index.problems.get(problem_id)
+
+    def problems(self, difficulty=None, category=None):
+        """Problems in catalog order, optionally filtered by one index"""
+        index = self._index
+        if difficulty is not None:
+            return list(index.by_difficulty.get(difficulty, []))
+        if category is not None:
+            return list(index.by_category.get(category, []))
+        return list(index.problems.values())
+
+    def lesson(self, category, lesson_id):
+        return self._index.lessons.get((category, lesson_id))
+
+    def lessons(self, category):
+        return list(self._index.lessons_by_category.get(category, []))
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            self.reload()
+
+    def start(self, interval):
+        """Poll for changed content every ``interval`` seconds"""
+        thread = threading.Thread(target=self._watch, args=(interval,), name='registry-reload',
+                                  daemon=True)
+        thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+registry = Registry(Config.CONTENT_DIR)
+registry.reload()
@@ -0,0 +1,68 @@
+"""Judge result cache keyed by a normalized-AST fingerprint of the submission"""
+import ast
+import hashlib
+import json
+
+from config import Config
+from fixtures import fixture_key
+import metrics
+from lru import LRUCache
+from sandbox import resolve_limits
+
+
+class _StripDocstrings(ast.NodeTransformer):
+    """Remove docstrings, which like comments do not affect behaviour"""
+
+    def _strip(self, node):
+        self.generic_visit(node)
+        body = node.body
+        if (body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant)
+                and isinstance(body[0].value.value, str)):
+            node.body = body[1:] or [ast.Pass()]
+        return node
+
+    visit_Module = visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _strip
+
+
+def fingerprint(code):
+    """Hash of the submission's AST, ignoring whitespace, comments and docstrings.
+
+    Returns None for code that does not parse.
+    """
+    try:
+        tree = _StripDocstrings().visit(ast.parse(code))
+    except (SyntaxError, ValueError):
+        return None
+    return hashlib.sha256(ast.dump(tree).encode('utf-8')).hexdigest()
+
+
+def suite_version(problem):
+    """Hash of everything about a problem that influences its verdicts"""
+    suite = {
+        'function': problem.get('function', problem['id']),
+        'result_arg': problem.get('result_arg'),
+        'compare': problem.get('compare'),
+        'test_cases': problem['test_cases'],
+        'fixtures': [fixture_key(spec) for spec in problem.get('fixtures', [])],
+        'complexity': problem.get('complexity'),
+        'test_timeout': Config.CODE_TIMEOUT,
+        'limits': resolve_limits(problem.get('limits')),
+    }
+    return hashlib.sha256(json.dumps(suite, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(code, problem):
+    """Cache key for a submission, or None when it cannot be cached"""
+    digest = fingerprint(code)
+    if digest is None:
+        return None
+    return (problem['id'], suite_version(problem), digest)
+
+
+def is_cacheable(results):
+    """Only cache verdicts that do not depend on timing or cancellation"""
+    return not any(r['verdict'] in ('TLE', 'CANCELLED') for r in results)
+
+
+result_cache = LRUCache(Config.RESULT_CACHE_SIZE, Config.RESULT_CACHE_TTL)
+metrics.register_cache('result_cache', result_cache)
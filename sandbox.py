@@ -0,0 +1,544 @@
+"""Warm pool of pre-forked sandbox workers (zygotes).
+
+Each zygote is a long-lived interpreter that has already imported the
+modules submissions commonly use.  For every execution it forks a fresh
+child, which runs the user's code in its own session with its own stdio
+pipes, while the zygote itself never runs untrusted code.  Zygotes are
+recycled after ``SANDBOX_MAX_USES`` executions or when they stop looking
+like a freshly started zygote.
+
+Judge executions get an extra pipe, the result channel, on which the
+harness writes framed results separately from anything the submission
+prints.
+
+The child applies the resource limits in ``payload['limits']`` to itself
+(see :func:`harness.apply_limits`); the parent additionally stops reading
+and kills the child once it writes more than the output limit.
+
+When forking is unavailable or the pool is disabled, executions fall back
+to a cold ``subprocess.Popen`` of a new interpreter.
+"""
+import collections
+import json
+import os
+import queue
+import select
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import metrics
+from config import Config
+
+HARNESS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'harness.py')
+
+# Extra time the parent waits for a zygote to answer on top of the
+# execution timeout before it considers the zygote hung
+ZYGOTE_SLACK = 5.0
+
+# How often a running execution checks whether it should be cancelled
+POLL_INTERVAL = 0.1
+
+# Upper bound on the bytes a judge child may send on its result channel
+MAX_RESULT_BYTES = 64 * 1024 * 1024
+
+# Zygote messages are a JSON header followed by an optional binary blob
+_HEADER = struct.Struct('>II')
+
+spawn_seconds = metrics.histogram('sandbox_spawn_seconds', 'Time to start a sandbox child', ['pool'])
+wait_seconds = metrics.histogram('sandbox_wait_seconds', 'Time from starting a sandbox child to reaping it',
+                                 ['pool'])
+checkout_seconds = metrics.histogram('sandbox_checkout_seconds', 'Time waiting for an idle zygote')
+executions_total = metrics.counter('sandbox_executions_total', 'Sandbox executions, by outcome',
+                                   ['pool', 'outcome'])
+
+# ``usage`` holds the child's wall time, CPU time (from wait4), peak RSS and
+# the time it took to start the child
+Execution = collections.namedtuple(
+    'Execution', 'stdout stderr returncode timed_out cancelled output_exceeded usage'
+)
+
+
+class SandboxError(Exception):
+    """Raised when a zygote dies or stops answering"""
+
+
+# -- framing ------------------------------------------------------------------
+
+def _read_exact(fd, size, deadline=None):
+    chunks = []
+    while size:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise SandboxError('Timed out waiting for sandbox worker')
+        chunk = os.read(fd, size)
+        if not chunk:
+            raise SandboxError('Sandbox worker exited unexpectedly')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def _send(fd, message, blob=b''):
+    data = json.dumps(message).encode('utf-8')
+    _write_all(fd, _HEADER.pack(len(data), len(blob)) + data + blob)
+
+
+def _recv(fd, deadline=None):
+    size, blob_size = _HEADER.unpack(_read_exact(fd, _HEADER.size, deadline))
+    message = json.loads(_read_exact(fd, size, deadline))
+    return message, _read_exact(fd, blob_size, deadline)
+
+
+# -- child side ---------------------------------------------------------------
+
+def resolve_limits(overrides=None):
+    """Resource limits for an execution: the Config defaults updated with
+    a problem's ``limits`` dict"""
+    limits = {
+        'cpu_time': Config.CPU_TIME_LIMIT,
+        'memory_mb': Config.MEMORY_LIMIT_MB,
+        'output_bytes': Config.OUTPUT_LIMIT_BYTES,
+        'processes': Config.PROCESS_LIMIT,
+    }
+    limits.update(overrides or {})
+    return limits
+
+
+def _run_child(mode, payload):
+    """Body of a forked child; never returns"""
+    import harness
+    status = 1
+    try:
+        status = harness.run(mode, payload)
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(status)
+
+
+def _open_pipes(mode):
+    """Create the child's pipes: ``{name: (read_fd, write_fd)}``"""
+    names = ['stdout', 'stderr'] + (['result'] if mode == 'submit' else [])
+    return {name: os.pipe() for name in names}
+
+
+def _spawn_child(mode, payload):
+    """Fork a child with fresh pipes, returning ``(pid, {name: read_fd})``"""
+    pipes = _open_pipes(mode)
+    if 'result' in pipes:
+        payload['result_fd'] = pipes['result'][1]
+    pid = os.fork()
+    if pid == 0:
+        os.setsid()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(pipes['stdout'][1], 1)
+        os.dup2(pipes['stderr'][1], 2)
+        os.close(devnull)
+        for name, (read_fd, write_fd) in pipes.items():
+            os.close(read_fd)
+            if name != 'result':
+                os.close(write_fd)
+        sys.stdin = open(0, closefd=False)
+        sys.stdout = open(1, 'w', closefd=False)
+        sys.stderr = open(2, 'w', closefd=False)
+        _run_child(mode, payload)
+    for read_fd, write_fd in pipes.values():
+        os.close(write_fd)
+    return pid, {name: read_fd for name, (read_fd, _) in pipes.items()}
+
+
+def _collect(pid, fds, timeout, on_result=None, should_stop=None, output_limit=None):
+    """Drain the child's pipes until it exits, ``timeout`` expires,
+    ``should_stop()`` returns true or it writes more than ``output_limit``
+    bytes to stdout or stderr.
+
+    ``fds`` maps pipe names to read ends.  Data on the ``result`` pipe is
+    passed to ``on_result`` as it arrives instead of being buffered.
+    Returns ``(stdout, stderr, status, timed_out, cancelled,
+    output_exceeded, usage)``.
+    """
+    names = {fd: name for name, fd in fds.items()}
+    buffers = {name: [] for name in fds}
+    sizes = {name: 0 for name in fds}
+    limits = {name: output_limit for name in fds}
+    limits['result'] = MAX_RESULT_BYTES
+    open_fds = list(names)
+    started = time.monotonic()
+    deadline = started + timeout
+    timed_out = cancelled = output_exceeded = False
+    status = None
+    while not output_exceeded:
+        if should_stop is not None and should_stop():
+            cancelled = True
+            break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        if should_stop is not None:
+            remaining = min(remaining, POLL_INTERVAL)
+        if open_fds:
+            ready, _, _ = select.select(open_fds, [], [], remaining)
+            for fd in ready:
+                chunk = os.read(fd, 65536)
+                name = names[fd]
+                if not chunk:
+                    open_fds.remove(fd)
+                    continue
+                sizes[name] += len(chunk)
+                if limits[name] and sizes[name] > limits[name]:
+                    chunk = chunk[:len(chunk) - (sizes[name] - limits[name])]
+                    output_exceeded = True
+                if name == 'result' and on_result is not None:
+                    if not output_exceeded:
+                        on_result(chunk)
+                else:
+                    buffers[name].append(chunk)
+        else:
+            # The child may have closed its pipes without exiting
+            finished, wait_status, rusage = os.wait4(pid, os.WNOHANG)
+            if finished:
+                status = wait_status
+                break
+            time.sleep(0.005)
+    if status is None:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+        _, status, rusage = os.wait4(pid, 0)
+    usage = {
+        'wall_time': time.monotonic() - started,
+        'cpu_time': rusage.ru_utime + rusage.ru_stime,
+        'max_rss_kb': rusage.ru_maxrss,
+    }
+    stdout = b''.join(buffers['stdout']).decode('utf-8', 'replace')
+    stderr = b''.join(buffers['stderr']).decode('utf-8', 'replace')
+    return stdout, stderr, status, timed_out, cancelled, output_exceeded, usage
+
+
+def _returncode(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _fingerprint():
+    """Snapshot of zygote state used to detect contamination"""
+    return sorted(sys.modules)
+
+
+def serve_zygote(prewarm):
+    """Zygote main loop: read requests from stdin, answer on stdout"""
+    for name in prewarm:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+    import harness  # noqa: F401
+    baseline = _fingerprint()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    while True:
+        try:
+            request, _ = _recv(0)
+        except SandboxError:
+            break
+        parent_gone = []
+
+        def forward_result(chunk):
+            if parent_gone:
+                return
+            try:
+                _send(1, {'result': True}, chunk)
+            except OSError:
+                parent_gone.append(True)
+
+        def cancel_requested():
+            if parent_gone:
+                return True
+            # The parent asks for cancellation with a message on stdin
+            if not select.select([0], [], [], 0)[0]:
+                return False
+            try:
+                return bool(_recv(0)[0].get('cancel'))
+            except SandboxError:
+                parent_gone.append(True)
+                return True
+
+        spawned = time.monotonic()
+        pid, fds = _spawn_child(request['mode'], request['payload'])
+        spawn_time = time.monotonic() - spawned
+        try:
+            stdout, stderr, status, timed_out, cancelled, output_exceeded, usage = _collect(
+                pid, fds, request['timeout'],
+                on_result=forward_result,
+                should_stop=cancel_requested,
+                output_limit=request['output_limit']
+            )
+        finally:
+            for fd in fds.values():
+                os.close(fd)
+        if parent_gone:
+            break
+        usage['spawn_time'] = spawn_time
+        try:
+            _send(1, {
+                'done': True,
+                'stdout': stdout,
+                'stderr': stderr,
+                'returncode': _returncode(status),
+                'timed_out': timed_out,
+                'cancelled': cancelled,
+                'output_exceeded': output_exceeded,
+                'usage': usage,
+                'healthy': _fingerprint() == baseline,
+            })
+        except OSError:
+            break
+
+
+# -- parent side --------------------------------------------------------------
+
+class Zygote:
+    """Handle on one zygote process owned by the web process"""
+
+    def __init__(self, prewarm):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), ','.join(prewarm)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            close_fds=True
+        )
+        self.uses = 0
+        self.healthy = True
+
+    def execute(self, mode, payload, timeout, on_result=None, should_stop=None):
+        self.uses += 1
+        stdin_fd, stdout_fd = self.proc.stdin.fileno(), self.proc.stdout.fileno()
+        deadline = time.monotonic() + timeout + ZYGOTE_SLACK
+        cancel_sent = False
+        try:
+            _send(stdin_fd, {'mode': mode, 'payload': payload, 'timeout': timeout,
+                             'output_limit': _output_limit(payload)})
+            while True:
+                if should_stop is not None and not cancel_sent and should_stop():
+                    _send(stdin_fd, {'cancel': True})
+                    cancel_sent = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SandboxError('Timed out waiting for sandbox worker')
+                if not select.select([stdout_fd], [], [], min(remaining, POLL_INTERVAL))[0]:
+                    continue
+                reply, blob = _recv(stdout_fd, deadline)
+                if 'done' in reply:
+                    break
+                if on_result is not None:
+                    on_result(blob)
+        except OSError as e:
+            self.healthy = False
+            raise SandboxError(str(e))
+        except SandboxError:
+            self.healthy = False
+            raise
+        self.healthy = reply['healthy']
+        return Execution(reply['stdout'], reply['stderr'], reply['returncode'],
+                         reply['timed_out'], reply['cancelled'], reply['output_exceeded'],
+                         reply['usage'])
+
+    def close(self):
+        try:
+            self.proc.kill()
+            self.proc.wait()
+        except OSError:
+            pass
+
+
+class SandboxPool:
+    """Bounded pool of zygotes handing out one zygote per execution"""
+
+    def __init__(self, size, max_uses, prewarm):
+        self.size = size
+        self.max_uses = max_uses
+        self.prewarm = list(prewarm)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._all = set()
+
+    def _checkout(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            zygote = Zygote(self.prewarm)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._all.add(zygote)
+        return zygote
+
+    def _checkin(self, zygote):
+        if zygote.healthy and zygote.uses < self.max_uses and zygote.proc.poll() is None:
+            self._idle.put(zygote)
+        else:
+            self._discard(zygote)
+        self._slots.release()
+
+    def _discard(self, zygote):
+        with self._lock:
+            self._all.discard(zygote)
+        zygote.close()
+
+    def execute(self, mode, payload, timeout, on_result=None, should_stop=None):
+        with checkout_seconds.time():
+            zygote = self._checkout()
+        try:
+            return zygote.execute(mode, payload, timeout, on_result, should_stop)
+        finally:
+            self._checkin(zygote)
+
+    def close(self):
+        with self._lock:
+            zygotes = list(self._all)
+            self._all.clear()
+        for zygote in zygotes:
+            zygote.close()
+
+
+def _output_limit(payload):
+    return (payload.get('limits') or {}).get('output_bytes')
+
+
+def _execute_cold(mode, payload, timeout, on_result=None, should_stop=None):
+    """Run one execution in a brand-new interpreter"""
+    pipes = _open_pipes(mode)
+    pass_fds = ()
+    payload = dict(payload, mode=mode)
+    if mode == 'submit':
+        pass_fds = (pipes['result'][1],)
+        payload['result_fd'] = pipes['result'][1]
+    stdin = json.dumps(payload).encode('utf-8')
+    spawned = time.monotonic()
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, HARNESS_PATH],
+            stdin=subprocess.PIPE,
+            stdout=pipes['stdout'][1],
+            stderr=pipes['stderr'][1],
+            pass_fds=pass_fds,
+            start_new_session=True
+        )
+    finally:
+        for _, write_fd in pipes.values():
+            os.close(write_fd)
+    spawn_time = time.monotonic() - spawned
+    fds = {name: read_fd for name, (read_fd, _) in pipes.items()}
+    try:
+        try:
+            proc.stdin.write(stdin)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        stdout, stderr, status, timed_out, cancelled, output_exceeded, usage = _collect(
+            proc.pid, fds, timeout, on_result=on_result, should_stop=should_stop,
+            output_limit=_output_limit(payload)
+        )
+    finally:
+        for fd in fds.values():
+            os.close(fd)
+    proc.returncode = _returncode(status)
+    usage['spawn_time'] = spawn_time
+    return Execution(stdout, stderr, proc.returncode, timed_out, cancelled, output_exceeded, usage)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide zygote pool, or None when it is disabled"""
+    global _pool
+    if _pool is None and Config.SANDBOX_POOL_SIZE > 0 and hasattr(os, 'fork'):
+        with _pool_lock:
+            if _pool is None:
+                _pool = SandboxPool(
+                    Config.SANDBOX_POOL_SIZE,
+                    Config.SANDBOX_MAX_USES,
+                    Config.SANDBOX_PREWARM_MODULES
+                )
+    return _pool
+
+
+def execute(mode, payload, timeout, on_result=None, should_stop=None):
+    """Execute ``payload`` in a sandboxed child.
+
+    ``mode`` is ``'run'`` to execute ``payload['code']`` as a script or
+    ``'submit'`` to run it through the judge harness; either way the child
+    is held to ``payload['limits']`` (see :func:`resolve_limits`).  In
+    ``'submit'`` mode ``on_result`` is called with raw bytes from the
+    harness' result channel as they arrive.  The child is killed as soon as
+    ``should_stop()`` returns true.  Returns an :class:`Execution`.
+
+    A run in a zygote that fails is retried once in a cold interpreter,
+    unless it had already passed results to ``on_result``; then the
+    :class:`SandboxError` is raised.
+    """
+    pool = get_pool()
+    if pool is None:
+        return _record('cold', _execute_cold(mode, payload, timeout, on_result, should_stop))
+    forwarded = []
+
+    def forward(chunk):
+        forwarded.append(True)
+        on_result(chunk)
+
+    try:
+        return _record('zygote', pool.execute(mode, payload, timeout, on_result and forward, should_stop))
+    except SandboxError:
+        executions_total.labels('zygote', 'sandbox_error').inc()
+        if forwarded:
+            # ``on_result`` may hold part of a frame and has seen some results;
+            # a second run would corrupt and repeat them
+            raise
+        # The zygote has been discarded, retry once in a cold interpreter
+        return _record('cold', _execute_cold(mode, payload, timeout, on_result, should_stop))
+
+
+def _record(pool, execution):
+    if execution.cancelled:
+        outcome = 'cancelled'
+    elif execution.timed_out:
+        outcome = 'timeout'
+    elif execution.output_exceeded:
+        outcome = 'output_exceeded'
+    elif execution.returncode < 0:
+        outcome = 'signaled'
+    else:
+        outcome = 'exited' if execution.returncode == 0 else 'failed'
+    spawn_seconds.labels(pool).observe(execution.usage['spawn_time'])
+    wait_seconds.labels(pool).observe(execution.usage['wall_time'])
+    executions_total.labels(pool, outcome).inc()
+    return execution
+
+
+if __name__ == '__main__':
+    serve_zygote([name for name in sys.argv[1].split(',') if name] if len(sys.argv) > 1 else [])
@@ -0,0 +1,69 @@
+"""Core-aware fair scheduling of sandbox executions across users"""
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+from config import Config
+
+slot_wait_seconds = metrics.histogram('judge_slot_wait_seconds', 'Time executions wait for a judge slot')
+
+
+class FairScheduler:
+    """Hands out a fixed number of execution slots round-robin between clients.
+
+    Each client has its own FIFO of waiting requests and clients take turns
+    whenever a slot frees up, so a submission split into many shards cannot
+    starve other users' executions.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._free = slots
+        self._waiting = collections.OrderedDict()  # client -> deque of tickets
+        self._cond = threading.Condition()
+
+    def _next_ticket(self):
+        for tickets in self._waiting.values():
+            return tickets[0]
+        return None
+
+    @contextmanager
+    def slot(self, client_id):
+        """Hold one execution slot for the duration of the ``with`` block"""
+        ticket = object()
+        waited = time.perf_counter()
+        with self._cond:
+            self._waiting.setdefault(client_id, collections.deque()).append(ticket)
+            while not (self._free and self._next_ticket() is ticket):
+                self._cond.wait()
+            self._free -= 1
+            tickets = self._waiting.pop(client_id)
+            tickets.popleft()
+            if tickets:
+                # Re-queue the client behind everybody else
+                self._waiting[client_id] = tickets
+            self._cond.notify_all()
+        slot_wait_seconds.observe(time.perf_counter() - waited)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._free += 1
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'slots': self.slots,
+                'busy': self.slots - self._free,
+                'waiting': sum(len(t) for t in self._waiting.values()),
+                'waiting_clients': len(self._waiting),
+            }
+
+
+scheduler = FairScheduler(Config.JUDGE_SLOTS)
+metrics.gauge('judge_slots_busy', 'Judge slots running an execution', callback=lambda: scheduler.stats()['busy'])
+metrics.gauge('judge_executions_waiting', 'Executions waiting for a judge slot',
+              callback=lambda: scheduler.stats()['waiting'])
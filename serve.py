@@ -0,0 +1,100 @@
+"""Production server: preforked web workers sharing one judge server.
+
+Usage: ``python serve.py``
+
+The app is imported once by the master process and then forked into
+``WEB_WORKERS`` gunicorn workers of ``WEB_THREADS`` threads each, which share
+the imported code, templates and content index copy-on-write.  Before the
+workers start, the master starts a judge server (see :mod:`judge_server`)
+that runs every submission of every worker, and stops it after the last
+worker has exited.
+
+Signals to the master process:
+
+- ``HUP``: replace the workers gracefully (the preloaded code is kept)
+- ``TERM``: stop, giving requests in flight ``WEB_GRACEFUL_TIMEOUT`` seconds
+- ``INT``/``QUIT``: stop immediately
+- ``TTIN``/``TTOU``: add or remove a worker
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+# Read by config, so set before anything imports it
+os.environ['WEB_PRELOAD'] = 'True'
+os.environ.setdefault('JUDGE_SOCKET', os.path.join(tempfile.gettempdir(), f"dsa-judge-{os.getpid()}.sock"))
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+
+import judge_server  # noqa: E402
+from config import Config  # noqa: E402
+
+# Seconds the judge server gets to start and to stop
+JUDGE_SERVER_TIMEOUT = 30
+
+
+def on_starting(server):
+    server.judge_process = subprocess.Popen(
+        [sys.executable, os.path.abspath(judge_server.__file__), Config.JUDGE_SOCKET]
+    )
+    judge_server.connect(Config.JUDGE_SOCKET, JUDGE_SERVER_TIMEOUT)
+    server.log.info('Judge server listening on %s (pid %s)', Config.JUDGE_SOCKET,
+                    server.judge_process.pid)
+
+
+def post_fork(server, worker):
+    from app import start_services
+    start_services()
+
+
+def on_exit(server):
+    process = getattr(server, 'judge_process', None)
+    if process is None:
+        return
+    process.terminate()
+    try:
+        process.wait(JUDGE_SERVER_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class Server(BaseApplication):
+    """Gunicorn configured from :class:`config.Config`"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def options():
+    return {
+        'bind': f"{Config.HOST}:{Config.PORT}",
+        'workers': Config.WEB_WORKERS,
+        # Threads keep event streams, long polls and WebSockets from
+        # holding a whole process each
+        'worker_class': 'gthread',
+        'threads': Config.WEB_THREADS,
+        'preload_app': True,
+        'timeout': Config.WEB_TIMEOUT,
+        'graceful_timeout': Config.WEB_GRACEFUL_TIMEOUT,
+        'max_requests': Config.WEB_MAX_REQUESTS,
+        'max_requests_jitter': Config.WEB_MAX_REQUESTS // 10,
+        'accesslog': '-',
+        'on_starting': on_starting,
+        'post_fork': post_fork,
+        'on_exit': on_exit,
+    }
+
+
+if __name__ == '__main__':
+    Server(options()).run()
@@ -0,0 +1,351 @@
+"""Durable history of judged submissions.
+
+Every judged submission is kept in SQLite (``SUBMISSION_DB``), with its
+per-test results, its timing and its code.  Judging never waits for the
+disk: :meth:`SubmissionStore.record` only queues the report, and a writer
+thread commits queued submissions in batches of up to
+``SUBMISSION_BATCH_SIZE``, one transaction each, at most
+``SUBMISSION_FLUSH_INTERVAL`` seconds after they were judged.  When the
+queue is full, new submissions are dropped and counted rather than slowing
+judging down.
+
+The database runs in WAL mode, so history queries read alongside the
+writer.  Identical code is stored once, compressed; the code of
+submissions older than ``SUBMISSION_CODE_RETENTION`` seconds is removed
+every ``SUBMISSION_COMPACT_INTERVAL`` seconds, keeping their verdicts and
+timings, and the freed pages are returned to the file system.
+
+Under ``serve.py`` the store lives in the judge server, the only process
+that writes to the database.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+import metrics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS code (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS submissions (
+    id TEXT PRIMARY KEY,
+    client_id TEXT,
+    problem_id TEXT NOT NULL,
+    created REAL NOT NULL,
+    verdict TEXT NOT NULL,
+    all_passed INTEGER NOT NULL,
+    cached INTEGER NOT NULL,
+    tests INTEGER NOT NULL,
+    passed INTEGER NOT NULL,
+    wall_ms REAL,
+    user_ms REAL,
+    user_cpu_ms REAL,
+    max_rss_kb INTEGER,
+    timing TEXT,
+    complexity TEXT,
+    code_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS submissions_client ON submissions (client_id, created);
+CREATE INDEX IF NOT EXISTS submissions_problem ON submissions (problem_id, created);
+CREATE INDEX IF NOT EXISTS submissions_created ON submissions (created);
+CREATE INDEX IF NOT EXISTS submissions_code ON submissions (code_hash);
+
+CREATE TABLE IF NOT EXISTS test_results (
+    submission_id TEXT NOT NULL,
+    test_case INTEGER NOT NULL,
+    verdict TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    wall_time_ms REAL,
+    cpu_time_ms REAL,
+    peak_rss_kb INTEGER,
+    error TEXT,
+    PRIMARY KEY (submission_id, test_case)
+) WITHOUT ROWID;
+"""
+
+SUMMARY_COLUMNS = ('id', 'problem_id', 'created', 'verdict', 'all_passed', 'cached', 'tests', 'passed',
+                   'wall_ms', 'user_ms', 'user_cpu_ms', 'max_rss_kb')
+
+# Submissions whose code is removed per transaction while compacting
+COMPACT_CHUNK = 1000
+
+# Longest history page
+MAX_PAGE = 200
+
+flush_seconds = metrics.histogram('store_flush_seconds', 'Time to commit a batch of submissions')
+
+
+def _connect(path, *pragmas):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    for pragma in pragmas:
+        conn.execute(f"PRAGMA {pragma}")
+    conn.execute('PRAGMA journal_mode=WAL')
+    # Durable across process crashes; a power loss may lose the last batches
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class SubmissionStore:
+    """SQLite-backed submission history with a batching writer thread"""
+
+    def __init__(self, path, batch_size, flush_interval, queue_size, code_retention, compact_interval):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.code_retention = code_retention
+        self.compact_interval = compact_interval
+        self._queue = queue.Queue(queue_size)
+        self._local = threading.local()
+        self._thread = None
+        self.counts = {'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0, 'compacted': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def start(self):
+        """Create the database if needed and start the writer thread"""
+        if not self.enabled or self._thread is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Only takes effect on a new database, before it leaves rollback journal mode
+        conn = _connect(self.path, 'auto_vacuum=INCREMENTAL')
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._thread = threading.Thread(target=self._writer, name='submission-store', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, submission_id, code, problem_id, client_id, report, created=None):
+        """Queue a judged submission for writing; never blocks"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((submission_id, created or time.time(), code, problem_id, client_id, report))
+        except queue.Full:
+            self.counts['dropped'] += 1
+
+    def flush(self):
+        """Wait until every queued submission has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """Write the queued submissions and stop the writer"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    # -- writing ----------------------------------------------------------------
+
+    def _next_batch(self, timeout):
+        """Up to ``batch_size`` queued submissions, waiting ``timeout`` for the first
+        and ``flush_interval`` for the rest; the last is None once closed"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not None and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer(self):
+        conn = _connect(self.path)
+        next_compaction = time.monotonic()
+        closing = False
+        while not closing:
+            if self.code_retention and time.monotonic() >= next_compaction:
+                try:
+                    self.compact(conn)
+                except sqlite3.Error:
+                    logger.exception('Compacting the submission store failed')
+                next_compaction = time.monotonic() + self.compact_interval
+            batch = self._next_batch(timeout=max(0.0, next_compaction - time.monotonic())
+                                     if self.code_retention else None)
+            if batch and batch[-1] is None:
+                closing = True
+            submissions = [item for item in batch if item is not None]
+            if submissions:
+                try:
+                    with flush_seconds.time():
+                        self._write(conn, submissions)
+                    self.counts['written'] += len(submissions)
+                    self.counts['batches'] += 1
+                except sqlite3.Error:
+                    logger.exception('Writing %d submissions failed', len(submissions))
+                    self.counts['failed'] += len(submissions)
+            for _ in batch:
+                self._queue.task_done()
+        conn.close()
+
+    def _write(self, conn, submissions):
+        code_rows, submission_rows, test_rows = [], [], []
+        for submission_id, created, code, problem_id, client_id, report in submissions:
+            data = code.encode('utf-8')
+            code_hash = hashlib.sha256(data).hexdigest()
+            code_rows.append((code_hash, len(data), zlib.compress(data)))
+            results = report['results']
+            timing = report.get('timing') or {}
+            submission_rows.append((
+                submission_id, client_id, problem_id, created, report['verdict'],
+                int(report['all_passed']), int(report.get('cached', False)),
+                len(results), sum(1 for r in results if r['passed']),
+                timing.get('wall_ms'), timing.get('user_ms'), timing.get('user_cpu_ms'), timing.get('max_rss_kb'),
+                json.dumps(timing), json.dumps(report.get('complexity')), code_hash
+            ))
+            test_rows.extend((submission_id, r['test_case'], r['verdict'], int(r['passed']), r['wall_time_ms'],
+                              r['cpu_time_ms'], r['peak_rss_kb'], r['error']) for r in results)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR IGNORE INTO code VALUES (?, ?, ?)', code_rows)
+            conn.executemany('INSERT OR REPLACE INTO submissions VALUES '
+                             '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', submission_rows)
+            conn.executemany('INSERT OR REPLACE INTO test_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', test_rows)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def compact(self, conn):
+        """Remove the code of submissions past retention and free its pages"""
+        cutoff = time.time() - self.code_retention
+        removed = 0
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    'SELECT id, code_hash FROM submissions WHERE created < ? AND code_hash IS NOT NULL LIMIT ?',
+                    (cutoff, COMPACT_CHUNK)
+                ).fetchall()
+                conn.executemany('UPDATE submissions SET code_hash = NULL WHERE id = ?',
+                                 [(submission_id,) for submission_id, _ in rows])
+                # Code resubmitted since is still referenced
+                conn.executemany('DELETE FROM code WHERE hash = ? AND NOT EXISTS '
+                                 '(SELECT 1 FROM submissions WHERE code_hash = ?)',
+                                 [(code_hash, code_hash) for code_hash in {h for _, h in rows}])
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            removed += len(rows)
+            if len(rows) < COMPACT_CHUNK:
+                break
+        if removed:
+            conn.execute('PRAGMA incremental_vacuum')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.counts['compacted'] += removed
+        return removed
+
+    # -- reading ----------------------------------------------------------------
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path, 'query_only=1')
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def history(self, client_id=None, problem_id=None, before=None, limit=50):
+        """Summaries of the submissions of a client and/or problem, newest
+        first and judged before ``before`` (a ``created`` time) if given"""
+        if self._thread is None:
+            return []
+        clauses, params = [], []
+        if client_id is not None:
+            clauses.append('client_id = ?')
+            params.append(client_id)
+        if problem_id is not None:
+            clauses.append('problem_id = ?')
+            params.append(problem_id)
+        if before is not None:
+            clauses.append('created < ?')
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._reader().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM submissions {where} ORDER BY created DESC LIMIT ?",
+            params + [max(1, min(limit, MAX_PAGE))]
+        ).fetchall()
+        return [_summary(row) for row in rows]
+
+    def get(self, submission_id, client_id=None):
+        """A submission with its timing, test results and code (None once
+        removed by compaction); None if unknown or not ``client_id``'s"""
+        if self._thread is None:
+            return None
+        conn = self._reader()
+        row = conn.execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)}, client_id, timing, complexity, data "
+            'FROM submissions LEFT JOIN code ON code.hash = code_hash WHERE id = ?',
+            (submission_id,)
+        ).fetchone()
+        if row is None or (client_id is not None and row['client_id'] != client_id):
+            return None
+        submission = _summary(row)
+        submission.update(
+            timing=json.loads(row['timing']),
+            complexity=json.loads(row['complexity']),
+            code=zlib.decompress(row['data']).decode('utf-8') if row['data'] is not None else None,
+            results=[dict(r, passed=bool(r['passed'])) for r in conn.execute(
+                'SELECT test_case, verdict, passed, wall_time_ms, cpu_time_ms, peak_rss_kb, error '
+                'FROM test_results WHERE submission_id = ? ORDER BY test_case', (submission_id,)
+            ).fetchall()]
+        )
+        return submission
+
+    def accepted(self, since=0.0):
+        """Summaries of the accepted submissions judged after ``since``,
+        oldest first, with their ``client_id`` and ``timing``"""
+        if self._thread is None:
+            return
+        rows = self._reader().execute(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)}, client_id, timing FROM submissions "
+            'WHERE created > ? AND all_passed = 1 ORDER BY created', (since,)
+        )
+        for row in rows:
+            yield dict(_summary(row), client_id=row['client_id'], timing=json.loads(row['timing']))
+
+    def stats(self):
+        return dict(self.counts, enabled=self._thread is not None, queued=self._queue.qsize())
+
+
+def _summary(row):
+    summary = {column: row[column] for column in SUMMARY_COLUMNS}
+    summary['all_passed'] = bool(summary['all_passed'])
+    summary['cached'] = bool(summary['cached'])
+    return summary
+
+
+store = SubmissionStore(
+    Config.SUBMISSION_DB,
+    Config.SUBMISSION_BATCH_SIZE,
+    Config.SUBMISSION_FLUSH_INTERVAL,
+    Config.SUBMISSION_QUEUE_SIZE,
+    Config.SUBMISSION_CODE_RETENTION,
+    Config.SUBMISSION_COMPACT_INTERVAL
+)
+metrics.gauge('store_queued', 'Submissions waiting to be written', callback=lambda: store._queue.qsize())
+metrics.counter('store_submissions_total', 'Submissions handed to the store, by outcome', ['outcome'],
+                callback=lambda: {(outcome,): store.counts[outcome] for outcome in ('written', 'dropped', 'failed')})
@@ -0,0 +1,113 @@
+"""Dropping editor work that a newer request has made pointless.
+
+Lint and completion requests carry a sequence number that grows with every
+request an editor sends.  Only the newest request of each editor is worth
+answering: an older one is dropped while it waits in the coalescing window
+(so a burst of requests turns into one), while it is queued for a worker,
+and, if it finishes anyway, its result is discarded.
+
+The newest sequence numbers are kept in the process.  Under ``serve.py``
+an editor's WebSocket stays on one web worker, so all of its requests see
+each other, but its HTTP requests may be spread over several workers and
+only supersede those that reach the same one.  The counts are exported as
+``editor_requests_total`` and summed over the workers by :mod:`metrics`.
+"""
+import collections
+import threading
+
+import metrics
+import profiling
+from config import Config
+
+# Editors whose newest sequence number is remembered, per kind of work
+MAX_EDITORS = 4096
+
+
+class Superseded(Exception):
+    """Raised when a newer request from the same editor has arrived"""
+
+
+class Supersession:
+    """Newest request per editor for one kind of work"""
+
+    def __init__(self, window=0.0):
+        self.window = window
+        self._latest = collections.OrderedDict()  # editor key -> newest sequence number
+        self._cond = threading.Condition()
+        self.counts = {'requests': 0, 'completed': 0, 'coalesced': 0, 'cancelled': 0, 'discarded': 0}
+
+    def _stale(self, key, seq):
+        latest = self._latest.get(key)
+        return latest is not None and latest != seq
+
+    def begin(self, key, seq):
+        """Register a request and wait out the coalescing window.
+
+        Raises :class:`Superseded` if a newer request from the editor
+        arrives first.
+        """
+        with self._cond:
+            self.counts['requests'] += 1
+            latest = self._latest.get(key)
+            if latest is not None and seq < latest:
+                self.counts['coalesced'] += 1
+                raise Superseded()
+            self._latest[key] = seq
+            self._latest.move_to_end(key)
+            while len(self._latest) > MAX_EDITORS:
+                self._latest.popitem(last=False)
+            self._cond.notify_all()
+            if not self.window:
+                return
+            with profiling.span('coalesce'):
+                stale = self._cond.wait_for(lambda: self._stale(key, seq), self.window)
+            if stale:
+                self.counts['coalesced'] += 1
+                raise Superseded()
+
+    def should_stop(self, key, seq):
+        """Callable telling queued work whether it has been superseded"""
+        def check():
+            with self._cond:
+                return self._stale(key, seq)
+        return check
+
+    def finish(self, key, seq):
+        """Count a finished request; raises :class:`Superseded` if its result is stale"""
+        with self._cond:
+            if self._stale(key, seq):
+                self.counts['discarded'] += 1
+                raise Superseded()
+            self.counts['completed'] += 1
+
+    def run(self, key, seq, work):
+        """Return ``work(should_stop)`` unless a newer request supersedes it.
+
+        ``work`` raises :class:`Superseded` when ``should_stop()`` becomes
+        true while it is queued.  Requests without a sequence number are
+        never superseded.
+        """
+        if seq is None:
+            return work(None)
+        self.begin(key, seq)
+        try:
+            result = work(self.should_stop(key, seq))
+        except Superseded:
+            with self._cond:
+                self.counts['cancelled'] += 1
+            raise
+        self.finish(key, seq)
+        return result
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counts, editors=len(self._latest), window=self.window)
+
+
+lint_requests = Supersession(Config.LINT_COALESCE_WINDOW)
+completion_requests = Supersession(Config.COMPLETION_COALESCE_WINDOW)
+metrics.counter('editor_requests_total', 'Lint and completion requests with a sequence number, by outcome',
+                ['kind', 'outcome'],
+                callback=lambda: {(kind, outcome): requests.counts[outcome]
+                                  for kind, requests in (('lint', lint_requests), ('completion', completion_requests))
+                                  for outcome in ('completed', 'coalesced', 'cancelled', 'discarded')})